@@ -0,0 +1,84 @@
+"""
+Benchmark del backfill: a target rebuilt from a history of synthetic exports (each one
+larger than the previous, same keys with new values) with `RawBackfill` on 1 and N workers,
+downloads served by the stubbed Drive at `--mbps` with `--latency` per request. The result
+must equal the newest export transformed.
+
+    python -m benchmarks.backfill --target creditos --exports 12 --rows 50000 --workers 1 4
+"""
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+import polars as pl
+from loguru import logger
+from benchmarks.generators import write_export
+from benchmarks.stubs import build_stub_services
+from src import extraction_layer
+from src.backfill import RawBackfill, SOURCE_FILE_COL, SOURCE_DATE_COL
+from src.dictionary_cache import dictionary_cache
+from src.download_cache import DownloadCache
+from src.schema_compiler import DICTIONARY_PATH
+from src.transformation_layer import FBSTransformer
+from src.metrics import RunMetrics
+
+
+class StubBackfill(RawBackfill):
+    """Backfill whose extractors download from the stubbed Drive."""
+
+    def __init__(self, media_files: dict, latency: float=0.0, mbps: float=None, **options):
+        super().__init__(**options)
+        self.media_files = media_files
+        self.network = {'latency': latency, 'mbps': mbps}
+
+    def get_extractor(self):
+        extractor = super().get_extractor()
+        if extractor._drive_service is None:
+            extractor.drive_service = build_stub_services(media_files=self.media_files, **self.network)[0]
+        return extractor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backfill benchmark")
+    parser.add_argument('--target', default='creditos', choices=['creditos', 'radicados'])
+    parser.add_argument('--exports', type=int, default=12)
+    parser.add_argument('--rows', type=int, default=50_000, help="Rows of the first export, each next one has 10%% more")
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--mbps', type=float, default=10, help="Download bandwidth of each connection in MB/s")
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds added to every request")
+    args = parser.parse_args()
+
+    logger.remove()
+    target = args.target
+    files, media_files = [], {}
+    for k in range(args.exports):
+        created = datetime(2023, 1, 1) + timedelta(days=30 * k)
+        file_id = f"{target}-{k}"
+        media_files[file_id] = write_export(target, int(args.rows * (1 + 0.1 * k)), seed=k)
+        files.append({'id': file_id, 'name': f"{created:%Y%m%d}_{target}.csv", 'createdTime': created.isoformat() + 'Z', 'modifiedTime': created.isoformat() + 'Z'})
+
+    primary_key = dictionary_cache.load(DICTIONARY_PATH)[target].filter(pl.col('Jerarquia') == 'PK')['Nombre_columna'][0]
+    print(f"{target}: {args.exports} exports of {args.rows} to {int(args.rows * (1 + 0.1 * (args.exports - 1)))} rows, primary key '{primary_key}'")
+
+    expected = None
+    for workers in args.workers:
+        # A fresh download cache per run, every export is downloaded and parsed
+        extraction_layer.download_cache = DownloadCache(cache_dir=tempfile.mkdtemp(prefix='backfill_cache_'))
+        metrics = RunMetrics()
+        backfill = StubBackfill(media_files, latency=args.latency, mbps=args.mbps, workers=workers, spill_dir=tempfile.mkdtemp(prefix='backfill_'), metrics=metrics)
+
+        start = time.perf_counter()
+        df = backfill.run(target, files, primary_key=primary_key)
+        seconds = time.perf_counter() - start
+
+        if expected is None:
+            newest = backfill.get_extractor().extract_raw_file(files[-1])
+            expected = FBSTransformer.run(f"raw_{target}_", newest)
+        assert df.drop(SOURCE_FILE_COL, SOURCE_DATE_COL).sort(primary_key).equals(expected.sort(primary_key)), "Backfill differs from the newest export"
+        assert df[SOURCE_FILE_COL].unique().to_list() == [files[-1]['name']]
+
+        merge = next(s for s in metrics.stages if s['stage'] == 'backfill_merge')
+        print(
+            f"workers {workers:>2} | {seconds:7.3f}s | {backfill.reports[target]['rows_in']} rows in, {df.height} kept "
+            f"| merge {merge['wall_seconds']:.3f}s, peak RSS +{(merge['peak_rss_delta_bytes'] or 0) / 1024 / 1024:.0f} Mb"
+        )
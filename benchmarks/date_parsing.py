@@ -0,0 +1,52 @@
+"""
+Benchmark del parseo de fechas: the regex chain previously used by `raw_creditos_`
+(strip -> split on space -> replace '-'/'.' -> `to_date("%d/%m/%Y")`) against `date_parser`
+with its formats already detected (cached), on export-like date text.
+
+    python -m benchmarks.date_parsing
+"""
+import os
+import time
+import tempfile
+import numpy as np
+import polars as pl
+from benchmarks.generators import dates
+from src.date_parser import DateParser
+
+
+def regex_chain(col: str) -> pl.Expr:
+    return (
+        pl.col(col)
+        .str.strip_chars()
+        .str.split(" ").list.get(0)
+        .str.replace_all(r"[-.]", "/")
+        .str.to_date("%d/%m/%Y", strict=False)
+    )
+
+
+def best_of(func, repeat: int=5) -> tuple:
+    runs, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start)
+    return min(runs), result
+
+
+if __name__ == '__main__':
+    parser = DateParser(cache_path=os.path.join(tempfile.mkdtemp(prefix='date_formats_'), 'date_formats.json'))
+    cases = {'mixed separators': ['/', '-', '.'], "'/' only": ['/']}
+
+    for n_rows in (100_000, 1_000_000, 5_000_000):
+        for case, separators in cases.items():
+            df = pl.DataFrame({'fecha': dates(np.random.default_rng(42), n_rows, null_rate=0.1, separators=separators)})
+            source = f"benchmark_{n_rows}_{len(separators)}"
+            parser.parse(df.head(10_000), {'fecha': "%d/%m/%Y"}, source=source)
+
+            chain_seconds, chain_df = best_of(lambda: df.select(regex_chain('fecha')))
+            parser_seconds, parser_df = best_of(lambda: parser.parse(df, {'fecha': "%d/%m/%Y"}, source=source))
+            assert parser_df.equals(chain_df)
+            print(
+                f"{n_rows:>9} rows | {case:<16} | regex chain: {chain_seconds:7.3f}s | date_parser: {parser_seconds:7.3f}s "
+                f"| speed-up x{chain_seconds / parser_seconds:4.1f} | formats {parser.reports[source]['fecha']['formats']}"
+            )
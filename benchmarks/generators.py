@@ -0,0 +1,168 @@
+"""
+Generadores sinteticos (con semilla) de las exportaciones crudas de creditos y radicados.
+
+Column names and types follow the real sources: `cols_sample.csv` and the data dictionary
+for creditos, the dictionary for radicados (with `Destino` as "CARGO-GRUPO-FUNCIONARIO" and
+`Fecha Radicacion` as "DD/MM/YYYY HH:MM"). Values are built column-wise with numpy/polars,
+so 10M rows are practical, and written like the exports: latin1, ';' separated.
+"""
+import os
+import csv
+from datetime import date
+import numpy as np
+import polars as pl
+from src.dictionary_cache import dictionary_cache
+from src.schema_compiler import DICTIONARY_PATH
+from src.transformation_layer import FBSTransformer
+
+
+DATA_DIR = os.getenv('BENCHMARK_DATA_DIR', 'cache/benchmarks')
+SAMPLE_COLUMNS_PATH = 'cols_sample.csv'
+WRITE_CHUNK_ROWS = 500_000
+START_DATE = date(2015, 1, 1)
+
+
+def choice(rng: np.random.Generator, values: list, n_rows: int, null_rate: float=0.0) -> pl.Series:
+    """Random picks from `values`, with `null_rate` of empty cells."""
+    picked = pl.Series(values, dtype=pl.String).gather(rng.integers(0, len(values), n_rows))
+    if null_rate:
+        picked = pl.select(pl.when(pl.lit(rng.random(n_rows) < null_rate)).then(None).otherwise(picked)).to_series()
+    return picked
+
+
+def numbers(rng: np.random.Generator, low: int, high: int, n_rows: int) -> pl.Series:
+    return pl.Series(rng.integers(low, high, n_rows)).cast(pl.String)
+
+
+def money(rng: np.random.Generator, n_rows: int) -> pl.Series:
+    """Amounts with comma decimals, e.g. '20648000,35'."""
+    units = pl.Series(rng.integers(100_000, 90_000_000, n_rows)).cast(pl.String)
+    cents = pl.Series(rng.integers(0, 100, n_rows)).cast(pl.String).str.zfill(2)
+    return pl.select(pl.concat_str(pl.lit(units), pl.lit(cents), separator=',')).to_series()
+
+
+def dates(rng: np.random.Generator, n_rows: int, null_rate: float=0.0, with_time: float=0.3, separators: list=('/', '-', '.')) -> pl.Series:
+    """Export dates "DD/MM/YYYY": mixed '/', '-' and '.' separators, and a time part on some of them."""
+    df = pl.DataFrame({
+        'day': pl.Series(rng.integers(0, 3650, n_rows)),
+        'separator': pl.Series(separators, dtype=pl.String).gather(rng.integers(0, len(separators), n_rows)),
+        'clock': pl.Series(rng.integers(0, 24 * 60, n_rows)),
+        'with_time': pl.Series(rng.random(n_rows) < with_time),
+        'is_null': pl.Series(rng.random(n_rows) < null_rate),
+    })
+    # Each step is materialised so the formatted text is computed only once
+    df = df.with_columns((pl.lit(START_DATE) + pl.duration(days='day')).dt.strftime("%d/%m/%Y").alias('text'))
+    df = df.with_columns(pl.col('text').str.replace_all('/', pl.col('separator'), literal=True))
+    df = df.with_columns(
+        pl.when('with_time').then(pl.concat_str(
+            'text', pl.lit(' '),
+            (pl.col('clock') // 60).cast(pl.String).str.zfill(2), pl.lit(':'),
+            (pl.col('clock') % 60).cast(pl.String).str.zfill(2),
+        )).otherwise('text').alias('text')
+    )
+    return df.select(pl.when('is_null').then(None).otherwise('text').alias('text')).to_series()
+
+
+def people(rng: np.random.Generator, n_rows: int) -> pl.Series:
+    first = ['CARLOS', 'MARÍA', 'JOSÉ', 'ÁNGELA', 'NÚÑEZ', 'LUZ', 'ANDRÉS', 'SOFÍA']
+    last = ['BARBOSA', 'PEÑA', 'CANO', 'GÓMEZ', 'ÑAÑEZ', 'RODRÍGUEZ', 'LÓPEZ', 'DÍAZ']
+    return pl.select(pl.concat_str(
+        pl.lit(choice(rng, first, n_rows)), pl.lit(choice(rng, last, n_rows)), pl.lit(choice(rng, last, n_rows)), separator=' '
+    )).to_series()
+
+
+def creditos_header() -> list:
+    """Raw export header: `cols_sample.csv` without calculated columns, '_1'/'_2' columns repeated as in the export."""
+    with open(SAMPLE_COLUMNS_PATH, 'r', encoding='utf-8-sig') as f:
+        sample_columns = next(csv.reader(f))
+    calculated = set(dictionary_cache.load(DICTIONARY_PATH)['creditos'].filter(pl.col('Calculado') == 1)['Nombre_columna'])
+    return [c.rsplit('_', 1)[0] if c.endswith(('_1', '_2')) else c for c in sample_columns if c not in calculated]
+
+
+def creditos_frame(n_rows: int, seed: int=42, offset: int=0) -> pl.DataFrame:
+    rng = np.random.default_rng(seed)
+    types = dict(dictionary_cache.load(DICTIONARY_PATH)['creditos'].select('Nombre_columna', 'Tipo').iter_rows())
+    special = {
+        'Crédito': lambda: pl.Series(np.arange(100_000 + offset, 100_000 + offset + n_rows)).cast(pl.String),
+        'EstadoCrédito': lambda: choice(rng, ['Terminado', 'Vigente', 'Castigado', 'Aprobado'], n_rows),
+        'TasaInterés': lambda: pl.select(pl.concat_str(pl.lit(numbers(rng, 100_000, 2_000_000, n_rows)), pl.lit(' %'))).to_series(),
+        'Línea': lambda: choice(rng, ['BIENESTAR-HOGAR-CATEGORIA B', 'EDUCATIVO', 'VIVIENDA', 'CALAMIDAD DOMÉSTICA'], n_rows),
+        'Nombre Deudor': lambda: people(rng, n_rows),
+        'IdentificaciónDeudor': lambda: numbers(rng, 10_000_000, 99_999_999, n_rows),
+        'E Mail': lambda: pl.select(pl.concat_str(pl.lit(numbers(rng, 0, 10**6, n_rows)), pl.lit('@contraloria.gov.co'))).to_series(),
+        'FechaGiro': lambda: dates(rng, n_rows, null_rate=0.2),
+        'FechaLegalización': lambda: dates(rng, n_rows, null_rate=0.2),
+        'Observaciones': lambda: choice(rng, ['', 'PAGO ANTICIPADO', 'REESTRUCTURADO; "VER ACTA"'], n_rows, null_rate=0.7),
+    }
+
+    columns = {}
+    for i, col in enumerate(creditos_header()):
+        # Repeated headers get a positional name here and are written back with the original one
+        name = col if col not in columns else f"{col}_duplicated_{i}"
+        if col in special:
+            columns[name] = special[col]()
+        elif types.get(col) == 'Timestamp':
+            columns[name] = dates(rng, n_rows)
+        elif types.get(col) == 'Float':
+            columns[name] = money(rng, n_rows)
+        elif types.get(col) == 'Integer':
+            columns[name] = numbers(rng, 0, 400, n_rows)
+        else:
+            columns[name] = choice(rng, [f"{col[:8].upper()} {k}" for k in range(20)], n_rows, null_rate=0.05)
+    return pl.DataFrame(columns)
+
+
+def radicados_frame(n_rows: int, seed: int=42, offset: int=0) -> pl.DataFrame:
+    rng = np.random.default_rng(seed)
+    groups = list(FBSTransformer.working_group_dict.keys()) + ['XYZ']
+    destino = pl.concat_str(
+        pl.lit(choice(rng, ['PROFESIONAL', 'TECNICO', 'AUXILIAR', 'COORDINADOR'], n_rows)),
+        pl.lit(choice(rng, groups, n_rows)),
+        pl.lit(people(rng, n_rows)),
+        separator='-'
+    )
+    # Some destinations are just a person's name (no group)
+    destino = pl.when(pl.lit(rng.random(n_rows) < 0.15)).then(pl.lit(people(rng, n_rows))).otherwise(destino)
+    radicado = pl.concat_str(pl.lit('2024ER'), pl.lit(pl.Series(np.arange(offset, offset + n_rows)).cast(pl.String).str.zfill(8)))
+    return pl.DataFrame({
+        'Radicado': pl.select(radicado).to_series(),
+        'Fecha Radicacion': dates(rng, n_rows, with_time=1.0, separators=['/']),
+        'Procedencia': people(rng, n_rows),
+        'Detalle': choice(rng, ['SOLICITUD DE CRÉDITO', 'PETICIÓN', 'QUEJA', 'DERECHO DE PETICIÓN; "URGENTE"'], n_rows),
+        'Naturaleza': choice(rng, ['PETICION', 'QUEJA', 'RECLAMO', 'SUGERENCIA'], n_rows),
+        'Medio': choice(rng, ['CORREO', 'WEB', 'PRESENCIAL'], n_rows),
+        'Expediente': choice(rng, [f"EXP-{k:04d}" for k in range(500)], n_rows, null_rate=0.3),
+        'Destino': pl.select(destino).to_series(),
+        'Rpta': numbers(rng, 0, 2, n_rows),
+        'Opciones': choice(rng, ['', 'ANEXOS'], n_rows, null_rate=0.5),
+    })
+
+
+GENERATORS = {'creditos': creditos_frame, 'radicados': radicados_frame}
+
+
+def export_path(target: str, n_rows: int, seed: int) -> str:
+    return os.path.join(DATA_DIR, f"{target}_{n_rows}_{seed}.csv")
+
+
+def write_export(target: str, n_rows: int, seed: int=42) -> str:
+    """Write (once) the synthetic export of `target` and return its path."""
+    path = export_path(target, n_rows, seed)
+    if os.path.exists(path):
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        if target == 'creditos':
+            # The credit export starts with a title line (skipped by the reader)
+            f.write("Reporte de creditos\n".encode('latin1'))
+        # Chunks bound the memory used by the 10M row exports
+        for offset in range(0, n_rows, WRITE_CHUNK_ROWS):
+            chunk = GENERATORS[target](min(WRITE_CHUNK_ROWS, n_rows - offset), seed=seed + offset, offset=offset)
+            if offset == 0:
+                header = creditos_header() if target == 'creditos' else chunk.columns
+                f.write((";".join(header) + "\n").encode('latin1'))
+            f.write(chunk.write_csv(separator=';', include_header=False).encode('latin1'))
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,82 @@
+"""
+Benchmark de llamadas a la API al resolver metadatos: the previous resolver (one
+`list_files_and_folders` per path name, in sequence, and the whole raw folder listed)
+against `read_metadata` (OR'ed names in one query, batch requests and the newest raw file
+only), both without the metadata index and through the stubbed Drive (`benchmarks.stubs`).
+Calls are counted per target with `RunMetrics` (per API method) and at the HTTP layer.
+
+    python -m benchmarks.metadata_calls --targets creditos radicados
+"""
+import argparse
+from loguru import logger
+from benchmarks.stubs import build_stub_services, drive_tree
+from src import gdrive_handler
+from src.gdrive_handler import list_all_shared_drives, list_files_and_folders, read_metadata
+from src.metrics import RunMetrics
+
+LAYERS = {'raw': 'crudos', 'modeled': 'modelados'}
+
+
+def sequential_metadata(service, target_drive_name: str, target_parents: list, target_folders: list, data_layer: str) -> dict:
+    """Resolution as done before the batched resolver, kept here for comparison."""
+    target_drive_id = next((d['id'] for d in list_all_shared_drives(service=service) if d['name'] == target_drive_name), None)
+    for p in target_parents:
+        files_and_folders = list_files_and_folders(service, location_id=target_drive_id, is_shared_drive=True, search_name=p)
+        target_drive_id = files_and_folders[0]['id'] if p else None
+
+    for f in target_folders:
+        folder_match = next(d for d in files_and_folders if d.get("name") == f)
+        if data_layer == 'raw':
+            files_dict = {'folder_id': folder_match['id'], 'files': list_files_and_folders(service, location_id=folder_match['id'], is_shared_drive=True)}
+        else:
+            auth_log = next((d for d in files_and_folders if d.get("name") == "auditoria"), None)
+            files_dict = {'folder_id': folder_match['id'], 'files': [folder_match, auth_log]}
+    return files_dict
+
+
+def newest(files_dict: dict) -> dict:
+    return max(files_dict['files'], key=lambda x: x['createdTime'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Metadata resolution API calls benchmark")
+    parser.add_argument('--targets', nargs='+', default=['creditos', 'radicados', 'desembolsos'])
+    parser.add_argument('--files-per-target', type=int, default=150)
+    args = parser.parse_args()
+
+    logger.remove()
+    drive_service, _, http = build_stub_services(tree=drive_tree(args.targets, files_per_target=args.files_per_target))
+    metrics = {'sequential': RunMetrics(), 'batched': RunMetrics()}
+    gdrive_handler.shared_drive_ids.clear()
+
+    for target in args.targets:
+        for layer in LAYERS:
+            query = {'target_drive_name': 'Planeacion', 'target_parents': ['3 Datos', LAYERS[layer], None], 'target_folders': [target], 'data_layer': layer}
+            results = {}
+            for name, resolve in (('sequential', lambda: sequential_metadata(drive_service, **query)),
+                                  ('batched', lambda: read_metadata(drive_service, latest_only=layer == 'raw', **query))):
+                calls_before = http.calls
+                with metrics[name].stage('get_metadata', target=target, layer=layer) as stage:
+                    results[name] = resolve()
+                stage['http_requests'] = http.calls - calls_before
+
+            # Same file for the extraction, same sheets for the load
+            if layer == 'raw':
+                assert newest(results['sequential']) == newest(results['batched']), f"Different newest file for '{target}'"
+                assert len(results['batched']['files']) == 1
+            else:
+                assert results['sequential'] == results['batched'], f"Different modeled files for '{target}'"
+
+            sequential, batched = (metrics[name].stages[-1] for name in ('sequential', 'batched'))
+            print(
+                f"{target:<12} {layer:<8} | sequential: {sequential['http_requests']:>2} request(s) {sequential['api_calls']} "
+                f"| batched: {batched['http_requests']:>2} request(s) {batched['api_calls']} "
+                f"| files listed {len(results['sequential']['files'])} -> {len(results['batched']['files'])}"
+            )
+
+    totals = {name: sum(s['http_requests'] for s in m.stages) for name, m in metrics.items()}
+    per_target = {name: total / len(args.targets) for name, total in totals.items()}
+    print(
+        f"per target (raw + modeled): sequential {per_target['sequential']:.1f} request(s), batched {per_target['batched']:.1f} "
+        f"request(s), x{per_target['sequential'] / per_target['batched']:.1f} fewer"
+    )
@@ -0,0 +1,163 @@
+"""
+Suite de benchmarks del pipeline sobre datos sinteticos y servicios de Google simulados.
+
+Every target is generated at each size and timed stage by stage:
+parse (download through the stub + typed CSV read), transform (`raw_<target>_`),
+diff (`authlog_table_hashed` against a perturbed copy) and serialise
+(`write_dataframe_to_sheet` through the stub). Results are saved as JSON and compared
+with a stored baseline; a slower stage beyond the tolerance makes the run exit with 1.
+
+    python -m benchmarks.run --rows 10000 100000 1000000
+    python -m benchmarks.run --rows 10000 100000 --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+import numpy as np
+import polars as pl
+from loguru import logger
+from benchmarks.generators import write_export
+from benchmarks.stubs import build_stub_services
+import src.log_handler as log_handler
+from src.dictionary_cache import dictionary_cache
+from src.gdrive_handler import download_csv_into_polars
+from src.gsheets_handler import write_dataframe_to_sheet
+from src.schema_compiler import schema_compiler, csv_read_options, DICTIONARY_PATH, SOURCE_READ_HINTS
+from src.transformation_layer import FBSTransformer
+
+
+RESULTS_DIR = 'benchmarks/results'
+BASELINE_PATH = 'benchmarks/baseline.json'
+# Differences below this many seconds are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def timed(func, repeat: int) -> tuple:
+    """Run `func` `repeat` times; return every duration and the first result."""
+    runs, result = [], None
+    for i in range(repeat):
+        start = time.perf_counter()
+        output = func()
+        runs.append(time.perf_counter() - start)
+        if i == 0:
+            result = output
+    return runs, result
+
+
+def perturb(df: pl.DataFrame, id_col: str, target_cols: list, seed: int) -> pl.DataFrame:
+    """Previous version of `df`: ~1% of rows modified, ~0.5% missing (new now) and ~0.5% extra (deleted now)."""
+    rng = np.random.default_rng(seed)
+    draw = pl.Series(rng.random(df.height))
+    previous = df.with_columns(
+        pl.when(pl.lit(draw) < 0.01).then(pl.lit('CAMBIO')).otherwise(pl.col(target_cols[0]).cast(pl.String)).alias(target_cols[0])
+    ).filter(pl.lit(draw) < 0.995)
+    deleted = previous.head(max(df.height // 200, 1)).with_columns(pl.concat_str(pl.col(id_col), pl.lit('-X')).alias(id_col))
+    return pl.concat([previous, deleted], how='vertical_relaxed')
+
+
+def run_target(target: str, n_rows: int, repeat: int, seed: int) -> list:
+    drive_service, sheets_service, http = build_stub_services(media_files={target: write_export(target, n_rows, seed=seed)})
+    dictionary = dictionary_cache.load(DICTIONARY_PATH)[target]
+    read_options = csv_read_options(schema_compiler.get_plan(DICTIONARY_PATH, target), **SOURCE_READ_HINTS.get(target, {}))
+    id_col = dictionary.filter(pl.col('Jerarquia') == 'PK')['Nombre_columna'][0]
+
+    results = []
+
+    def record(stage: str, runs: list, **extra) -> None:
+        results.append({'target': target, 'rows': n_rows, 'stage': stage, 'seconds': round(min(runs), 4), 'runs': [round(r, 4) for r in runs], **extra})
+        logger.info(f"{target:>10} {n_rows:>9} rows | {stage:<9} | {min(runs):8.3f}s")
+
+    runs, raw_df = timed(lambda: download_csv_into_polars(
+        drive_service, file_id=target, file_name=target, is_shared_drive=True, data_layer='crudos', read_options=read_options
+    ), repeat)
+    assert isinstance(raw_df, pl.DataFrame), f"Synthetic {target} export could not be parsed"
+    record('parse', runs, bytes=http.bytes_received // repeat)
+
+    runs, df = timed(lambda: FBSTransformer.run(f'raw_{target}_', raw_df), repeat)
+    record('transform', runs)
+
+    audited = [c for c in dictionary.filter(pl.col('Sujeto_auditoria') == 1)['Nombre_columna'] if c in df.columns] or [df.columns[1]]
+    previous = perturb(df, id_col=id_col, target_cols=audited, seed=seed)
+    runs, logs = timed(lambda: log_handler.authlog_table_hashed(df, log_root=f"benchmark_{target}", id_col=id_col, target_cols=audited, df_modeled=previous, save_hashes=False), repeat)
+    record('diff', runs, changes=logs.height)
+
+    sent_before = http.bytes_sent
+    runs, _ = timed(lambda: write_dataframe_to_sheet(sheets_service, df, 'benchmark', sheet_name=target), repeat)
+    record('serialise', runs, bytes=(http.bytes_sent - sent_before) // repeat)
+    return results
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """Stages slower than the baseline by more than `tolerance` (relative) and MIN_REGRESSION_SECONDS."""
+    base = {(r['target'], r['rows'], r['stage']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    for r in results:
+        reference = base.get((r['target'], r['rows'], r['stage']))
+        if reference is None:
+            continue
+        ratio = r['seconds'] / reference if reference else float('inf')
+        status = 'REGRESSION' if ratio > 1 + tolerance and r['seconds'] - reference > MIN_REGRESSION_SECONDS else 'ok'
+        print(f"{r['target']:>10} {r['rows']:>9} {r['stage']:<9} {reference:8.3f}s -> {r['seconds']:8.3f}s  x{ratio:5.2f}  {status}")
+        if status != 'ok':
+            regressions.append({**r, 'baseline_seconds': reference, 'ratio': round(ratio, 3)})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="FBS pipeline benchmarks")
+    parser.add_argument('--targets', nargs='+', default=['creditos', 'radicados'])
+    parser.add_argument('--rows', nargs='+', type=int, default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Only the benchmark's own lines, not the pipeline's debug logs
+    logger.remove()
+    logger.add(sys.stderr, level='INFO', filter=lambda record: record['name'] == '__main__')
+    log_handler.ROW_HASH_DIR = tempfile.mkdtemp(prefix='benchmark_hashes_')
+
+    results = []
+    for n_rows in args.rows:
+        for target in args.targets:
+            results.extend(run_target(target, n_rows, repeat=args.repeat, seed=args.seed))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'polars': pl.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'lazy_transform': FBSTransformer.lazy,
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"Results saved to {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), tolerance=args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline.")
+            sys.exit(1)
+    else:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to store one.")
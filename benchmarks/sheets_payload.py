@@ -0,0 +1,49 @@
+"""
+Benchmark del payload de Google Sheets: `dataframe.rows()` + json (the previous path in
+`write_dataframe_to_sheet`) against the columnar encoder in `src.sheets_encoder`.
+
+    python -m benchmarks.sheets_payload
+"""
+import json
+import time
+import random
+from datetime import date, timedelta
+import polars as pl
+from src.sheets_encoder import encode_values_body
+
+
+def build_frame(n_rows: int, seed: int=42) -> pl.DataFrame:
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    return pl.DataFrame({
+        'Crédito': [str(100000 + i) for i in range(n_rows)],
+        'EstadoCrédito': [rng.choice(['Terminado', 'Vigente', 'Castigado', None]) for _ in range(n_rows)],
+        'Monto': [rng.choice([rng.uniform(1e5, 1e8), float('nan'), None]) for _ in range(n_rows)],
+        'Plazo': [rng.randint(1, 120) for _ in range(n_rows)],
+        'FechaSolicitud': [start + timedelta(days=rng.randint(0, 3650)) for _ in range(n_rows)],
+        'Nombre Deudor': [f'DEUDOR "{rng.randint(0, 99999)}" ÑAÑEZ' for _ in range(n_rows)],
+    })
+
+
+def rows_payload(df: pl.DataFrame) -> bytes:
+    # What the previous path did: stringify dates, drop NaN, build tuples, let json serialise them
+    df = df.with_columns(pl.col(pl.Date).dt.strftime("%Y-%m-%d"), pl.col(pl.Float64).fill_nan(None))
+    return json.dumps({'values': [df.columns] + df.rows()}).encode('utf-8')
+
+
+def timed(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    for n_rows in (100_000, 1_000_000):
+        df = build_frame(n_rows)
+        rows_seconds, rows_body = timed(rows_payload, df)
+        columnar_seconds, columnar_body = timed(encode_values_body, df)
+        assert json.loads(rows_body) == json.loads(columnar_body)
+        print(
+            f"{n_rows:>9} rows | rows(): {rows_seconds:7.3f}s | columnar: {columnar_seconds:7.3f}s "
+            f"| speed-up x{rows_seconds / columnar_seconds:5.1f} | payload {len(columnar_body) / 1024 / 1024:.1f} Mb"
+        )
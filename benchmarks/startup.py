@@ -0,0 +1,76 @@
+"""
+Benchmark de arranque: cold-start time of a no-op pipeline run in fresh interpreters.
+
+Each repetition starts a new Python process that imports `etl`, builds a pipeline and a
+runner and runs them with no targets (no credentials, services or API calls are needed).
+A second measure builds the Drive and Sheets services in replay mode, which reads the
+cached discovery documents. The slowest imports of the last run are listed.
+
+    python -m benchmarks.startup --repeat 5
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+
+NO_OP_RUN = """
+import time
+start = time.perf_counter()
+import etl
+imported = time.perf_counter()
+etl.PipelineRunner(max_workers=1, metrics=etl.RunMetrics()).run(targets=[])
+print({'import_seconds': imported - start, 'run_seconds': time.perf_counter() - start})
+"""
+
+SERVICE_BUILD = """
+import time
+from src.extraction_layer import FBSExtractor
+start = time.perf_counter()
+extractor = FBSExtractor()
+extractor.drive_service, extractor.sheets_service
+print({'services_seconds': time.perf_counter() - start})
+"""
+
+
+def run_python(code: str, env: dict, importtime: bool=False) -> tuple:
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return eval(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime_log: str, top: int, depth: int=1) -> list:
+    """Modules imported at `depth` (1: by `etl` itself) of an `-X importtime` log, by cumulative microseconds."""
+    modules = []
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Names are indented two spaces per nesting level, after one separator space
+        if cumulative.strip().isdigit() and (len(name) - len(name.lstrip()) - 1) // 2 == depth:
+            modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Startup benchmark")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    env = {**os.environ, 'METRICS_DIR': tempfile.mkdtemp(prefix='startup_metrics_'), 'GOOGLE_API_MODE': 'replay'}
+    runs = [run_python(NO_OP_RUN, env)[0] for _ in range(args.repeat)]
+    services = [run_python(SERVICE_BUILD, env)[0] for _ in range(args.repeat)]
+    _, importtime_log = run_python(NO_OP_RUN, env, importtime=True)
+
+    report = {
+        'import_seconds': round(min(r['import_seconds'] for r in runs), 3),
+        'no_op_run_seconds': round(min(r['run_seconds'] for r in runs), 3),
+        'build_services_seconds': round(min(s['services_seconds'] for s in services), 4),
+    }
+    print(json.dumps(report, indent=1))
+    print("Slowest imports (cumulative):")
+    for microseconds, name in slowest_imports(importtime_log, args.top):
+        print(f"{microseconds / 1e6:8.3f}s  {name}")
@@ -0,0 +1,163 @@
+"""
+Servicios de Google simulados para los benchmarks.
+
+The Drive and Sheets clients are the real googleapiclient ones, built from the cached
+discovery documents (`src.google_services`), so request building and serialisation are
+measured; only the HTTP layer is replaced. Media downloads are served (with Range support) from local files,
+and Drive listings (`q` by parent and names, `orderBy`, pages, batch requests) from an in-memory tree.
+"""
+import re
+import json
+import mmap
+import time
+import threading
+import urllib.parse
+from datetime import datetime, timedelta
+import httplib2
+from src.google_services import build_service
+
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+SHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+
+
+def drive_tree(targets: list, files_per_target: int=30, drive_name: str='Planeacion') -> dict:
+    """Shared drives and file records laid out like the pipeline's drive: '3 Datos/crudos/<target>/<date>_<target>.csv'."""
+    drives = [{'id': 'drive-archivo', 'name': 'Archivo'}, {'id': 'drive-planeacion', 'name': drive_name}]
+    files = []
+
+    def add(name: str, parent: str, mime_type: str=FOLDER_MIME_TYPE, created: datetime=datetime(2024, 1, 1)) -> str:
+        file_id = f"{parent}/{name}"
+        files.append({'id': file_id, 'name': name, 'mimeType': mime_type, 'parents': [parent], 'createdTime': created.isoformat() + 'Z'})
+        return file_id
+
+    # A same-named folder in another drive, which the path walk must not pick
+    add('3 Datos', 'drive-archivo')
+    datos = add('3 Datos', 'drive-planeacion')
+    crudos, modelados = add('crudos', datos), add('modelados', datos)
+    add('auditoria', modelados, mime_type=SHEET_MIME_TYPE)
+    for target in targets:
+        folder = add(target, crudos)
+        for day in range(files_per_target):
+            created = datetime(2024, 1, 1) + timedelta(days=day)
+            add(f"{created:%Y%m%d}_{target}.csv", folder, mime_type='text/csv', created=created)
+        add(target, modelados, mime_type=SHEET_MIME_TYPE)
+    return {'drives': drives, 'files': files}
+
+
+def list_tree(tree: dict, params: dict) -> dict:
+    """Answer a `files().list` query string (already parsed) from a `drive_tree`."""
+    q = params.get('q', '')
+    parents = re.findall(r"'([^']+)' in parents", q)
+    names = [re.sub(r"\\(.)", r"\1", n) for n in re.findall(r"name = '((?:[^'\\]|\\.)*)'", q)]
+    files = [
+        f for f in tree['files']
+        if (not parents or parents[0] in f['parents']) and (not names or f['name'] in names)
+    ]
+    if params.get('orderBy') == 'createdTime desc':
+        files = sorted(files, key=lambda f: f['createdTime'], reverse=True)
+    start, size = int(params.get('pageToken', 0)), int(params.get('pageSize', 100))
+    page = {'files': files[start:start + size]}
+    if start + size < len(files):
+        page['nextPageToken'] = str(start + size)
+    return page
+
+
+class StubHttp:
+    """httplib2-compatible object answering the Drive and Sheets calls made by the pipeline."""
+
+    def __init__(self, media_files: dict=None, tree: dict=None, latency: float=0.0, mbps: float=None):
+        self.tree = tree or {'drives': [], 'files': []}
+        # Optional network model: seconds added to every request and media bandwidth in MB/s
+        self.latency = latency
+        self.mbps = mbps
+        self.media = {}
+        for file_id, path in (media_files or {}).items():
+            with open(path, 'rb') as f:
+                self.media[file_id] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def count(self, sent: int, received: int) -> None:
+        with self.lock:
+            self.calls += 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def respond(self, payload: dict, status: int=200) -> tuple:
+        return httplib2.Response({'status': str(status), 'content-type': 'application/json'}), json.dumps(payload).encode('utf-8')
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        sent = len(body or b'')
+        if self.latency:
+            time.sleep(self.latency)
+
+        media = re.search(r'/files/([^/?]+)\?.*alt=media', uri)
+        if media:
+            blob = self.media[media.group(1)]
+            start, end = 0, len(blob) - 1
+            if 'range' in headers:
+                start, end = (int(x) for x in headers['range'].split('=')[1].split('-'))
+                end = min(end, len(blob) - 1)
+            content = blob[start:end + 1]
+            if self.mbps:
+                time.sleep(len(content) / (self.mbps * 1024 * 1024))
+            self.count(sent, len(content))
+            return httplib2.Response({
+                'status': '206' if 'range' in headers else '200',
+                'content-range': f"bytes {start}-{end}/{len(blob)}",
+                'content-length': str(len(content)),
+            }), content
+
+        if '/batch/' in uri:
+            content_type, content = self.answer_batch(body)
+            self.count(sent, len(content))
+            return httplib2.Response({'status': '200', 'content-type': content_type}), content
+
+        response = self.answer(method, uri, body)
+        self.count(sent, 0)
+        return self.respond(response)
+
+    def answer(self, method: str, uri: str, body=None) -> dict:
+        path, _, query = uri.partition('?')
+        params = dict(urllib.parse.parse_qsl(query))
+        if path.endswith('/drive/v3/drives'):
+            return {'drives': self.tree['drives']}
+        if path.endswith('/drive/v3/files'):
+            return list_tree(self.tree, params)
+        if ':clear' in uri:
+            response = {'clearedRange': uri.split('/values/')[1].split(':')[0]}
+        elif '/values/' in uri and method == 'PUT':
+            # Only the row count is read back from the body, cell counts are estimated
+            rows = body.count(b'],[') + 1 if body else 0
+            response = {'updatedRows': rows, 'updatedCells': rows}
+        elif ':batchUpdate' in uri:
+            response = {'replies': []}
+        else:
+            response = {'sheets': []}
+        return response
+
+    def answer_batch(self, body) -> tuple:
+        """Multipart response of a batch request, one part per inner request."""
+        body = body.decode('utf-8') if isinstance(body, bytes) else body
+        boundary = 'batch_stub_boundary'
+        parts = []
+        for content_id, method, uri in re.findall(r"Content-ID: <([^>]+)>\s+(\w+) (\S+) HTTP/1.1", body):
+            payload = json.dumps(self.answer(method, uri))
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{payload}\r\n"
+            )
+        content = "".join(parts) + f"--{boundary}--\r\n"
+        return f"multipart/mixed; boundary={boundary}", content.encode('utf-8')
+
+
+def build_stub_services(media_files: dict=None, tree: dict=None, latency: float=0.0, mbps: float=None) -> tuple:
+    """(drive_service, sheets_service, http) sharing one StubHttp."""
+    http = StubHttp(media_files=media_files, tree=tree, latency=latency, mbps=mbps)
+    drive_service = build_service('drive', 'v3', http=http)
+    sheets_service = build_service('sheets', 'v4', http=http)
+    return drive_service, sheets_service, http
@@ -1,18 +1,30 @@
 # Import libraries
 from loguru import logger
 import polars as pl
-import pandas as pd
 from src.transformation_layer import transformer
-from src.extraction_layer import extractor
+from src.extraction_layer import FBSExtractor, extractor
 from src.gdrive_handler import read_metadata
-from src.gsheets_handler import write_dataframe_to_sheet
+from src.metadata_index import drive_index
+from src.snapshot_store import snapshot_store
+from src.dictionary_cache import dictionary_cache
+from src.metrics import RunMetrics, frame_size
+from src.gsheets_handler import write_dataframe_to_sheet, write_dataframe_incremental
 # from src.db_manager import db_admin
+from src.backfill import RawBackfill, SOURCE_FILE_COL, SOURCE_DATE_COL
+from src.watcher import DriveWatcher
 from src.log_handler import (
     authlog_table, 
     get_table_updated, 
     map_data_types
 )
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import signal
+import threading
+import time
+import os
+from datetime import date
 
 
 # Load environment variables
@@ -21,14 +33,38 @@ load_dotenv()
 # Create object to handle the ETL process
 class ETLDataPipeline:
     
-    output = {}
     layers = {'raw': 'crudos', 'modeled': 'modelados'}
+    incremental_load = os.getenv('INCREMENTAL_LOAD', '1') == '1'
+    keep_snapshots = os.getenv('KEEP_SNAPSHOTS', '1') == '1'
+    # Without the local index folders are resolved with (batched) Drive queries on every run
+    use_drive_index = os.getenv('USE_DRIVE_INDEX', '1') == '1'
+    # Folder listings (Drive token) and large sheet writes (Sheets token) over pooled async transports (live mode only)
+    use_async_transport = os.getenv('ASYNC_TRANSPORT', '1') == '1'
+
+    def __init__(self, extractor: FBSExtractor=extractor, metrics: RunMetrics=None):
+        # State is kept per instance so several pipelines can run at the same time
+        self.extractor = extractor
+        self.metrics = metrics or RunMetrics()
+        self.target_name = None
+        self.output = {}
+        self.metadata = None
+        self.df = None
+        self.current_layer = None
+        self.selected_file = None
+
+    def get_transport(self):
+        if self.use_async_transport and self.extractor.api_mode == 'live':
+            return self.extractor.transport
+        return None
+
+    def get_sheets_transport(self):
+        if self.use_async_transport and self.extractor.api_mode == 'live':
+            return self.extractor.sheets_transport
+        return None
 
-    @classmethod
     def get_ouptut(self) -> dict:
         return self.output
     
-    @classmethod
     def filter_files_metadata(self, target_name: str, layer: str) -> dict:
         if layer == "raw":
             return [d for d in self.metadata['files'] if d['name'].split("_")[1].split(".")[0] == target_name][0]
@@ -37,31 +73,38 @@ class ETLDataPipeline:
         else:
             return {}
 
-    @classmethod
-    def get_metadata(self, target: list, data_layer: str) -> None:
+    def get_metadata(self, target: list, data_layer: str, latest_only: bool=None) -> None:
         self.current_layer = data_layer
-        self.metadata = read_metadata(
-            service=extractor.drive_service,
-            target_drive_name='Planeacion',  
-            target_parents=['3 Datos', self.layers[data_layer], None],
-            target_folders=target,
-            data_layer=self.current_layer,
-        )
+        self.target_name = target[0]
+        with self.metrics.stage('get_metadata', target=self.target_name, layer=data_layer) as stage:
+            self.metadata = read_metadata(
+                service=self.extractor.drive_service,
+                target_drive_name='Planeacion',  
+                target_parents=['3 Datos', self.layers[data_layer], None],
+                target_folders=target,
+                data_layer=self.current_layer,
+                metadata_index=drive_index if self.use_drive_index else None,
+                transport=None if self.use_drive_index else self.get_transport(),
+                # Raw extraction only reads the newest file of the folder
+                latest_only=data_layer == 'raw' if latest_only is None else latest_only,
+            )
+            stage['rows_out'] = len((self.metadata or {}).get('files', []))
 
-    @classmethod
     def extract_(self, files: dict=None, target: str=None) -> None:
         method_name = f"{self.current_layer}_data_extraction"
-        method_to_call = getattr(extractor, method_name, None)
+        method_to_call = getattr(self.extractor, method_name, None)
 
-        try:
-            self.df, self.selected_file = method_to_call(files=files, layer=self.current_layer, target=target)
-        except Exception as e:
-            self.df, self.selected_file = None, None
-            logger.error(f"Target '{target[0]}' not recognized for extraction. Method or subject doesn't exist. Error: {e}")
+        with self.metrics.stage('extract', target=target[0], layer=self.current_layer) as stage:
+            try:
+                self.df, self.selected_file = method_to_call(files=files, layer=self.current_layer, target=target)
+            except Exception as e:
+                self.df, self.selected_file = None, None
+                logger.error(f"Target '{target[0]}' not recognized for extraction. Method or subject doesn't exist. Error: {e}")
+            size = frame_size(self.df)
+            stage.update(bytes_in=int((self.selected_file or {}).get('size', 0)) or None, rows_out=size['rows'], bytes_out=size['bytes'])
 
         logger.info(f"Extract: {self.current_layer} file {self.selected_file['name']} saved into polars dataframe {self.df.shape}")
 
-    @classmethod
     def transform_(self) -> None:
         # Transform the data
         clean_name = self.selected_file['name']
@@ -71,51 +114,237 @@ class ETLDataPipeline:
                 clean_name = self.selected_file['name'].split("_")[1].split(".")[0]
 
         method_name = f"{self.current_layer}_{clean_name}_"
-        method_to_call = getattr(transformer, method_name, None)
 
-        try:
-            df = method_to_call(self.df)
-        except Exception as e:
-            logger.error(f"Target '{clean_name}' not recognized for transformation. Method or subject doesn't exist. Error: {e}")
+        size = frame_size(self.df)
+        with self.metrics.stage('transform', target=clean_name, layer=self.current_layer, rows_in=size['rows'], bytes_in=size['bytes']) as stage:
+            try:
+                if self.metrics.dump_query_plan:
+                    stage['plan'] = self.metrics.dump_plan(transformer.explain(method_name=method_name, df=self.df), target=clean_name, layer=self.current_layer)
+                # Lazy mode returns the plan, collected once before the load (`collect_`)
+                df = transformer.run(method_name=method_name, df=self.df, collect=False)
+            except Exception as e:
+                logger.error(f"Target '{clean_name}' not recognized for transformation. Method or subject doesn't exist. Error: {e}")
+                # Nothing to keep nor load, the runner reports the target as failed
+                raise
+            size = frame_size(df)
+            stage.update(rows_out=size['rows'], bytes_out=size['bytes'])
         
         logger.info(f"Transform: {self.current_layer} data from {self.selected_file['name']} processed successfully.")    
         # db_admin.create_duckdb_table_from_dataframe(data=df, table_name=f"{self.current_layer}_{clean_name}")
         self.output[self.current_layer] = df
 
-    @classmethod
-    def load_(self, df: pl.DataFrame, spreadsheet_id: str) -> None:
-        api_response = write_dataframe_to_sheet(
-            service=extractor.sheets_service,
-            dataframe=df, 
-            spreadsheet_id=spreadsheet_id,
-            sheet_name="Hoja 1",
-            clear_existing=True
-        )
+    def collect_(self, layer: str) -> pl.DataFrame:
+        """Run the transformation plan of a layer (lazy mode), once."""
+        df = self.output[layer]
+        if isinstance(df, pl.LazyFrame):
+            with self.metrics.stage('collect', target=self.target_name, layer=layer) as stage:
+                df = df.collect()
+                size = frame_size(df)
+                stage.update(rows_out=size['rows'], bytes_out=size['bytes'])
+            self.output[layer] = df
+        return df
+
+    def load_(self, df: pl.DataFrame, spreadsheet_id: str, primary_key: str=None) -> None:
+        size = frame_size(df)
+        with self.metrics.stage('load', target=self.target_name, layer=self.current_layer, rows_in=size['rows'], bytes_in=size['bytes']) as stage:
+            # Send only the changed cells when the table has a primary key
+            if primary_key and self.incremental_load:
+                api_response = write_dataframe_incremental(
+                    service=self.extractor.sheets_service,
+                    dataframe=df,
+                    spreadsheet_id=spreadsheet_id,
+                    primary_key=primary_key,
+                    sheet_name="Hoja 1",
+                    transport=self.get_sheets_transport(),
+                    credentials=self.extractor.sheets_credentials
+                )
+            else:
+                api_response = write_dataframe_to_sheet(
+                    service=self.extractor.sheets_service,
+                    dataframe=df, 
+                    spreadsheet_id=spreadsheet_id,
+                    sheet_name="Hoja 1",
+                    clear_existing=True,
+                    transport=self.get_sheets_transport(),
+                    credentials=self.extractor.sheets_credentials
+                )
+            stage['cells_out'] = (api_response or {}).get('updatedCells')
         logger.info(f"Load files into google sheets, response={api_response}")
+
+        if api_response is None:
+            logger.error(f"Load of {self.target_name} failed, no snapshot of this run is kept.")
+            return
+        if self.keep_snapshots:
+            self.snapshot_(df)
+
+    def snapshot_(self, df: pl.DataFrame) -> None:
+        """
+        Keep the history of a loaded run: the raw output (source tags included in backfills) and,
+        as the modeled layer, the frame now in the modeled sheet. Both regular runs and backfills.
+        """
+        frames = {'raw': self.output.get('raw'), 'modeled': df}
+        for layer, frame in frames.items():
+            if not isinstance(frame, pl.DataFrame):
+                continue
+            try:
+                snapshot_store.write(df=frame, target=self.target_name, layer=layer)
+            except Exception as e:
+                logger.error(f"Snapshot of {layer} data from {self.target_name} could not be written. Error: {e}")
   
+class PipelineRunner:
+    """
+    Runs the ETL of several targets at the same time on a bounded thread pool.
+    The work is dominated by network I/O, so each worker thread gets its own
+    extractor (Google API clients are not thread safe) and its own pipeline.
+    """
+
+    def __init__(self, max_workers: int=4, layers: list=None, primary_keys: dict=None, metrics: RunMetrics=None):
+        self.max_workers = max_workers
+        self.layers = layers or ['raw']
+        self.primary_keys = primary_keys or {}
+        self.metrics = metrics or RunMetrics()
+        self.thread_local = threading.local()
+        self.extractors = []
+        self.extractors_lock = threading.Lock()
+
+    def get_extractor(self) -> FBSExtractor:
+        if getattr(self.thread_local, 'extractor', None) is None:
+            self.thread_local.extractor = FBSExtractor()
+            with self.extractors_lock:
+                self.extractors.append(self.thread_local.extractor)
+        return self.thread_local.extractor
+
+    def close(self) -> None:
+        """Close the transports of the extractors built so far; the next run builds new ones."""
+        with self.extractors_lock:
+            extractors, self.extractors = self.extractors, []
+        self.thread_local = threading.local()
+        for e in extractors:
+            try:
+                e.close()
+            except Exception as error:
+                logger.warning(f"Transport of an extractor could not be closed. Error: {error}")
+
+    def run_target(self, target_name: str) -> dict:
+        start = time.perf_counter()
+        target = [target_name]
+        pipeline = ETLDataPipeline(extractor=self.get_extractor(), metrics=self.metrics)
+
+        # Run the ETL process for each layer
+        for l in self.layers:
+            pipeline.get_metadata(target=target, data_layer=l)
+            pipeline.extract_(files=pipeline.metadata, target=target)
+            pipeline.transform_()
+
+        pipeline.get_metadata(target=target, data_layer="modeled")
+        target_meta = pipeline.filter_files_metadata(target_name=target_name, layer="modeled")
+
+        # The plans run at the load boundary, once each
+        for l in self.layers:
+            pipeline.collect_(l)
+        pipeline.load_(df=pipeline.output["raw"], spreadsheet_id=target_meta['id'], primary_key=self.primary_keys.get(target_name))
+        return {'target': target_name, 'status': 'success', 'seconds': round(time.perf_counter() - start, 3)}
+
+    def run_backfill(self, target_name: str, start_date: date=None, end_date: date=None) -> dict:
+        """Rebuild a target from all its raw exports (see `src.backfill`) and load it into its modeled sheet."""
+        start = time.perf_counter()
+        target = [target_name]
+        pipeline = ETLDataPipeline(extractor=self.get_extractor(), metrics=self.metrics)
+
+        pipeline.get_metadata(target=target, data_layer='raw', latest_only=False)
+        backfill = RawBackfill(workers=self.max_workers, metrics=self.metrics)
+        df = backfill.run(
+            target=target_name,
+            files=pipeline.metadata['files'],
+            primary_key=self.primary_keys.get(target_name),
+            start_date=start_date,
+            end_date=end_date
+        )
+        if df is None:
+            return {'target': target_name, 'status': 'skipped', 'seconds': round(time.perf_counter() - start, 3)}
+        pipeline.output['raw'] = df
+
+        pipeline.get_metadata(target=target, data_layer="modeled")
+        target_meta = pipeline.filter_files_metadata(target_name=target_name, layer="modeled")
+
+        # The source tags stay out of the sheet
+        pipeline.load_(df=df.drop(SOURCE_FILE_COL, SOURCE_DATE_COL), spreadsheet_id=target_meta['id'], primary_key=self.primary_keys.get(target_name))
+        return {'target': target_name, 'status': 'success', 'seconds': round(time.perf_counter() - start, 3), **backfill.reports[target_name]}
+
+    def run(self, targets: list) -> list:
+        start = time.perf_counter()
+        results = []
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='etl') as executor:
+                futures = {executor.submit(self.run_target, t): (t, time.perf_counter()) for t in targets}
+                for future in as_completed(futures):
+                    target_name, submitted = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'target': target_name, 'status': 'failed', 'seconds': round(time.perf_counter() - submitted, 3), 'error': str(e)}
+                        logger.error(f"ETL for target '{target_name}' failed. Error: {e}")
+                    logger.info(f"Target '{target_name}' finished with status={result['status']} in {result['seconds']}s")
+                    results.append(result)
+        finally:
+            # The worker threads are gone, so are their extractors
+            self.close()
+
+        logger.info(f"{len(targets)} target(s) processed in {round(time.perf_counter() - start, 3)}s with {self.max_workers} worker(s).")
+        try:
+            self.metrics.export()
+        except Exception as e:
+            logger.error(f"Run metrics could not be written. Error: {e}")
+        return results
+
+
+def get_primary_keys(dictionary_path: str, targets: list) -> dict:
+    """Primary key (Jerarquia == 'PK') of each target, from its sheet in the data dictionary."""
+    data_dictionary = dictionary_cache.load(dictionary_path)
+    return {
+        t: data_dictionary[t].filter(pl.col("Jerarquia") == 'PK')["Nombre_columna"][0]
+        for t in targets if t in data_dictionary
+    }
+
+
 # Main ETL process
 if __name__ == "__main__":
-    logger.info("Starting ETL process...")
-    pipeline = ETLDataPipeline()
+    parser = argparse.ArgumentParser(description="FBS ETL pipeline")
+    parser.add_argument('--targets', nargs='+', default=['creditos'])
+    parser.add_argument('--layers', nargs='+', default=['raw'])
+    parser.add_argument('--workers', type=int, default=int(os.getenv('ETL_WORKERS', 4)))
+    parser.add_argument('--profile-stage', default=os.getenv('PROFILE_STAGE', ''), help="Stage to run under cProfile, e.g. 'transform'")
+    parser.add_argument('--dump-plan', action='store_true', default=os.getenv('DUMP_QUERY_PLAN', '0') == '1')
+    parser.add_argument('--backfill', action='store_true', help="Rebuild the targets from every raw file of their folders")
+    parser.add_argument('--since', type=date.fromisoformat, default=None, help="Backfill only raw files created from this date (YYYY-MM-DD)")
+    parser.add_argument('--until', type=date.fromisoformat, default=None, help="Backfill only raw files created up to this date (YYYY-MM-DD)")
+    parser.add_argument('--watch', action='store_true', help="Keep running and process only the targets with new raw files in Drive")
+    args = parser.parse_args()
 
-    target = ['creditos']
-    layers = ['raw']
+    logger.info("Starting ETL process...")
 
     # Check table list
     dict_name = "credit_data_dictionary"
-    data_dictionary = pl.read_excel("data_dictionary/Diccionario_FBS.xlsx")    
-    primary_key_column = data_dictionary.filter(pl.col("Jerarquia") == 'PK')["Nombre_columna"][0]
+    primary_keys = get_primary_keys("data_dictionary/Diccionario_FBS.xlsx", targets=args.targets)
 
-    # Run the ETL process for each layer
-    for l in layers:
-        pipeline.get_metadata(target=target, data_layer=l)
-        pipeline.extract_(files=pipeline.metadata, target=target)
-        pipeline.transform_()
-
-    pipeline.get_metadata(target=target, data_layer="modeled")
-    target_meta = pipeline.filter_files_metadata(target_name=target[0], layer="modeled")    
-    
-    pipeline.load_(df=pipeline.output["raw"], spreadsheet_id=target_meta['id'])
+    metrics = RunMetrics(profile_stage=args.profile_stage, dump_query_plan=args.dump_plan)
+    runner = PipelineRunner(max_workers=args.workers, layers=args.layers, primary_keys=primary_keys, metrics=metrics)
+    if args.watch:
+        # --targets limits the watched targets, the changes decide which ones run
+        watcher = DriveWatcher(runner=runner, service=runner.get_extractor().drive_service, targets=args.targets)
+        signal.signal(signal.SIGTERM, watcher.stop)
+        signal.signal(signal.SIGINT, watcher.stop)
+        watcher.run_forever()
+    elif args.backfill:
+        # Targets one after another, each one's files on the whole worker pool
+        for t in args.targets:
+            result = runner.run_backfill(target_name=t, start_date=args.since, end_date=args.until)
+            logger.info(f"Backfill of '{t}' finished with status={result['status']} in {result['seconds']}s")
+        runner.close()
+        metrics.export()
+    else:
+        runner.run(targets=args.targets)
     logger.info("ETL Process finished...")
 
 
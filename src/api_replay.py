@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from loguru import logger
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+# 'live' (default), 'record' (call the APIs and keep every response) or 'replay' (no network)
+GOOGLE_API_MODE = os.getenv('GOOGLE_API_MODE', 'live')
+GOOGLE_FIXTURES_DIR = os.getenv('GOOGLE_FIXTURES_DIR', 'fixtures/google')
+# In replay, 'recorded' sleeps the time each response took when it was recorded
+GOOGLE_REPLAY_LATENCY = os.getenv('GOOGLE_REPLAY_LATENCY', 'none')
+
+# Batch parts carry a Content-ID '<base + request_id>' (the response ones '<response-base + request_id>'),
+# the base is a random UUID per batch
+CONTENT_ID_BASE = re.compile(rb'(Content-ID: <(?:response-)?)([^<>+]*?) \+ ')
+
+
+def content_id_base(body) -> bytes:
+    """Random base of the Content-IDs of a batch body, None for other bodies."""
+    if not body:
+        return None
+    match = CONTENT_ID_BASE.search(body if isinstance(body, bytes) else str(body).encode('utf-8'))
+    return match.group(2) if match else None
+
+
+def request_key(method: str, uri: str, body=None, headers: dict=None) -> str:
+    """
+    Fixture key of a request: method, URI, byte range (media chunks) and body, without auth headers.
+    The random boundary and Content-ID base of multipart bodies (batch requests) are left out.
+    """
+    headers = {k.lower(): v for k, v in (headers or {}).items()}
+    digest = hashlib.sha256(f"{method.upper()} {uri} {headers.get('range', '')}".encode('utf-8'))
+    if body:
+        body = body if isinstance(body, bytes) else str(body).encode('utf-8')
+        boundary = re.search(r'boundary="?([^";]+)"?', headers.get('content-type', ''))
+        if boundary:
+            body = body.replace(boundary.group(1).encode('utf-8'), b'')
+        digest.update(CONTENT_ID_BASE.sub(rb'\1 + ', body))
+    return digest.hexdigest()[:32]
+
+
+class RecordingHttp:
+    """
+    httplib2-compatible wrapper that forwards every request and stores its response
+    (status, headers and raw content, media included) as a fixture in `fixtures_dir`.
+    Each thread gets its own inner Http, since httplib2 is not thread safe.
+    """
+
+    def __init__(self, http_factory, fixtures_dir: str=GOOGLE_FIXTURES_DIR):
+        self.http_factory = http_factory
+        self.fixtures_dir = fixtures_dir
+        self.thread_local = threading.local()
+        self.lock = threading.Lock()
+        os.makedirs(self.fixtures_dir, exist_ok=True)
+
+    def inner(self):
+        if getattr(self.thread_local, 'http', None) is None:
+            self.thread_local.http = self.http_factory()
+        return self.thread_local.http
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        start = time.perf_counter()
+        response, content = self.inner().request(uri, method=method, body=body, headers=headers, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        key = request_key(method, uri, body=body, headers=headers)
+        # The content first: replay looks for the JSON
+        self.write_fixture(f"{key}.bin", content or b'')
+        meta = {'method': method, 'uri': uri, 'response': dict(response), 'seconds': round(elapsed, 4)}
+        self.write_fixture(f"{key}.json", json.dumps(meta, indent=1).encode('utf-8'))
+        with self.lock:
+            with open(os.path.join(self.fixtures_dir, 'requests.log'), 'a', encoding='utf-8') as f:
+                f.write(f"{key} {method} {uri}\n")
+        return response, content
+
+    def write_fixture(self, name: str, data: bytes) -> None:
+        """Write a fixture atomically, a crash mid-write leaves no partial file for replay."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.fixtures_dir, prefix=f".{name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.fixtures_dir, name))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+class ReplayHttp:
+    """
+    httplib2-compatible object answering from the fixtures written by `RecordingHttp`.
+    A GET without fixture fails with 404; writes (PUT/POST) without fixture are acknowledged
+    with an empty 200 so loads can run even when they send different cells than the recording.
+    """
+
+    def __init__(self, fixtures_dir: str=GOOGLE_FIXTURES_DIR, latency: str=GOOGLE_REPLAY_LATENCY):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        import httplib2
+        key = request_key(method, uri, body=body, headers=headers)
+        meta_path = os.path.join(self.fixtures_dir, f"{key}.json")
+
+        if not os.path.exists(meta_path):
+            with self.lock:
+                self.misses += 1
+            if method.upper() == 'GET':
+                logger.error(f"No recorded response for {method} {uri}")
+                return httplib2.Response({'status': '404'}), json.dumps({'error': {'code': 404, 'message': f"No fixture for {method} {uri}"}}).encode('utf-8')
+            logger.warning(f"No recorded response for {method} {uri}, acknowledged without fixture.")
+            return httplib2.Response({'status': '200', 'content-type': 'application/json'}), b'{}'
+
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(self.fixtures_dir, f"{key}.bin"), 'rb') as f:
+            content = f.read()
+        # A replayed batch answers with the Content-ID base of this request
+        base = content_id_base(body)
+        if base is not None:
+            content = CONTENT_ID_BASE.sub(lambda m: m.group(1) + base + b' + ', content)
+        with self.lock:
+            self.hits += 1
+        if self.latency == 'recorded':
+            time.sleep(meta.get('seconds', 0))
+        return httplib2.Response(meta['response']), content
+
+
+def api_http(credentials=None, mode: str=GOOGLE_API_MODE, fixtures_dir: str=GOOGLE_FIXTURES_DIR):
+    """Http object for `build(http=...)` in the given mode, or None to use the credentials directly (live)."""
+    if mode == 'record':
+        import httplib2
+        import google_auth_httplib2
+        return RecordingHttp(lambda: google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http()), fixtures_dir=fixtures_dir)
+    if mode == 'replay':
+        return ReplayHttp(fixtures_dir=fixtures_dir)
+    return None
@@ -0,0 +1,270 @@
+import os
+import mmap
+import time
+import asyncio
+import threading
+import httpx
+from loguru import logger
+from dotenv import load_dotenv
+from google.auth.transport.requests import Request
+from src.gdrive_handler import files_list_params
+from src.metrics import api_call_counter, api_call_lock
+
+# Load environment variables
+load_dotenv()
+
+
+DRIVE_API_URL = os.getenv('DRIVE_API_URL', 'https://www.googleapis.com/drive/v3')
+SHEETS_API_URL = os.getenv('SHEETS_API_URL', 'https://sheets.googleapis.com/v4')
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Ranged downloads: bytes per Range request, ranges in flight and retry rounds for failed ranges
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE_MB', 8)) * 1024 * 1024
+DOWNLOAD_PARALLELISM = int(os.getenv('DOWNLOAD_PARALLELISM', 8))
+DOWNLOAD_RANGE_RETRIES = int(os.getenv('DOWNLOAD_RANGE_RETRIES', 3))
+
+
+class AsyncGoogleTransport:
+    """
+    Cliente HTTP asincrono para las APIs REST de Drive y Sheets.
+
+    Requests share one httpx keep-alive pool (`max_connections`), so independent calls
+    can be awaited together with `asyncio.gather` instead of paying one round-trip after
+    another. Base URLs can point to a local stand-in server for tests.
+    """
+
+    def __init__(self, credentials=None, max_connections: int=10, timeout: float=60, max_retries: int=3,
+                 drive_url: str=DRIVE_API_URL, sheets_url: str=SHEETS_API_URL, http_transport=None):
+        self.credentials = credentials
+        self.max_retries = max_retries
+        self.drive_url = drive_url.rstrip('/')
+        self.sheets_url = sheets_url.rstrip('/')
+        # `http_transport` (e.g. httpx.MockTransport) replaces the network, for tests and benchmarks
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+            transport=http_transport
+        )
+        self.refresh_lock = asyncio.Lock()
+
+    async def auth_headers(self) -> dict:
+        headers = {}
+        if self.credentials is None:
+            return headers
+        async with self.refresh_lock:
+            if not self.credentials.valid:
+                # google-auth refreshes synchronously; keep it off the event loop
+                await asyncio.to_thread(self.credentials.refresh, Request())
+        self.credentials.apply(headers)
+        return headers
+
+    async def request(self, method: str, url: str, params: dict=None, json: dict=None, headers: dict=None, content: bytes=None) -> httpx.Response:
+        for attempt in range(self.max_retries + 1):
+            request_headers = {**(await self.auth_headers()), **(headers or {})}
+            try:
+                response = await self.client.request(method, url, params=params, json=json, headers=request_headers, content=content)
+                if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+                logger.warning(f"{method} {url} returned {response.status_code} (attempt {attempt + 1}/{self.max_retries + 1}), retrying.")
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"{method} {url} failed (attempt {attempt + 1}/{self.max_retries + 1}), retrying. Error: {e}")
+            await asyncio.sleep(2 ** attempt)
+
+    async def get_json(self, url: str, params: dict=None) -> dict:
+        response = await self.request('GET', url, params=params)
+        return response.json()
+
+    async def paginate(self, url: str, params: dict, items_key: str, max_items: int=None) -> list:
+        items = []
+        params = dict(params)
+        while True:
+            results = await self.get_json(url, params=params)
+            items.extend(results.get(items_key, []))
+            if max_items and len(items) >= max_items:
+                return items[:max_items]
+            if not results.get('nextPageToken'):
+                return items
+            params['pageToken'] = results['nextPageToken']
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+async def list_all_shared_drives_async(transport: AsyncGoogleTransport) -> list:
+    """Async version of `list_all_shared_drives`."""
+    return await transport.paginate(
+        f"{transport.drive_url}/drives",
+        params={'fields': 'nextPageToken, drives(id, name)'},
+        items_key='drives'
+    )
+
+
+async def list_files_and_folders_async(transport: AsyncGoogleTransport, location_id=None, is_shared_drive=False, page_size=100, file_type=None, search_name=None,
+                                      order_by=None, max_results=None, corpora=None, drive_id=None) -> list:
+    """Async version of `list_files_and_folders`, same query and fields."""
+    params = files_list_params(
+        location_id=location_id, is_shared_drive=is_shared_drive, page_size=page_size, file_type=file_type,
+        search_name=search_name, order_by=order_by, corpora=corpora, drive_id=drive_id
+    )
+    params = {k: str(v).lower() if isinstance(v, bool) else v for k, v in params.items()}
+    return await transport.paginate(f"{transport.drive_url}/files", params=params, items_key='files', max_items=max_results)
+
+
+async def get_sheet_values_async(transport: AsyncGoogleTransport, spreadsheet_id: str, range_name: str) -> list:
+    results = await transport.get_json(
+        f"{transport.sheets_url}/spreadsheets/{spreadsheet_id}/values/{range_name}",
+        params={'valueRenderOption': 'FORMATTED_VALUE'}
+    )
+    return results.get('values', [])
+
+
+async def update_values_async(transport: AsyncGoogleTransport, spreadsheet_id: str, range_name: str, body: bytes, value_input_option: str='USER_ENTERED') -> dict:
+    """`values.update` with a pre-encoded JSON body (see `sheets_encoder.encode_values_body`)."""
+    response = await transport.request(
+        'PUT', f"{transport.sheets_url}/spreadsheets/{spreadsheet_id}/values/{range_name}",
+        params={'valueInputOption': value_input_option},
+        headers={'Content-Type': 'application/json'},
+        content=body
+    )
+    return response.json()
+
+
+def count_api_calls(method: str, calls: int) -> None:
+    """Requests run on the transport loop: count them for the stage of the calling thread."""
+    counter = api_call_counter.get()
+    if counter is not None:
+        with api_call_lock:
+            counter[method] += calls
+
+
+def byte_ranges(size: int, chunk_size: int=DOWNLOAD_CHUNK_SIZE) -> list:
+    """Inclusive (start, end) byte ranges covering `size` bytes."""
+    return [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+
+async def download_ranges_async(transport: AsyncGoogleTransport, file_id: str, size: int, target, chunk_size: int=DOWNLOAD_CHUNK_SIZE,
+                                parallelism: int=DOWNLOAD_PARALLELISM, range_retries: int=DOWNLOAD_RANGE_RETRIES, is_shared_drive: bool=True) -> dict:
+    """
+    Descarga un archivo de Drive por rangos de bytes concurrentes sobre el pool de conexiones.
+
+    Every range is written at its offset of `target` (a writable buffer of `size` bytes, e.g.
+    an mmap). Progress is kept per range: a range that fails (after the transport's own
+    retries) or comes back short is requested again from its first missing byte, for up
+    to `range_retries` rounds, without touching the ranges that already completed.
+    """
+    url = f"{transport.drive_url}/files/{file_id}"
+    params = {'alt': 'media', 'supportsAllDrives': str(is_shared_drive).lower()}
+    semaphore = asyncio.Semaphore(parallelism)
+    ranges = byte_ranges(size, chunk_size)
+    progress = {start: start for start, _ in ranges}
+    stats = {'requests': 0, 'retried_ranges': 0}
+
+    async def fetch(start: int, end: int) -> None:
+        async with semaphore:
+            while progress[start] <= end:
+                position = progress[start]
+                stats['requests'] += 1
+                response = await transport.request('GET', url, params=params, headers={'Range': f"bytes={position}-{end}"})
+                content = response.content
+                # A server ignoring Range answers 200 with the whole file
+                if response.status_code != 206 and not (position == 0 and len(content) == size):
+                    raise RuntimeError(f"Range {position}-{end} of '{file_id}' answered with status {response.status_code}")
+                if not content:
+                    raise RuntimeError(f"Range {position}-{end} of '{file_id}' came back empty")
+                content = content[:end - position + 1]
+                target[position:position + len(content)] = content
+                progress[start] = position + len(content)
+
+    pending = ranges
+    for attempt in range(range_retries + 1):
+        results = await asyncio.gather(*[fetch(start, end) for start, end in pending], return_exceptions=True)
+        failed = [r for r, result in zip(pending, results) if isinstance(result, Exception)]
+        if not failed:
+            break
+        errors = [result for result in results if isinstance(result, Exception)]
+        if attempt == range_retries:
+            raise RuntimeError(f"{len(failed)} range(s) of '{file_id}' could not be downloaded. First error: {errors[0]}")
+        logger.warning(f"{len(failed)} range(s) of '{file_id}' failed (round {attempt + 1}/{range_retries + 1}), resuming them. First error: {errors[0]}")
+        stats['retried_ranges'] += len(failed)
+        await asyncio.sleep(2 ** attempt)
+        pending = failed
+
+    return {'ranges': len(ranges), **stats}
+
+
+class SyncGoogleTransport:
+    """
+    Envoltorio sincrono: runs an `AsyncGoogleTransport` on a background event loop, so
+    the synchronous pipeline code can use the pooled client and still issue several
+    independent requests concurrently (`list_many_folders`, `gather`).
+    """
+
+    def __init__(self, **transport_options):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='google-transport', daemon=True)
+        self.thread.start()
+        self.transport = self.run(self.create_transport(**transport_options))
+
+    @staticmethod
+    async def create_transport(**transport_options) -> AsyncGoogleTransport:
+        # The httpx client and its locks must belong to the background loop
+        return AsyncGoogleTransport(**transport_options)
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def gather(self, *coroutines) -> list:
+        async def gather_all():
+            return await asyncio.gather(*coroutines)
+        return self.run(gather_all())
+
+    def list_all_shared_drives(self) -> list:
+        return self.run(list_all_shared_drives_async(self.transport))
+
+    def list_files_and_folders(self, **query) -> list:
+        return self.run(list_files_and_folders_async(self.transport, **query))
+
+    def list_many_folders(self, folder_ids: list, is_shared_drive: bool=True, **query) -> list:
+        """List the content of several folders concurrently, one result list per folder."""
+        return self.gather(*[
+            list_files_and_folders_async(self.transport, location_id=f, is_shared_drive=is_shared_drive, **query)
+            for f in folder_ids
+        ])
+
+    def get_sheet_values(self, spreadsheet_id: str, range_name: str) -> list:
+        return self.run(get_sheet_values_async(self.transport, spreadsheet_id, range_name))
+
+    def update_many_values(self, spreadsheet_id: str, updates: list) -> list:
+        """Send several `values.update` ((range, body) pairs) concurrently over the pool."""
+        results = self.gather(*[update_values_async(self.transport, spreadsheet_id, range_name, body) for range_name, body in updates])
+        count_api_calls('sheets.spreadsheets.values.update', len(updates))
+        return results
+
+    def download_file(self, file_id: str, size: int, path: str, chunk_size: int=DOWNLOAD_CHUNK_SIZE,
+                      parallelism: int=DOWNLOAD_PARALLELISM, range_retries: int=DOWNLOAD_RANGE_RETRIES, is_shared_drive: bool=True) -> dict:
+        """Download a file of known `size` into `path` with concurrent Range requests (see `download_ranges_async`)."""
+        start = time.perf_counter()
+        with open(path, 'wb+') as f:
+            f.truncate(size)
+            if size:
+                # The ranges are written in place through a memory map of the pre-sized file
+                with mmap.mmap(f.fileno(), size) as target:
+                    stats = self.run(download_ranges_async(
+                        self.transport, file_id, size, target, chunk_size=chunk_size, parallelism=parallelism,
+                        range_retries=range_retries, is_shared_drive=is_shared_drive
+                    ))
+                    target.flush()
+            else:
+                stats = {'ranges': 0, 'requests': 0, 'retried_ranges': 0}
+
+        seconds = time.perf_counter() - start
+        stats.update({'bytes': size, 'seconds': round(seconds, 3), 'mb_per_second': round(size / 1024 / 1024 / seconds, 2) if seconds else None})
+        count_api_calls('drive.files.get_media:range', stats['requests'])
+        return stats
+
+    def close(self) -> None:
+        self.run(self.transport.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import polars as pl
+from loguru import logger
+from dotenv import load_dotenv
+from src.extraction_layer import FBSExtractor
+from src.transformation_layer import transformer
+from src.metrics import RunMetrics, frame_size
+
+# Load environment variables
+load_dotenv()
+
+
+BACKFILL_WORKERS = int(os.getenv('BACKFILL_WORKERS', 4))
+BACKFILL_DIR = os.getenv('BACKFILL_DIR', 'data/backfill')
+
+# Columns added to every row: the export it came from and when that export was created
+SOURCE_FILE_COL = 'source_file'
+SOURCE_DATE_COL = 'source_created_time'
+# Position of a row in the merge: export (oldest first) and row inside it
+ROW_ORDER_COL = '_backfill_row'
+
+
+def created_time(file: dict) -> datetime:
+    return datetime.fromisoformat(file['createdTime'].replace('Z', '+00:00'))
+
+
+def select_files(files: list, start_date: date=None, end_date: date=None) -> list:
+    """Raw exports created within [start_date, end_date], oldest first."""
+    selected = [
+        f for f in files
+        if (start_date is None or created_time(f).date() >= start_date)
+        and (end_date is None or created_time(f).date() <= end_date)
+    ]
+    return sorted(selected, key=created_time)
+
+
+class RawBackfill:
+    """
+    Reconstruccion historica de un target a partir de todos sus exports crudos.
+
+    Every raw file of the folder (or those created between two dates) is downloaded,
+    parsed and transformed on a thread pool, tagged with its source file and creation time
+    and spilled to Parquet, so only one frame per worker is held in memory. The spills are
+    then merged lazily, keeping for each primary key the row of the newest export.
+    """
+
+    workers = BACKFILL_WORKERS
+    spill_dir = BACKFILL_DIR
+
+    def __init__(self, workers: int=None, spill_dir: str=None, metrics: RunMetrics=None):
+        self.workers = workers or self.workers
+        self.spill_dir = spill_dir or self.spill_dir
+        self.metrics = metrics or RunMetrics()
+        self.thread_local = threading.local()
+        self.extractors = []
+        self.extractors_lock = threading.Lock()
+        self.reports = {}
+
+    def get_extractor(self) -> FBSExtractor:
+        # Google API clients are not thread safe, each worker builds its own
+        if getattr(self.thread_local, 'extractor', None) is None:
+            self.thread_local.extractor = FBSExtractor()
+            with self.extractors_lock:
+                self.extractors.append(self.thread_local.extractor)
+        return self.thread_local.extractor
+
+    def close(self) -> None:
+        """Close the transports of the workers' extractors (see `FBSExtractor.close`)."""
+        with self.extractors_lock:
+            extractors, self.extractors = self.extractors, []
+        self.thread_local = threading.local()
+        for e in extractors:
+            try:
+                e.close()
+            except Exception as error:
+                logger.warning(f"Transport of a backfill extractor could not be closed. Error: {error}")
+
+    def spill_file(self, file: dict, target: str, spill_path: str) -> dict:
+        """Extract, transform and tag one export, written to `spill_path`."""
+        with self.metrics.stage('backfill_file', target=target, layer='raw') as stage:
+            df = self.get_extractor().extract_raw_file(file, layer='raw')
+            df = transformer.run(method_name=f"raw_{target}_", df=df)
+            df = df.with_columns(
+                pl.lit(file['name']).alias(SOURCE_FILE_COL),
+                pl.lit(created_time(file)).alias(SOURCE_DATE_COL),
+            )
+            # A failed write must not leave a spill behind for the merge
+            tmp_path = f"{spill_path}.tmp"
+            df.write_parquet(tmp_path, compression='zstd', statistics=True)
+            os.replace(tmp_path, spill_path)
+            size = frame_size(df)
+            stage.update(bytes_in=int(file.get('size') or 0) or None, rows_out=size['rows'], bytes_out=size['bytes'])
+        return {'file': file['name'], 'rows': size['rows']}
+
+    def merge(self, spill_paths: list, primary_key: str=None) -> pl.LazyFrame:
+        """
+        Concatenation of the spills; with a primary key, only each key's row from the newest
+        export. Spills come oldest first: the position of the file and of the row inside it
+        give every row a unique order, and the last one of each key is kept, so ties (same
+        key twice in an export, or exports created at the same time) resolve the same way on
+        every run.
+        """
+        # Older exports may lack columns or carry other dtypes
+        lf = pl.concat([
+            pl.scan_parquet(p).with_row_index(ROW_ORDER_COL).with_columns((pl.lit(i, dtype=pl.Int64) * 2 ** 40 + pl.col(ROW_ORDER_COL)).alias(ROW_ORDER_COL))
+            for i, p in enumerate(spill_paths)
+        ], how='diagonal_relaxed')
+        if not primary_key:
+            return lf.drop(ROW_ORDER_COL)
+
+        # The (key, last row) pairs are small next to the history, the rows are filtered with them
+        latest = lf.group_by(primary_key).agg(pl.col(ROW_ORDER_COL).max())
+        return lf.join(latest, on=[primary_key, ROW_ORDER_COL], how='semi').sort(ROW_ORDER_COL).drop(ROW_ORDER_COL)
+
+    def run(self, target: str, files: list, primary_key: str=None, start_date: date=None, end_date: date=None) -> pl.DataFrame:
+        """
+        Backfill `target` from `files` (the raw folder listing of `read_metadata`). Files that
+        fail are logged and left out; the run fails only when none could be read.
+        """
+        files = select_files(files, start_date=start_date, end_date=end_date)
+        if not files:
+            logger.warning(f"No raw files of '{target}' between {start_date} and {end_date}, nothing to backfill.")
+            return None
+
+        os.makedirs(self.spill_dir, exist_ok=True)
+        spill_dir = tempfile.mkdtemp(prefix=f"{target}_", dir=self.spill_dir)
+        report = {'files': len(files), 'failed': [], 'rows_in': 0}
+        try:
+            spill_paths = {f['id']: os.path.join(spill_dir, f"{i:05d}.parquet") for i, f in enumerate(files)}
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='backfill') as executor:
+                futures = {executor.submit(self.spill_file, f, target, spill_paths[f['id']]): f for f in files}
+                for future in as_completed(futures):
+                    file = futures[future]
+                    try:
+                        report['rows_in'] += future.result()['rows']
+                    except Exception as e:
+                        report['failed'].append(file['name'])
+                        logger.error(f"Raw file '{file['name']}' of '{target}' could not be backfilled. Error: {e}")
+
+            # Oldest export first, so ties inside the newest one keep its last row
+            paths = [spill_paths[f['id']] for f in files if os.path.exists(spill_paths[f['id']])]
+            if not paths:
+                raise RuntimeError(f"None of the {len(files)} raw file(s) of '{target}' could be backfilled.")
+
+            with self.metrics.stage('backfill_merge', target=target, layer='raw', rows_in=report['rows_in']) as stage:
+                df = self.merge(paths, primary_key=primary_key).collect(engine='streaming')
+                stage['rows_out'] = df.height
+        finally:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            self.close()
+
+        report['rows_out'] = df.height
+        self.reports[target] = report
+        logger.info(
+            f"Backfill of '{target}': {len(files) - len(report['failed'])} of {len(files)} file(s) "
+            f"({files[0]['createdTime']} to {files[-1]['createdTime']}), {report['rows_in']} row(s) in, {df.height} kept."
+        )
+        return df
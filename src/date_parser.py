@@ -0,0 +1,231 @@
+import os
+import json
+import threading
+from datetime import datetime
+import polars as pl
+from loguru import logger
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+DATE_FORMATS_CACHE = os.getenv('DATE_FORMATS_CACHE', 'cache/date_formats.json')
+# Values of a column (non-null, distinct draws) used to detect its formats
+DATE_SAMPLE_SIZE = int(os.getenv('DATE_SAMPLE_SIZE', 10000))
+# Share of unparsed values above which the cached formats of a column are detected again
+DATE_REDETECT_RATE = float(os.getenv('DATE_REDETECT_RATE', 0.01))
+
+# Formats seen in the exports (day first) and their ISO variants
+DATE_PARTS = ["%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d", "%Y/%m/%d", "%d/%m/%y"]
+CANDIDATE_FORMATS = [d + t for d in DATE_PARTS for t in ("", " %H:%M", " %H:%M:%S")] + ["%Y-%m-%dT%H:%M:%S"]
+SEPARATORS = "/-."
+# Suffix of the parsed columns while they sit next to the raw text (failure counts)
+PARSED_SUFFIX = "__parsed"
+
+
+def date_part(date_format: str) -> str:
+    """Date portion of a format: '%d/%m/%Y %H:%M' -> '%d/%m/%Y'."""
+    return date_format.split('%H')[0].rstrip(' T')
+
+
+def target_dtype(date_format: str) -> pl.DataType:
+    """Formats with a time give a Datetime, date-only formats a Date (any time part is dropped)."""
+    return pl.Datetime if '%H' in date_format else pl.Date
+
+
+def detect_formats(values: pl.Series, candidates: list=CANDIDATE_FORMATS, sample_size: int=DATE_SAMPLE_SIZE) -> dict:
+    """
+    Formatos de fecha de una columna de texto a partir de una muestra.
+
+    Formats are picked greedily (the one parsing most of the still unparsed values first,
+    ties by position in `candidates`) until nothing else parses. `date_width` is the width of
+    the date text when every sampled value starts with a fixed width date, which lets Date
+    columns be cut to that width instead of split on spaces.
+    """
+    sample = values.drop_nulls()
+    if len(sample) > sample_size:
+        sample = sample.sample(sample_size, seed=0)
+    sample = sample.str.strip_chars()
+    sample = sample.filter(sample.str.len_bytes() > 0).unique()
+
+    formats, remaining = [], sample
+    while len(remaining):
+        parsed = {f: remaining.str.strptime(pl.Datetime, f, strict=False).is_not_null() for f in candidates if f not in formats}
+        best = max(parsed, key=lambda f: parsed[f].sum(), default=None)
+        if best is None or not parsed[best].any():
+            break
+        formats.append(best)
+        remaining = remaining.filter(~parsed[best])
+
+    date_width = None
+    parts = list(dict.fromkeys(date_part(f) for f in formats))
+    widths = {len(datetime(2000, 12, 31).strftime(p)) for p in parts}
+    if len(widths) == 1:
+        width = widths.pop()
+        head = sample.str.head(width)
+        by_head = pl.select(pl.coalesce([pl.lit(head).str.to_date(p, strict=False) for p in parts])).to_series()
+        if parts and by_head.is_not_null().sum() == len(sample) - len(remaining):
+            date_width = width
+
+    return {'formats': formats, 'date_width': date_width, 'sampled': len(sample), 'unmatched': len(remaining)}
+
+
+def parse_expression(col: str, spec: dict, dtype: pl.DataType=pl.Date) -> pl.Expr:
+    """
+    Vectorized parse of a text column with the formats in `spec` (see `detect_formats`).
+
+    Date targets only read the date text: cut to `date_width` when known, and when the formats
+    only differ in their separator these are unified so a single `to_date` is made. Otherwise
+    every format is tried in the same pass and the first match kept (`pl.coalesce`).
+    """
+    formats = spec['formats'] or ["%d/%m/%Y"]
+    text = pl.col(col)
+
+    if dtype == pl.Date:
+        parts = list(dict.fromkeys(date_part(f) for f in formats))
+        if spec.get('date_width'):
+            text = text.str.strip_chars_start().str.head(spec['date_width'])
+        else:
+            text = text.str.strip_chars().str.split(" ").list.get(0)
+
+        canonical = parts[0]
+        canonical_sep = next((c for c in canonical if c in SEPARATORS), None)
+        same_layout = canonical_sep is not None and all(
+            any(p.replace(sep, canonical_sep) == canonical for sep in SEPARATORS) for p in parts
+        )
+        if same_layout:
+            for sep in {c for p in parts for c in p if c in SEPARATORS} - {canonical_sep}:
+                text = text.str.replace_all(sep, canonical_sep, literal=True)
+            return text.str.to_date(canonical, strict=False).alias(col)
+        return pl.coalesce([text.str.to_date(p, strict=False) for p in parts]).alias(col)
+
+    text = text.str.strip_chars()
+    if len(formats) == 1:
+        return text.str.strptime(dtype, formats[0], strict=False).alias(col)
+    return pl.coalesce([text.str.strptime(dtype, f, strict=False) for f in formats]).cast(dtype).alias(col)
+
+
+class DateParser:
+    """
+    Parser compartido de columnas de fecha en texto (exports crudos, hojas del diccionario).
+
+    The formats of each column are detected once from a sample and cached per source and
+    column in a JSON file, the hinted format (dictionary / read hints) winning ties. Parsing
+    a DataFrame also counts the values that didn't parse; when they are more than
+    `redetect_rate` of the column its formats are detected again from the failures.
+    LazyFrames are sampled from their first rows and parsed without failure counts.
+    """
+
+    cache_path = DATE_FORMATS_CACHE
+
+    def __init__(self, cache_path: str=None, sample_size: int=DATE_SAMPLE_SIZE, redetect_rate: float=DATE_REDETECT_RATE):
+        self.cache_path = cache_path or self.cache_path
+        self.sample_size = sample_size
+        self.redetect_rate = redetect_rate
+        self.specs = None
+        self.reports = {}
+        self.lock = threading.Lock()
+
+    def load_specs(self) -> dict:
+        if self.specs is None:
+            self.specs = {}
+            if os.path.exists(self.cache_path):
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    self.specs = json.load(f)
+        return self.specs
+
+    def save_specs(self) -> None:
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.specs, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.cache_path)
+
+    def candidates(self, hint: str=None) -> list:
+        return ([hint] if hint else []) + [f for f in CANDIDATE_FORMATS if f != hint]
+
+    def detect(self, values: pl.Series, source: str, col: str, hint: str=None, known: list=()) -> dict:
+        """Detect the formats of a column; `known` formats are kept first."""
+        spec = detect_formats(values, candidates=[f for f in self.candidates(hint) if f not in known], sample_size=self.sample_size)
+        spec['formats'] = list(known) + spec['formats']
+        spec['detected_at'] = datetime.now().isoformat(timespec='seconds')
+        logger.debug(f"Date formats of '{col}' ({source}): {spec['formats']} on {spec['sampled']} sampled value(s), {spec['unmatched']} unmatched")
+        return spec
+
+    def store(self, source: str, col: str, spec: dict) -> None:
+        if not source:
+            return
+        with self.lock:
+            self.load_specs()[f"{source}:{col}"] = spec
+            self.save_specs()
+
+    def spec_for(self, sample: pl.DataFrame, source: str, col: str, hint: str=None) -> dict:
+        with self.lock:
+            spec = self.load_specs().get(f"{source}:{col}") if source else None
+        if spec is None:
+            spec = self.detect(sample[col], source=source, col=col, hint=hint)
+            # An empty sample (e.g. only nulls in the first rows) says nothing worth keeping
+            if spec['formats']:
+                self.store(source, col, spec)
+        return spec
+
+    def parse(self, df, date_formats: dict, source: str=None, dtypes: dict=None):
+        """
+        Parse the text columns of `date_formats` ({column: hinted format}) of a DataFrame or
+        LazyFrame in one `with_columns`. The output dtype follows the hint (see `target_dtype`)
+        unless given in `dtypes`. Columns that are missing or no longer text are left as they are.
+        """
+        schema = df.collect_schema()
+        columns = {col: fmt for col, fmt in date_formats.items() if schema.get(col) == pl.String}
+        if not columns:
+            return df
+        dtypes = {col: (dtypes or {}).get(col) or target_dtype(fmt) for col, fmt in columns.items()}
+
+        is_lazy = isinstance(df, pl.LazyFrame)
+        sample = (df.select(list(columns)).head(self.sample_size).collect() if is_lazy else df.select(list(columns)))
+        specs = {col: self.spec_for(sample, source=source, col=col, hint=fmt) for col, fmt in columns.items()}
+
+        if is_lazy:
+            return df.with_columns([parse_expression(col, specs[col], dtypes[col]) for col in columns])
+
+        parsed = df.with_columns([parse_expression(col, specs[col], dtypes[col]).alias(f"{col}{PARSED_SUFFIX}") for col in columns])
+        failures = self.count_failures(parsed, columns)
+
+        # Too many failures: the column has formats the cached detection didn't see
+        for col, report in failures.items():
+            if report['failed'] and report['failed'] > self.redetect_rate * max(report['total'], 1):
+                failed = parsed.filter(pl.col(col).is_not_null() & pl.col(f"{col}{PARSED_SUFFIX}").is_null())[col]
+                spec = self.detect(failed, source=source, col=col, hint=columns[col], known=specs[col]['formats'])
+                if spec['formats'] != specs[col]['formats']:
+                    # The width only holds if the earlier formats agree with it
+                    if spec['date_width'] != specs[col].get('date_width'):
+                        spec['date_width'] = None
+                    logger.info(f"New date formats found for '{col}' ({source}): {spec['formats'][len(specs[col]['formats']):]}")
+                    self.store(source, col, spec)
+                    specs[col] = spec
+                    parsed = parsed.with_columns(parse_expression(col, spec, dtypes[col]).alias(f"{col}{PARSED_SUFFIX}"))
+                    failures[col] = self.count_failures(parsed, [col])[col]
+
+        for col, report in failures.items():
+            report['formats'] = specs[col]['formats']
+            if report['failed']:
+                examples = parsed.filter(pl.col(col).is_not_null() & pl.col(f"{col}{PARSED_SUFFIX}").is_null())[col].head(3).to_list()
+                logger.warning(f"{report['failed']} of {report['total']} value(s) of '{col}' ({source}) could not be parsed as dates, e.g. {examples}")
+        self.reports[source] = failures
+
+        # Replacing in place keeps the column order
+        return parsed.with_columns([pl.col(f"{col}{PARSED_SUFFIX}").alias(col) for col in columns]).drop([f"{col}{PARSED_SUFFIX}" for col in columns])
+
+    @staticmethod
+    def count_failures(parsed: pl.DataFrame, columns) -> dict:
+        """{column: {'total': non-null values, 'failed': values left null by the parse}}."""
+        counts = parsed.select(
+            [pl.col(col).is_not_null().sum().alias(f"{col}:total") for col in columns]
+            + [(pl.col(col).is_not_null() & pl.col(f"{col}{PARSED_SUFFIX}").is_null()).sum().alias(f"{col}:failed") for col in columns]
+        ).row(0, named=True)
+        return {col: {'total': counts[f"{col}:total"], 'failed': counts[f"{col}:failed"]} for col in columns}
+
+
+# Initialize a shared parser for the pipeline
+date_parser = DateParser()
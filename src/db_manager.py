@@ -1,7 +1,9 @@
 import duckdb
+import threading
 from loguru import logger
 from dotenv import load_dotenv
 import os
+from src.dictionary_cache import dictionary_cache
 
 # Load environment variables
 load_dotenv()
@@ -11,68 +13,94 @@ class DBAdministrator:
 
     db_path = os.getenv('DB_PATH', ':memory:')
 
+    # One long-lived connection per process; each thread works on its own cursor
+    connection = None
+    connection_lock = threading.Lock()
+    thread_local = threading.local()
+
+    @classmethod
+    def get_connection(self) -> duckdb.DuckDBPyConnection:
+        with self.connection_lock:
+            if self.connection is None:
+                self.connection = duckdb.connect(self.db_path)
+                logger.debug(f"Connection to '{self.db_path}' opened.")
+        return self.connection
+
+    @classmethod
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """Cursor of the current thread over the shared connection (DuckDB cursors are not thread safe)."""
+        cursor = getattr(self.thread_local, 'cursor', None)
+        if cursor is None:
+            cursor = self.get_connection().cursor()
+            self.thread_local.cursor = cursor
+        return cursor
+
+    @classmethod
+    def close(self) -> None:
+        with self.connection_lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+                self.thread_local = threading.local()
+
     def test_duckdb_connection(self) -> bool:
         try:
-            # The 'with' statement automatically handles opening and closing the connection
-            with duckdb.connect(self.db_path) as con:
-                # You can execute a simple query to verify the connection is active
-                con.execute("SELECT 1 AS connection_test_result")
-                logger.debug(f"✅ Connection to '{self.db_path}' was successful.")
-                return True
+            # You can execute a simple query to verify the connection is active
+            self.cursor().execute("SELECT 1 AS connection_test_result")
+            logger.debug(f"✅ Connection to '{self.db_path}' was successful.")
+            return True
         except Exception as e:
             logger.error(f"❌ An error occurred: {e}")
             return False
 
+    @classmethod
+    def get_table_shape(self, table_name: str) -> tuple:
+        """(rows, columns) read from the catalog metadata, without scanning the table."""
+        shape = self.cursor().execute(
+            "SELECT estimated_size, column_count FROM duckdb_tables() WHERE table_name = ?", [table_name]
+        ).fetchone()
+        return tuple(shape) if shape else (0, 0)
+
     @classmethod
     def create_duckdb_table_from_csv(self, data, file_name: str) -> None:
         
-        with duckdb.connect(self.db_path) as conn:
-            raw_tbl = conn.read_csv(data, sep=",", encoding='utf-8', null_padding=True, ignore_errors=True)
-            query = f'CREATE OR REPLACE TABLE {file_name} AS SELECT * FROM raw_tbl'
-            table_shape = conn.sql(query).to_df().shape
-            logger.debug(f"Table '{file_name}' created with shape {table_shape}")
+        conn = self.cursor()
+        raw_tbl = conn.read_csv(data, sep=",", encoding='utf-8', null_padding=True, ignore_errors=True)
+        conn.execute(f'CREATE OR REPLACE TABLE {file_name} AS SELECT * FROM raw_tbl')
+        logger.debug(f"Table '{file_name}' created with shape {self.get_table_shape(file_name)}")
 
     @classmethod
     def create_duckdb_table_from_dataframe(self, data, table_name: str) -> None:
 
-        with duckdb.connect(self.db_path) as conn: 
-            conn.execute(f'CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM data')
-            logger.debug(f"Table '{table_name}' created with shape {data.shape}")
+        self.cursor().execute(f'CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM data')
+        logger.debug(f"Table '{table_name}' created with shape {data.shape}")
 
     @classmethod
     def create_duckdb_table_from_excel(self, data_path: str, table_name: str, sheet_name: str='Sheet1') -> None:
         
-        with duckdb.connect(self.db_path, read_only=False) as conn:
-            # Insert table into duckdb from read file
-            conn.sql("INSTALL spatial; LOAD spatial;")
-            # conn.execute(f"CREATE SCHEMA IF NOT EXISTS temp;")
-            conn.execute(
-                f""" CREATE OR REPLACE TABLE {table_name} AS
-                            SELECT * 
-                            FROM st_read("{data_path}", layer='{sheet_name}');
-            """)
+        # Sheets come from the binary workbook cache, the Excel file is only parsed when it changed
+        data = dictionary_cache.load(data_path)[sheet_name]
+        self.create_duckdb_table_from_dataframe(data, table_name=table_name)
 
     @classmethod
     def get_pandas_from_duckdb_table(self, table_name: str) -> None:
-        with duckdb.connect(self.db_path) as conn:
-            query = f'SELECT * FROM {table_name}'
-            table_ = duckdb.sql(query, connection=conn).to_df()
-            logger.debug(f"Table '{table_name}' with {table_.shape} retrieved successfully.")
+        query = f'SELECT * FROM {table_name}'
+        table_ = self.cursor().sql(query).to_df()
+        logger.debug(f"Table '{table_name}' with {table_.shape} retrieved successfully.")
+        return table_
 
     @classmethod
     def get_polars_from_duckdb_table(self, table_name: str) -> None:
-        with duckdb.connect(self.db_path) as conn:
-            query = f'SELECT * FROM {table_name}'
-            table_ = conn.sql(query).pl()
-            logger.debug(f"Table '{table_name}' with {table_.shape} retrieved successfully.")
+        query = f'SELECT * FROM {table_name}'
+        table_ = self.cursor().sql(query).pl()
+        logger.debug(f"Table '{table_name}' with {table_.shape} retrieved successfully.")
         return table_
 
     @classmethod
     def get_table_list(self) -> list:
-        with duckdb.connect(self.db_path) as conn:
-            tables = conn.execute("SHOW TABLES").fetchall()
-            table_list = [table[0] for table in tables]
-            logger.debug(f"Tables recorded={len(table_list)} in database - {table_list}")
+        tables = self.cursor().execute("SHOW TABLES").fetchall()
+        table_list = [table[0] for table in tables]
+        logger.debug(f"Tables recorded={len(table_list)} in database - {table_list}")
         return table_list
 
 # Initialize a DBManager instance for testing
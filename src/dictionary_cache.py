@@ -0,0 +1,88 @@
+import os
+import json
+import threading
+import polars as pl
+from loguru import logger
+from dotenv import load_dotenv
+from src.utils_ import file_hash
+
+# Load environment variables
+load_dotenv()
+
+
+class DictionaryCache:
+    """
+    Copia binaria (Arrow IPC) de todas las hojas de un libro de Excel, e.g. the data dictionary.
+
+    The workbook is parsed once; its sheets are written uncompressed as Arrow IPC under a
+    folder named after the workbook hash and memory-mapped on later runs. The stored mtime
+    and size avoid re-hashing an untouched file, and a touched file with the same content
+    is not parsed again either.
+    """
+
+    cache_dir = os.getenv('DICTIONARY_CACHE_DIR', 'cache/dictionary')
+
+    def __init__(self, cache_dir: str=None):
+        self.cache_dir = cache_dir or self.cache_dir
+        self.manifest_path = os.path.join(self.cache_dir, 'manifest.json')
+        self.lock = threading.RLock()
+        self.manifest = None
+
+    def load_manifest(self) -> dict:
+        if self.manifest is None:
+            self.manifest = {}
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)
+        return self.manifest
+
+    def save_manifest(self) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def workbook_hash(self, workbook_path: str) -> str:
+        """Content hash of the workbook, only recomputed when its mtime or size changed."""
+        with self.lock:
+            stat = os.stat(workbook_path)
+            entry = self.load_manifest().get(os.path.abspath(workbook_path))
+            if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                return entry['hash']
+            return file_hash(workbook_path)
+
+    def sheets_dir(self, workbook_hash: str) -> str:
+        return os.path.join(self.cache_dir, workbook_hash[:16])
+
+    def load(self, workbook_path: str) -> dict:
+        """All the sheets of the workbook as {sheet_name: DataFrame}."""
+        with self.lock:
+            key = os.path.abspath(workbook_path)
+            stat = os.stat(workbook_path)
+            workbook_hash = self.workbook_hash(workbook_path)
+            sheets_dir = self.sheets_dir(workbook_hash)
+            entry = self.load_manifest().get(key)
+
+            if entry is None or entry['hash'] != workbook_hash or not os.path.isdir(sheets_dir):
+                sheets = pl.read_excel(workbook_path, sheet_id=0)
+                os.makedirs(sheets_dir, exist_ok=True)
+                for i, df in enumerate(sheets.values()):
+                    # Uncompressed IPC files are memory-mapped by read_ipc, no decoding on later runs
+                    df.write_ipc(os.path.join(sheets_dir, f"{i}.arrow"), compression='uncompressed')
+                entry = {'hash': workbook_hash, 'sheets': list(sheets.keys())}
+                logger.debug(f"Workbook '{workbook_path}' parsed and cached in {sheets_dir}")
+
+            entry = {**entry, 'mtime': stat.st_mtime, 'size': stat.st_size}
+            if self.manifest.get(key) != entry:
+                self.manifest[key] = entry
+                self.save_manifest()
+
+        return {
+            name: pl.read_ipc(os.path.join(sheets_dir, f"{i}.arrow"))
+            for i, name in enumerate(entry['sheets'])
+        }
+
+
+# Initialize a shared dictionary cache for the pipeline
+dictionary_cache = DictionaryCache()
@@ -0,0 +1,175 @@
+import os
+import json
+import atexit
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, timezone
+import polars as pl
+from loguru import logger
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class DownloadCache:
+    """
+    Cache en disco de los archivos crudos ya descargados y parseados.
+
+    Entries are keyed by the Drive file id plus its `md5Checksum` (or `modifiedTime` when
+    Drive has no checksum), so a new upload of the export is always a miss. Parsed frames
+    are stored as Parquet and read back without touching the network or the CSV parser.
+    The total size is bounded and the least recently used entries are evicted first.
+    """
+
+    cache_dir = os.getenv('DOWNLOAD_CACHE_DIR', 'cache/downloads')
+    max_size_mb = float(os.getenv('DOWNLOAD_CACHE_MAX_MB', 2048))
+
+    def __init__(self, cache_dir: str=None, max_size_mb: float=None):
+        self.cache_dir = cache_dir or self.cache_dir
+        self.max_size_mb = self.max_size_mb if max_size_mb is None else max_size_mb
+        self.manifest_path = os.path.join(self.cache_dir, 'manifest.json')
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.manifest = None
+        self.dirty = False
+
+    def load_manifest(self) -> dict:
+        if self.manifest is None:
+            self.manifest = {}
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)
+        return self.manifest
+
+    def save_manifest(self) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='manifest.', suffix='.tmp', dir=self.cache_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+        self.dirty = False
+
+    def flush(self) -> None:
+        """Write the access times of the hits since the last save."""
+        with self.lock:
+            if self.dirty:
+                self.save_manifest()
+
+    @staticmethod
+    def cache_key(file_meta: dict, variant: str='') -> str:
+        version = file_meta.get('md5Checksum') or file_meta.get('modifiedTime') or ''
+        return hashlib.sha256(f"{file_meta['id']}:{version}:{variant}".encode('utf-8')).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, file_meta: dict, variant: str='') -> pl.DataFrame:
+        """Return the cached frame for this version of the file, or None on a miss."""
+        key = self.cache_key(file_meta, variant)
+        with self.lock:
+            entry = self.load_manifest().get(key)
+            if entry is None or not os.path.exists(self.entry_path(key)):
+                self.misses += 1
+                logger.debug(f"Download cache miss for '{file_meta.get('name')}' (hits={self.hits}, misses={self.misses})")
+                return None
+
+            # Read under the lock, so a concurrent put or eviction can't replace or delete the
+            # entry mid-read; a file that is gone or unreadable anyway is a miss
+            try:
+                df = pl.read_parquet(self.entry_path(key), memory_map=True)
+            except (OSError, pl.exceptions.PolarsError) as e:
+                logger.warning(f"Download cache entry of '{file_meta.get('name')}' could not be read, dropped. Error: {e}")
+                self.remove(key)
+                self.dirty = True
+                self.misses += 1
+                return None
+
+            # Kept in memory: a hit doesn't rewrite the manifest
+            entry['last_access'] = datetime.now(timezone.utc).isoformat()
+            self.dirty = True
+            self.hits += 1
+
+        logger.info(f"Download cache hit for '{file_meta.get('name')}' {df.shape} (hits={self.hits}, misses={self.misses})")
+        return df
+
+    def put(self, file_meta: dict, df, variant: str='', validate: tuple=None) -> pl.DataFrame:
+        """
+        Store a parsed frame and return it. A LazyFrame is written with `sink_parquet` in one
+        streaming pass and returned memory-mapped from the cache, never collected in memory.
+        `validate` is a (LazyFrame, callback) pair: the LazyFrame is collected in the same pass
+        and the callback may raise on its result, in which case nothing is stored.
+        """
+        key = self.cache_key(file_meta, variant)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Write next to the final path and rename, so readers never see half a file
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix='.parquet.tmp', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            if isinstance(df, pl.LazyFrame):
+                checks = [validate[0]] if validate else []
+                results = pl.collect_all([df.sink_parquet(tmp_path, compression='zstd', lazy=True)] + checks, engine='streaming')
+                if validate:
+                    validate[1](results[-1])
+            else:
+                df.write_parquet(tmp_path, compression='zstd')
+            os.replace(tmp_path, self.entry_path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self.lock:
+            manifest = self.load_manifest()
+            version = file_meta.get('md5Checksum') or file_meta.get('modifiedTime')
+            # Older versions of the same file can't be hit again; other variants of this one still can
+            for old_key in [k for k, v in manifest.items() if v['file_id'] == file_meta['id'] and v['version'] != version]:
+                self.remove(old_key)
+            manifest[key] = {
+                'file_id': file_meta['id'],
+                'name': file_meta.get('name'),
+                'version': version,
+                'size': os.path.getsize(self.entry_path(key)),
+                'last_access': datetime.now(timezone.utc).isoformat(),
+            }
+            self.evict(keep=key)
+            self.save_manifest()
+            if isinstance(df, pl.LazyFrame):
+                df = pl.read_parquet(self.entry_path(key), memory_map=True)
+        return df
+
+    def remove(self, key: str) -> None:
+        self.manifest.pop(key, None)
+        if os.path.exists(self.entry_path(key)):
+            os.remove(self.entry_path(key))
+
+    def evict(self, keep: str=None) -> None:
+        """Drop least recently used entries (but `keep`, the one just stored) until the cache fits in `max_size_mb`."""
+        max_bytes = self.max_size_mb * 1024 * 1024
+        total = sum(v['size'] for v in self.manifest.values())
+        for key, entry in sorted(self.manifest.items(), key=lambda kv: kv[1]['last_access']):
+            if total <= max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= entry['size']
+            self.remove(key)
+            logger.debug(f"Download cache evicted '{entry['name']}' ({round(entry['size'] / (1024 * 1024), 3)} Mb)")
+
+    def stats(self) -> dict:
+        with self.lock:
+            manifest = self.load_manifest()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(manifest),
+                'size_mb': round(sum(v['size'] for v in manifest.values()) / (1024 * 1024), 3),
+            }
+
+
+# Initialize a shared cache for raw downloads
+download_cache = DownloadCache()
+# Hits made after the last put still reach the manifest
+atexit.register(download_cache.flush)
@@ -1,6 +1,13 @@
+import os
 import polars as pl
 from src.gdrive_handler import (
     download_csv_into_polars,
+    build_csv_options,
+    text_csv_options,
+    parse_typed_columns,
+    stream_file_path,
+    remove_stream_files,
+    PARALLEL_DOWNLOAD_MIN_SIZE,
     # download_sheets_into_df,
     get_gdrive_credentials_for_institutional_account,
     get_drive_service
@@ -11,38 +18,196 @@ from src.gsheets_handler import (
     get_gsheets_credentials_for_institutional_account,
     get_sheets_service
 )
+from src.download_cache import download_cache
+from src.dictionary_cache import dictionary_cache
+from src.schema_compiler import schema_compiler, csv_read_options, cast_failure_counts, check_cast_failures, DICTIONARY_PATH, SOURCE_READ_HINTS
+from loguru import logger
+from src.api_replay import api_http, GOOGLE_API_MODE
 
 
 class FBSExtractor:
 
+    # Stream raw downloads to disk instead of buffering them in memory
+    stream_downloads = os.getenv('STREAM_DOWNLOADS', '1') == '1'
+    transport_connections = int(os.getenv('TRANSPORT_CONNECTIONS', 10))
+    # Download large raw files with concurrent Range requests (live mode only, see gdrive_handler)
+    parallel_downloads = os.getenv('PARALLEL_DOWNLOADS', '1') == '1'
+    # 'live', 'record' or 'replay' (from local fixtures, no OAuth), see src.api_replay
+    api_mode = GOOGLE_API_MODE
+
+    # Read raw exports with the dtypes of the data dictionary instead of inferring them
+    typed_reads = os.getenv('TYPED_CSV_READS', '1') == '1'
+    dictionary_path = DICTIONARY_PATH
+    source_read_hints = SOURCE_READ_HINTS
+
     def __init__(self):
-        self.start_drive_service()
-        self.start_sheets_service()
-    
-    @classmethod
+        # Credentials and services are loaded on first use, so importing this module
+        # (or a run that never reaches an API) costs no token refresh nor client build
+        self._drive_service = None
+        self._sheets_service = None
+        self._transport = None
+        self._sheets_transport = None
+        # Credentials of the Sheets service for the threads writing blocks (live mode only,
+        # a recording must see every request)
+        self.sheets_credentials = None
+
     def start_drive_service(self) -> None:
-        creds = get_gdrive_credentials_for_institutional_account()
-        self.drive_service = get_drive_service(creds=creds)
-        
-    @classmethod
+        creds = None if self.api_mode == 'replay' else get_gdrive_credentials_for_institutional_account()
+        self._drive_service = get_drive_service(creds=creds, http=api_http(creds, mode=self.api_mode))
+
     def start_sheets_service(self) -> None:
-        creds = get_gsheets_credentials_for_institutional_account()
-        self.sheets_service = get_sheets_service(creds=creds)
+        creds = None if self.api_mode == 'replay' else get_gsheets_credentials_for_institutional_account()
+        self._sheets_service = get_sheets_service(creds=creds, http=api_http(creds, mode=self.api_mode))
+        self.sheets_credentials = creds if self.api_mode == 'live' else None
+
+    @property
+    def drive_service(self):
+        if self._drive_service is None:
+            self.start_drive_service()
+        return self._drive_service
 
+    @drive_service.setter
+    def drive_service(self, service) -> None:
+        self._drive_service = service
+
+    @property
+    def sheets_service(self):
+        if self._sheets_service is None:
+            self.start_sheets_service()
+        return self._sheets_service
+
+    @sheets_service.setter
+    def sheets_service(self, service) -> None:
+        self._sheets_service = service
+        self.sheets_credentials = None
+
+    @property
+    def transport(self):
+        """Pooled async HTTP transport sharing the Drive credentials (read only), built on first use."""
+        if self._transport is None:
+            from src.async_transport import SyncGoogleTransport
+            self._transport = SyncGoogleTransport(
+                credentials=get_gdrive_credentials_for_institutional_account(),
+                max_connections=self.transport_connections
+            )
+        return self._transport
+
+    @property
+    def sheets_transport(self):
+        """
+        Pooled async HTTP transport for the Sheets writes, with the credentials of the Sheets
+        service (the Drive token can't write). None when the service has no credentials of its
+        own (replay, record or a service set from outside).
+        """
+        if self._sheets_transport is None:
+            self.sheets_service
+            if self.sheets_credentials is None:
+                return None
+            from src.async_transport import SyncGoogleTransport
+            self._sheets_transport = SyncGoogleTransport(
+                credentials=self.sheets_credentials,
+                max_connections=self.transport_connections
+            )
+        return self._sheets_transport
+
+    def close(self) -> None:
+        """Close the pooled transports (connections and event loop threads) built so far."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        if self._sheets_transport is not None:
+            self._sheets_transport.close()
+            self._sheets_transport = None
+
+    def get_read_options(self, file_name: str) -> tuple:
+        """CSV read options of a source and the cache variant they produce (None when untyped)."""
+        if not self.typed_reads:
+            return None, file_name
+        try:
+            plans = schema_compiler.compile(self.dictionary_path)
+        except Exception as e:
+            logger.warning(f"Data dictionary '{self.dictionary_path}' could not be read, '{file_name}' will be read with inferred types. Error: {e}")
+            return None, file_name
+        if file_name not in plans:
+            return None, file_name
+
+        read_options = csv_read_options(plans[file_name], **self.source_read_hints.get(file_name, {}))
+        # A new dictionary changes the parsed output, so it's part of the cache key
+        return read_options, f"{file_name}:typed:{dictionary_cache.workbook_hash(self.dictionary_path)[:12]}:casts"
 
     def raw_data_extraction(self, files: dict, layer: str, target: list) -> tuple[str, dict]:
         # Sort and get most recent file
         files = sorted(files['files'], key=lambda x: x['createdTime'], reverse=True)
         selected_file = files[0] if files else None
+        return self.extract_raw_file(selected_file, layer=layer), selected_file
 
-        df = download_csv_into_polars(
-                service=self.drive_service, 
-                file_id=selected_file['id'],
-                file_name=selected_file['name'].split("_")[-1].split(".")[0], 
-                is_shared_drive=True,
-                data_layer=layer
-            )
-        return df, selected_file
+    def extract_raw_file(self, selected_file: dict, layer: str='raw') -> pl.DataFrame:
+        """Download and parse one raw export (a files.list record), through the download cache."""
+        file_name = selected_file['name'].split("_")[-1].split(".")[0]
+
+        read_options, variant = self.get_read_options(file_name)
+
+        # Skip the download when this version of the file was already parsed
+        df = download_cache.get(selected_file, variant=variant)
+        if df is None:
+            file_size = int(selected_file.get('size') or 0)
+            ranged = self.parallel_downloads and self.api_mode == 'live' and file_size >= PARALLEL_DOWNLOAD_MIN_SIZE
+            try:
+                df = download_csv_into_polars(
+                        service=self.drive_service, 
+                        file_id=selected_file['id'],
+                        file_name=file_name, 
+                        is_shared_drive=True,
+                        data_layer=layer,
+                        stream=self.stream_downloads,
+                        read_options=read_options,
+                        transport=self.transport if ranged else None,
+                        file_size=file_size
+                    )
+                if isinstance(df, pl.LazyFrame):
+                    df = self.cache_streamed_read(selected_file, df, read_options, variant=variant, file_name=file_name)
+                elif isinstance(df, pl.DataFrame):
+                    download_cache.put(selected_file, df, variant=variant)
+            finally:
+                # The read is in the cache by now: the streamed temporary files are no longer needed
+                remove_stream_files(selected_file['id'])
+        return df
+
+    def cache_streamed_read(self, selected_file: dict, lf: pl.LazyFrame, read_options: dict, variant: str, file_name: str) -> pl.DataFrame:
+        """
+        Write a streamed read (a scan of its temporary file) into the download cache in one
+        streaming pass, its typed columns parsed and the values that fail counted on the way,
+        and return the cached frame memory-mapped: the raw export is never collected in memory.
+        The scan parses the numbers itself; when it rejects a malformed one, the file is scanned
+        again as text so the failures are counted (`schema_compiler.check_cast_failures`).
+        """
+        try:
+            return self.put_streamed_read(selected_file, lf, read_options, variant=variant, file_name=file_name)
+        except pl.exceptions.ComputeError as e:
+            path = stream_file_path(selected_file['id'])
+            if not read_options or path is None:
+                raise
+            logger.warning(f"Malformed numbers in '{file_name}', scanning it as text to count them. Error: {str(e).splitlines()[0]}")
+            csv_options, _ = build_csv_options(file_name=file_name, read_options=read_options)
+            lf = pl.scan_csv(path, **text_csv_options(csv_options))
+            return self.put_streamed_read(selected_file, lf, read_options, variant=variant, file_name=file_name)
+
+    def put_streamed_read(self, selected_file: dict, lf: pl.LazyFrame, read_options: dict, variant: str, file_name: str) -> pl.DataFrame:
+        parsed = parse_typed_columns(lf, read_options, source=file_name)
+        schema = lf.collect_schema()
+        numeric = {col: dtype for col, dtype in (read_options or {}).get('numeric_types', {}).items() if schema.get(col) == pl.String}
+        dates = {col: 'date' for col in (read_options or {}).get('date_formats', {}) if schema.get(col) == pl.String}
+        if not numeric and not dates:
+            return download_cache.put(selected_file, parsed, variant=variant)
+
+        def check(counts: pl.DataFrame) -> None:
+            counts = counts.row(0, named=True)
+            check_cast_failures(counts, numeric, source=file_name)
+            # Dates only warn, as in `date_parser`
+            check_cast_failures(counts, dates, source=file_name, max_failure_rate=None)
+
+        validate = (cast_failure_counts(lf, parsed, list(numeric) + list(dates)), check)
+        return download_cache.put(selected_file, parsed, variant=variant, validate=validate)
 
 
     def modeled_data_extraction(self, files: dict, layer: str, target: list) -> tuple[pl.DataFrame, dict]:
@@ -3,21 +3,37 @@ import polars as pl
 import csv
 from io import StringIO
 import io, os
-from googleapiclient.http import MediaIoBaseDownload
 from loguru import logger
 import pickle
 import os.path
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
 import urllib.parse
-from src.db_manager import db_admin
+import atexit
+import codecs
+import tempfile
+import threading
+import contextlib
+from src.date_parser import date_parser
+from src.schema_compiler import cast_numeric_columns
 
 
 # Solo lectura de metadatos
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 INSTITUTIONAL_EMAIL = 'cgarcia@fbscgr.gov.co'
 DB_PATH = 'db/fbs_data.duckdb'
+FILE_LIST_FIELDS = "id, name, mimeType, parents, createdTime, modifiedTime, md5Checksum, size"
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE_MB', 16)) * 1024 * 1024
+STREAM_DIR = os.getenv('STREAM_DIR', None)
+# Files from this size on are downloaded with parallel Range requests when a transport is given
+PARALLEL_DOWNLOAD_MIN_SIZE = int(os.getenv('PARALLEL_DOWNLOAD_MIN_MB', 32)) * 1024 * 1024
+
+# Temporary files backing the LazyFrames of the streamed reads: {path: (thread id, Drive file id)}
+stream_files = {}
+stream_files_lock = threading.Lock()
+# Shared drive ids by name, resolved once per process (see `lookup_names`)
+shared_drive_ids = {}
+# Credentials by token file, shared by the services of every thread
+credentials_cache = {}
+credentials_lock = threading.Lock()
 
 
 def build_auth_url_for_specific_user(authorization_url):
@@ -38,7 +54,7 @@ def build_auth_url_for_specific_user(authorization_url):
     return new_url
 
 
-def get_gdrive_credentials_for_institutional_account(token_path: str = 'credentials/drive_token.pickle'):
+def load_gdrive_credentials(token_path: str):
     creds = None
     # El archivo token.pickle almacena los tokens de acceso y refresco del usuario
     if os.path.exists(token_path):
@@ -51,10 +67,13 @@ def get_gdrive_credentials_for_institutional_account(token_path: str = 'credenti
     # También puedes forzar la re-autenticación eliminando token.pickle
     # para asegurar que siempre se presente la pantalla de selección de cuenta.
     if not creds or not creds.valid:
+        # The Google auth stack is only imported when a login or refresh is needed
         if creds and creds.expired and creds.refresh_token:
+            from google.auth.transport.requests import Request
             creds.refresh(Request())
             logger_msg = f"Credenciales refrescadas para {token_path}"
         else:
+            from google_auth_oauthlib.flow import InstalledAppFlow
             flow = InstalledAppFlow.from_client_secrets_file('credentials/google_credentials.json', SCOPES)
 
             # run_local_server acepta el callback para modificar la URL antes de abrirla.
@@ -72,12 +91,31 @@ def get_gdrive_credentials_for_institutional_account(token_path: str = 'credenti
     return creds
 
 
-def get_drive_service(creds: object = None):
-    """Autentica y devuelve el objeto de servicio de Google Drive."""
-    if creds is None:
+def get_gdrive_credentials_for_institutional_account(token_path: str = 'credentials/drive_token.pickle'):
+    """
+    Credenciales de Drive compartidas: loaded once per token file behind a lock, so the
+    services of every worker thread share them instead of each refreshing and rewriting the token.
+    """
+    with credentials_lock:
+        creds = credentials_cache.get(token_path)
+        if creds is None:
+            creds = credentials_cache[token_path] = load_gdrive_credentials(token_path)
+        elif not creds.valid and creds.refresh_token:
+            # Refreshed in place: the services already built hold this same object
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+    return creds
+
+
+def get_drive_service(creds: object = None, http: object = None):
+    """Autentica y devuelve el objeto de servicio de Google Drive (`http` replaces the credentials, see src.api_replay)."""
+    from src.google_services import build_service
+    if creds is None and http is None:
         logger.error("Credenciales no proporcionadas. Llama a get_google_credentials_for_institutional_account primero.")
+    elif http is not None:
+        return build_service('drive', 'v3', http=http)
     else:
-        return build('drive', 'v3', credentials=creds)
+        return build_service('drive', 'v3', credentials=creds)
 
 
 def list_all_shared_drives(service: object = None):
@@ -112,10 +150,7 @@ def list_all_shared_drives(service: object = None):
     return all_shared_drives
 
 
-def list_files_and_folders(service, location_id=None, is_shared_drive=False, page_size=100, file_type=None, search_name=None) -> list:
-    page_token = None
-    all_files = []
-    
+def build_files_query(location_id=None, file_type=None, search_name=None) -> str:
     # Construir la consulta 'q'
     query_parts = ["trashed = false"] # Siempre excluimos la papelera
 
@@ -130,20 +165,57 @@ def list_files_and_folders(service, location_id=None, is_shared_drive=False, pag
         query_parts.append(f"mimeType = '{file_type}'")
 
     if search_name:
-        query_parts.append(f"name = '{search_name}'")
+        # Several names are looked up at once with OR'ed conditions
+        names = [search_name] if isinstance(search_name, str) else list(search_name)
+        name_query = " or ".join(f"name = '{quote_query_value(n)}'" for n in names)
+        query_parts.append(f"({name_query})" if len(names) > 1 else name_query)
     
     # Unir todas las partes de la consulta
-    full_query = " and ".join(query_parts)
+    return " and ".join(query_parts)
+
+
+def quote_query_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def files_list_params(location_id=None, is_shared_drive=False, page_size=100, file_type=None, search_name=None, order_by=None, corpora=None, drive_id=None) -> dict:
+    """Keyword arguments of `files().list`, shared by the sequential and the batched listings."""
+    params = {
+        'pageSize': page_size,
+        'fields': f"nextPageToken, files({FILE_LIST_FIELDS})",
+        'includeItemsFromAllDrives': is_shared_drive, # Incluir si es Unidad Compartida
+        'supportsAllDrives': is_shared_drive,         # Necesario para el anterior
+        'q': build_files_query(location_id=location_id, file_type=file_type, search_name=search_name),
+    }
+    if order_by:
+        params['orderBy'] = order_by
+    if drive_id:
+        params.update(corpora='drive', driveId=drive_id)
+    elif corpora:
+        params['corpora'] = corpora
+    return params
+
+
+def list_files_and_folders(service, location_id=None, is_shared_drive=False, page_size=100, file_type=None, search_name=None,
+                           order_by=None, max_results=None, corpora=None, drive_id=None, first_page: dict=None) -> list:
+    """
+    Lista (paginando) los archivos de una ubicacion. `search_name` can be a list of names,
+    `max_results` stops once that many files were read (e.g. the newest with `order_by`), and
+    `first_page` is an already fetched first response (see `list_many_folders`).
+    """
+    page_token = None
+    all_files = []
+    params = files_list_params(
+        location_id=location_id, is_shared_drive=is_shared_drive, page_size=page_size, file_type=file_type,
+        search_name=search_name, order_by=order_by, corpora=corpora, drive_id=drive_id
+    )
+
     while True:
         try:
-            results = service.files().list(
-                pageSize=page_size,
-                fields="nextPageToken, files(id, name, mimeType, parents, createdTime, modifiedTime)",
-                includeItemsFromAllDrives=is_shared_drive, # Incluir si es Unidad Compartida
-                supportsAllDrives=is_shared_drive,         # Necesario para el anterior
-                q=full_query,
-                pageToken=page_token
-            ).execute()
+            if first_page is not None:
+                results, first_page = first_page, None
+            else:
+                results = service.files().list(**params, pageToken=page_token).execute()
             
             items = results.get('files', [])
             all_files.extend(items)
@@ -153,7 +225,7 @@ def list_files_and_folders(service, location_id=None, is_shared_drive=False, pag
             #     print(f"  Archivos encontrados hasta ahora en esta ubicación: {len(all_files)}")
 
             page_token = results.get('nextPageToken', None)
-            if not page_token:
+            if not page_token or (max_results and len(all_files) >= max_results):
                 break
 
         except Exception as e:
@@ -163,51 +235,126 @@ def list_files_and_folders(service, location_id=None, is_shared_drive=False, pag
     if not all_files:
         logger.warning('No se encontraron archivos o carpetas en la ubicación especificada.')
 
-    return all_files
+    return all_files[:max_results] if max_results else all_files
 
 
-def read_metadata(service, target_drive_name: str=None, target_parents: list=[], target_folders: list=[], data_layer: str=None) -> list:
-    # Get the ids and names of all shared drives
-    shared_drives = list_all_shared_drives(service=service)
+def list_many_folders(service, folder_ids: list, is_shared_drive: bool=True, **query) -> list:
+    """
+    List several folders, one result list per folder. The first page of every folder is
+    requested in a single batch HTTP request; only folders with more pages are continued one by one.
+    """
+    if len(folder_ids) < 2:
+        return [list_files_and_folders(service, location_id=f, is_shared_drive=is_shared_drive, **query) for f in folder_ids]
+
+    from src.google_services import execute_batch
+    params = {k: v for k, v in query.items() if k != 'max_results'}
+    first_pages = execute_batch(service, {
+        f: service.files().list(**files_list_params(location_id=f, is_shared_drive=is_shared_drive, **params))
+        for f in folder_ids
+    })
+    return [
+        list_files_and_folders(service, location_id=f, is_shared_drive=is_shared_drive, first_page=first_pages[f], **query)
+        for f in folder_ids
+    ]
+
+
+def lookup_names(service, target_drive_name: str, names: list, transport=None) -> tuple:
+    """
+    (drive id, records) of every file or folder of the shared drive named like one of `names`,
+    found with one OR'ed query. The drive id is kept for the process; while it's unknown the
+    drive list and the names (searched in all drives) go together in one batch HTTP request.
+    """
+    drive_id = shared_drive_ids.get(target_drive_name)
+    query = {'is_shared_drive': True, 'search_name': names, 'page_size': 1000}
 
-    # Find the ID with the target drive name
-    target_drive_id = None
-    
-    for drive in shared_drives:
-        if drive['name'] == target_drive_name:
-            target_drive_id = drive['id']
-            logger.debug(f"Shared Drive '{target_drive_name}' found with ID: {target_drive_id}")
-            break
+    if transport is not None:
+        if drive_id is None:
+            drive_id = next((d['id'] for d in transport.list_all_shared_drives() if d['name'] == target_drive_name), None)
+        records = transport.list_files_and_folders(drive_id=drive_id, **query) if drive_id else []
 
-    for p in target_parents:
-        if target_drive_id:
-            files_and_folders = list_files_and_folders(
-                service, 
-                location_id=target_drive_id, 
-                is_shared_drive=True,
-                search_name=p
-            )
-        target_drive_id = files_and_folders[0]['id'] if p else None
+    elif drive_id is not None:
+        records = list_files_and_folders(service, drive_id=drive_id, **query)
 
-    for f in target_folders:
-        # Set final value
-        # files_dict = {'location_id': files_and_folders[0]['parents'][0], 'files': files_and_folders}
+    else:
+        from src.google_services import execute_batch
+        first_pages = execute_batch(service, {
+            'drives': service.drives().list(fields="nextPageToken, drives(id, name)", pageSize=100),
+            'names': service.files().list(**files_list_params(corpora='allDrives', **query)),
+        })
+        drives = first_pages['drives'].get('drives', [])
+        if first_pages['drives'].get('nextPageToken'):
+            drives = list_all_shared_drives(service=service)
+        drive_id = next((d['id'] for d in drives if d['name'] == target_drive_name), None)
+        records = list_files_and_folders(service, corpora='allDrives', first_page=first_pages['names'], **query)
+
+    if drive_id is not None:
+        logger.debug(f"Shared Drive '{target_drive_name}' found with ID: {drive_id}")
+        shared_drive_ids[target_drive_name] = drive_id
+    return drive_id, records
+
+
+def read_metadata(service, target_drive_name: str=None, target_parents: list=[], target_folders: list=[], data_layer: str=None, metadata_index=None, transport=None, latest_only: bool=False) -> dict:
+    """
+    Resolve `target_parents` (a trailing None lists the last parent) and `target_folders` in
+    the shared drive. Raw folders are listed with their files, only the newest one with
+    `latest_only` (`orderBy=createdTime desc` and a page of one, pushed down to the API);
+    modeled targets come with the 'auditoria' log next to them.
+    """
+    # Resolve folders from the local metadata index when one is given
+    if metadata_index is not None:
+        return read_metadata_from_index(
+            service=service,
+            metadata_index=metadata_index,
+            target_drive_name=target_drive_name,
+            target_parents=target_parents,
+            target_folders=target_folders,
+            data_layer=data_layer,
+            latest_only=latest_only
+        )
 
-        # Validation is different for raw layer
-        if data_layer == 'raw':
+    # Every name of the path is found with a single query and the path walked from the drive root
+    names = [p for p in target_parents if p] + list(target_folders) + (["auditoria"] if data_layer == 'modeled' else [])
+    drive_id, records = lookup_names(service, target_drive_name, list(dict.fromkeys(names)), transport=transport)
+    if drive_id is None:
+        logger.error(f"Shared Drive '{target_drive_name}' not found.")
+        return {}
+
+    parent_id = drive_id
+    for p in target_parents:
+        if not p:
+            continue
+        folder = next((r for r in records if r['name'] == p and parent_id in r.get('parents', [])), None)
+        if folder is None:
+            logger.error(f"Folder '{p}' not found in '{target_drive_name}'.")
+            return {}
+        parent_id = folder['id']
+    files_and_folders = [r for r in records if parent_id in r.get('parents', [])]
+
+    files_dict = {}
+    if data_layer == 'raw':
+        folder_ids = []
+        for f in target_folders:
             folder_match = next((d for d in files_and_folders if d.get("name") == f), None)
-            target_files = list_files_and_folders(
-                service,
-                location_id=folder_match['id'], 
-                is_shared_drive=True,
-                search_name=None
-            )
-            # Append to dictionary for each folder
-            files_dict = {'folder_id': folder_match['id'], 'files': target_files}
+            if folder_match is None:
+                logger.error(f"Folder '{f}' not found in the {data_layer.upper()} layer of '{target_drive_name}'.")
+                return {}
+            folder_ids.append(folder_match['id'])
+        query = {'order_by': "createdTime desc", 'page_size': 1, 'max_results': 1} if latest_only else {}
+        # Listing calls go through the pooled async transport when one is given
+        if transport is not None:
+            folder_listings = transport.list_many_folders(folder_ids, **query)
+        else:
+            folder_listings = list_many_folders(service, folder_ids, **query)
+        # Set final value
+        for folder_id, target_files in zip(folder_ids, folder_listings):
+            files_dict = {'folder_id': folder_id, 'files': target_files}
 
-        elif data_layer == 'modeled':
+    elif data_layer == 'modeled':
+        for f in target_folders:
             folder_match = next((d for d in files_and_folders if d.get("name") == f), None)
-            assert type(folder_match) == dict
+            if folder_match is None:
+                logger.error(f"Folder '{f}' not found in the {data_layer.upper()} layer of '{target_drive_name}'.")
+                return {}
 
             # Get auth files
             auth_log = next((d for d in files_and_folders if d.get("name") == "auditoria"), None)
@@ -217,8 +364,120 @@ def read_metadata(service, target_drive_name: str=None, target_parents: list=[],
     return files_dict
 
 
-def download_csv_into_polars(service, file_id, file_name, is_shared_drive=False, data_layer: str=None) -> str:
+def read_metadata_from_index(service, metadata_index, target_drive_name: str=None, target_parents: list=[], target_folders: list=[], data_layer: str=None, latest_only: bool=False) -> dict:
+    """Same output as `read_metadata`, resolving paths from a `DriveMetadataIndex`."""
+    metadata_index.sync(service=service, drive_name=target_drive_name)
+
+    parent_path = "/".join(p for p in target_parents if p)
+    parent = metadata_index.lookup(target_drive_name, parent_path)
+    if parent is None:
+        logger.error(f"Folder '{parent_path}' not found in the metadata index of '{target_drive_name}'.")
+        return {}
+    files_and_folders = metadata_index.list_children(parent['id'])
+
+    files_dict = {}
+    for f in target_folders:
+        folder_match = next((d for d in files_and_folders if d.get("name") == f), None)
+        if folder_match is None:
+            logger.error(f"Folder '{f}' not found in the metadata index of '{target_drive_name}' ({parent_path}).")
+            return {}
+
+        if data_layer == 'raw':
+            target_files = metadata_index.list_children(folder_match['id'])
+            if latest_only:
+                target_files = sorted(target_files, key=lambda x: x['createdTime'], reverse=True)[:1]
+            files_dict = {'folder_id': folder_match['id'], 'files': target_files}
+
+        elif data_layer == 'modeled':
+            auth_log = next((d for d in files_and_folders if d.get("name") == "auditoria"), None)
+            files_dict = {'folder_id': folder_match['id'], 'files': [folder_match] + [auth_log]}
+
+    logger.debug(f"Data files and folders in {data_layer.upper()} layer found in the metadata index.")
+    return files_dict
+
+
+def build_csv_options(file_name: str, read_options: dict=None) -> tuple:
+    """
+    Keyword arguments for `read_csv`/`scan_csv` and the options to parse the text columns
+    after reading (`parse_typed_columns`). With `read_options` (see `schema_compiler.csv_read_options`)
+    the reader parses the numbers of the data dictionary itself (`schema_overrides`,
+    `decimal_comma`), strictly: a malformed value raises a ComputeError, and the file is read
+    again with `text_csv_options` to count them. The dates are parsed after the read; without
+    `read_options` the types are inferred.
+    """
+    options = {
+        'separator': ';',
+        'skip_rows': 1 if file_name == 'creditos' else 0,
+        'truncate_ragged_lines': True,
+    }
+    if not read_options:
+        options['ignore_errors'] = True
+        return options, {}
+    options['infer_schema'] = False
+    options['schema_overrides'] = {col: getattr(pl, dtype) for col, dtype in read_options.get('numeric_types', {}).items()}
+    options['decimal_comma'] = read_options.get('decimal_comma', False)
+    return options, dict(read_options)
+
+
+def text_csv_options(csv_options: dict) -> dict:
+    """Options of a typed read (`build_csv_options`) with every column as text, cast after with the failures counted."""
+    return {k: v for k, v in csv_options.items() if k not in ('schema_overrides', 'decimal_comma')}
+
+
+def read_typed_csv(source, csv_options: dict, parse_options: dict, file_name: str=None) -> pl.DataFrame:
+    """
+    Eager read of a latin1 CSV with `build_csv_options`. When the reader rejects a malformed
+    number, the file is read again as text and cast with the failures counted (`parse_typed_columns`).
+    """
+    try:
+        df = pl.read_csv(source, encoding='latin1', **csv_options)
+    except pl.exceptions.ComputeError as e:
+        if not csv_options.get('schema_overrides'):
+            raise
+        logger.warning(f"Malformed numbers in '{file_name}', reading it as text to count them. Error: {str(e).splitlines()[0]}")
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        df = pl.read_csv(source, encoding='latin1', **text_csv_options(csv_options))
+    return parse_typed_columns(df, parse_options, source=file_name)
+
+
+def parse_typed_columns(df, parse_options: dict, source: str=None):
+    """Cast the numeric and parse the date text columns of a DataFrame or LazyFrame read with `build_csv_options`."""
+    if not parse_options:
+        return df
+    # Numbers parsed by the reader are no longer text and are left as they are
+    df = cast_numeric_columns(df, parse_options.get('numeric_types', {}), decimal_comma=parse_options.get('decimal_comma', False), source=source)
+    return date_parser.parse(df, parse_options.get('date_formats', {}), source=source)
+
+
+def download_csv_into_polars(service, file_id, file_name, is_shared_drive=False, data_layer: str=None, stream: bool=False, read_options: dict=None,
+                             transport=None, file_size: int=None) -> str:
+
+    # Large files of known size: concurrent Range requests over the pooled async transport
+    if transport is not None and file_size and file_size >= PARALLEL_DOWNLOAD_MIN_SIZE:
+        return ranged_csv_into_polars(
+            transport=transport,
+            file_id=file_id,
+            file_name=file_name,
+            file_size=file_size,
+            is_shared_drive=is_shared_drive,
+            data_layer=data_layer,
+            stream=stream,
+            read_options=read_options
+        )
+
+    # Write chunks straight to disk and scan them lazily instead of buffering in memory
+    if stream:
+        return stream_csv_into_polars(
+            service=service,
+            file_id=file_id,
+            file_name=file_name,
+            is_shared_drive=is_shared_drive,
+            data_layer=data_layer,
+            read_options=read_options
+        )
     
+    from googleapiclient.http import MediaIoBaseDownload
     try:
         request = service.files().get_media(
             fileId=file_id,
@@ -244,22 +503,155 @@ def download_csv_into_polars(service, file_id, file_name, is_shared_drive=False,
         polars_buffer.seek(0) # Reset the buffer position to the beginning
 
         # Read the content directly from the new BytesIO object with polars
-        first_row = 1 if file_name == 'creditos' else 0
-        df = pl.read_csv(
-                polars_buffer,
-                separator=';',
-                encoding='latin1',
-                ignore_errors=True,
-                skip_rows=first_row,
-                truncate_ragged_lines=True
-            )
-        return df
+        csv_options, parse_options = build_csv_options(file_name=file_name, read_options=read_options)
+        return read_typed_csv(polars_buffer, csv_options, parse_options, file_name=file_name)
 
     except Exception as e:
         logger.error(f"Error al descargar el archivo '{file_id}': {e}")
         return ""
 
 
+class TranscodingWriter:
+    """
+    Sink de MediaIoBaseDownload que convierte cada chunk de `encoding` a utf8
+    antes de escribirlo en `target` (polars only scans utf8 files).
+    """
+
+    def __init__(self, target, encoding: str='latin1'):
+        self.target = target
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.bytes_in = 0
+
+    def write(self, chunk: bytes) -> int:
+        self.bytes_in += len(chunk)
+        self.target.write(self.decoder.decode(chunk).encode('utf-8'))
+        return len(chunk)
+
+    def flush(self) -> None:
+        self.target.write(self.decoder.decode(b'', final=True).encode('utf-8'))
+        self.target.flush()
+
+
+def stream_csv_into_polars(service, file_id, file_name, is_shared_drive=False, data_layer: str=None, chunk_size: int=STREAM_CHUNK_SIZE, read_options: dict=None) -> pl.LazyFrame:
+    """
+    Descarga el archivo por chunks directamente a un archivo temporal (transcodificado
+    de latin1 a utf8 en el camino) y devuelve un LazyFrame sobre el.
+    The numbers of a typed read are parsed by the scan, the dates once collected
+    (`parse_typed_columns`); see `stream_file_path` to scan the file again as text.
+    """
+    from googleapiclient.http import MediaIoBaseDownload
+    try:
+        request = service.files().get_media(
+            fileId=file_id,
+            supportsAllDrives=is_shared_drive
+        )
+
+        # scan_csv needs a real path, so the chunks go to a named temporary file
+        with tempfile.NamedTemporaryFile(prefix=f"{file_name}_", suffix=".csv", dir=STREAM_DIR, delete=False) as target:
+            register_stream_file(target.name, file_id)
+            writer = TranscodingWriter(target, encoding='latin1')
+            downloader = MediaIoBaseDownload(writer, request, chunksize=chunk_size)
+            done = False
+
+            while not done:
+                status, done = downloader.next_chunk()
+            writer.flush()
+
+        mb_value = writer.bytes_in / (1024 * 1024)
+        logger.warning(f"File {file_name} from {data_layer}' streamed {int(status.progress() * 100)}% to {target.name}, file size: {round(mb_value, 3)} megabytes (Mb).")
+
+        csv_options, _ = build_csv_options(file_name=file_name, read_options=read_options)
+        return pl.scan_csv(target.name, **csv_options)
+
+    except Exception as e:
+        logger.error(f"Error al descargar el archivo '{file_id}': {e}")
+        return ""
+
+
+def transcode_file(source_path: str, target, encoding: str='latin1', chunk_size: int=STREAM_CHUNK_SIZE) -> int:
+    """Copy `source_path` into the open binary file `target` as utf8, chunk by chunk; return the bytes read."""
+    writer = TranscodingWriter(target, encoding=encoding)
+    with open(source_path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            writer.write(chunk)
+    writer.flush()
+    return writer.bytes_in
+
+
+def ranged_csv_into_polars(transport, file_id, file_name, file_size: int, is_shared_drive=False, data_layer: str=None, stream: bool=False, read_options: dict=None):
+    """
+    Descarga el archivo con rangos de bytes en paralelo (`SyncGoogleTransport.download_file`)
+    a un archivo temporal y lo lee. Eager reads parse the latin1 file directly; streamed reads
+    transcode it to utf8 first (scan_csv only reads utf8) and return a LazyFrame over it.
+    """
+    raw_path = None
+    try:
+        with tempfile.NamedTemporaryFile(prefix=f"{file_name}_", suffix=".latin1.csv", dir=STREAM_DIR, delete=False) as raw:
+            raw_path = raw.name
+        register_stream_file(raw_path, file_id)
+
+        stats = transport.download_file(file_id, size=file_size, path=raw_path, is_shared_drive=is_shared_drive)
+        logger.info(
+            f"File {file_name} from {data_layer}' downloaded in {stats['ranges']} range(s) ({stats['requests']} request(s), "
+            f"{stats['retried_ranges']} resumed): {round(file_size / 1024 / 1024, 3)} Mb in {stats['seconds']}s, {stats['mb_per_second']} Mb/s."
+        )
+
+        csv_options, parse_options = build_csv_options(file_name=file_name, read_options=read_options)
+        if not stream:
+            return read_typed_csv(raw_path, csv_options, parse_options, file_name=file_name)
+
+        with tempfile.NamedTemporaryFile(prefix=f"{file_name}_", suffix=".csv", dir=STREAM_DIR, delete=False) as target:
+            register_stream_file(target.name, file_id)
+            transcode_file(raw_path, target, encoding='latin1')
+        return pl.scan_csv(target.name, **csv_options)
+
+    except Exception as e:
+        logger.error(f"Error al descargar el archivo '{file_id}': {e}")
+        return ""
+
+    finally:
+        # The latin1 copy is read (eager) or transcoded (streamed) by now
+        if raw_path:
+            remove_stream_file(raw_path)
+
+
+def register_stream_file(path: str, file_id: str) -> None:
+    with stream_files_lock:
+        stream_files[path] = (threading.get_ident(), file_id)
+
+
+def stream_file_path(file_id: str) -> str:
+    """Path of the utf8 temporary file of the last streamed read of `file_id` made by the calling thread."""
+    with stream_files_lock:
+        paths = [path for path, (thread_id, owner) in stream_files.items() if owner == file_id and thread_id == threading.get_ident() and not path.endswith('.latin1.csv')]
+    return paths[-1] if paths else None
+
+
+def remove_stream_file(path: str) -> None:
+    with stream_files_lock:
+        stream_files.pop(path, None)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+def remove_stream_files(file_id: str=None) -> None:
+    """
+    Delete the temporary files of the streamed reads of `file_id` made by the calling thread,
+    once their frame is collected. Without `file_id` every file left is deleted (at exit).
+    """
+    with stream_files_lock:
+        paths = [
+            path for path, (thread_id, owner) in stream_files.items()
+            if file_id is None or (owner == file_id and thread_id == threading.get_ident())
+        ]
+    for path in paths:
+        remove_stream_file(path)
+
+
+# Fallback for files whose frame was never collected
+atexit.register(remove_stream_files)
+
+
 def read_csv_from_drive(service, file_id) -> list:
     # 1. Download the file content as text
     # Note: We use drive_service (the v3 one), NOT sheets_service
@@ -0,0 +1,109 @@
+import os
+import json
+import threading
+from loguru import logger
+from dotenv import load_dotenv
+from googleapiclient.http import HttpRequest
+from googleapiclient.discovery import build_from_document
+from googleapiclient.version import __version__ as googleapiclient_version
+from src.metrics import api_call_counter, api_call_lock
+
+# Load environment variables
+load_dotenv()
+
+
+DISCOVERY_CACHE_DIR = os.getenv('DISCOVERY_CACHE_DIR', 'cache/discovery')
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest"
+
+# Parsed discovery documents, shared by every service built in the process
+discovery_documents = {}
+discovery_lock = threading.Lock()
+
+
+class CountingHttpRequest(HttpRequest):
+    """`requestBuilder` for googleapiclient that counts executed requests per API method."""
+
+    def execute(self, http=None, num_retries=0):
+        counter = api_call_counter.get()
+        if counter is not None:
+            with api_call_lock:
+                counter[self.methodId or 'media'] += 1
+        return super().execute(http=http, num_retries=num_retries)
+
+
+def discovery_path(api: str, version: str) -> str:
+    # Documents are tied to the client library version that bundles or parses them
+    return os.path.join(DISCOVERY_CACHE_DIR, f"{api}.{version}.{googleapiclient_version}.json")
+
+
+def fetch_discovery_document(api: str, version: str) -> str:
+    """Discovery document text: the copy bundled with googleapiclient or, failing that, the discovery API."""
+    from googleapiclient.discovery_cache import get_static_doc
+    content = get_static_doc(api, version)
+    if content is None:
+        import httplib2
+        response, content = httplib2.Http().request(DISCOVERY_URL.format(api=api, version=version))
+        if response.status >= 400:
+            raise RuntimeError(f"Discovery document for {api} {version} could not be fetched, status={response.status}")
+        content = content.decode('utf-8')
+    return content
+
+
+def discovery_document(api: str, version: str) -> dict:
+    """Parsed discovery document of an API, read once per process and kept on disk under DISCOVERY_CACHE_DIR."""
+    key = f"{api}.{version}"
+    with discovery_lock:
+        if key not in discovery_documents:
+            path = discovery_path(api, version)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            else:
+                content = fetch_discovery_document(api, version)
+                os.makedirs(DISCOVERY_CACHE_DIR, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+                logger.debug(f"Discovery document for {api} {version} cached in {path}")
+            discovery_documents[key] = json.loads(content)
+        return discovery_documents[key]
+
+
+def build_service(api: str, version: str, credentials=None, http=None):
+    """googleapiclient service from the cached discovery document, counting its requests (see src.metrics)."""
+    return build_from_document(
+        discovery_document(api, version),
+        credentials=credentials,
+        http=http,
+        requestBuilder=CountingHttpRequest
+    )
+
+
+def execute_batch(service, requests: dict) -> dict:
+    """
+    Send independent requests of a service ({key: request}) in one batch HTTP request and
+    return {key: response}. The batch is counted once, as the single HTTP request it is.
+    """
+    responses, errors = {}, {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            responses[request_id] = response
+
+    batch = service.new_batch_http_request(callback=callback)
+    for key, request in requests.items():
+        batch.add(request, request_id=key)
+
+    counter = api_call_counter.get()
+    if counter is not None:
+        with api_call_lock:
+            counter['batch'] += 1
+    batch.execute()
+
+    if errors:
+        key, error = next(iter(errors.items()))
+        raise RuntimeError(f"{len(errors)} of {len(requests)} batched request(s) failed, first '{key}': {error}")
+    return responses
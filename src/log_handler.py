@@ -1,43 +1,34 @@
+import os
+import json
+import contextlib
 import polars as pl
-from datetime import datetime, date
+from datetime import datetime
 import uuid
 from loguru import logger
+from dotenv import load_dotenv
+from src.schema_compiler import compile_dictionary_sheet, apply_cast_plan
+from src.date_parser import detect_formats, parse_expression
 
+# Load environment variables
+load_dotenv()
+
+
+ROW_HASH_DIR = os.getenv('ROW_HASH_DIR', 'cache/row_hashes')
+ROW_HASH_SEED = 0
+# Bump when the normalization of the hashed values changes, so stored hashes are not compared
+ROW_HASH_VERSION = 2
+# Floats are compared at this precision (the sheet shows rounded values)
+ROW_HASH_FLOAT_DECIMALS = 6
 
-def map_data_types(dictionary, df):
-    type_map = {
-        "Integer": pl.Int64,
-        "String": pl.String,
-        "Timestamp": pl.Datetime,
-        "Float": pl.Float64,
-        "Bool": pl.String
-        # Puedes añadir más tipos de datos aquí según lo necesites
-    }
-
-    tipos_en_string = {dictionary[i]["Nombre_columna"][0]: dictionary[i]["Tipo"][0] for i in range(dictionary.shape[0])}
-
-    expresiones_de_cast = []
-    for col, dtype_str in tipos_en_string.items():
-        if col in df.columns:
-            if dtype_str != "Timestamp":
-                # Si la columna existe, creamos la expresión de cast y la agregamos a la lista
-                expresion = pl.col(col).cast(type_map[dtype_str])
-                expresiones_de_cast.append(expresion)
-            else:
-                # check if element is string or not
-                if not isinstance(df[col].to_list()[0], date):
-                    expresion = pl.col(col).str.strptime(type_map[dtype_str], format="%d/%m/%Y")
-                    expresiones_de_cast.append(expresion)
-                else:
-                    expresion = pl.col(col).cast(type_map[dtype_str])
-                    expresiones_de_cast.append(expresion)
-        else:
-            # Si la columna no existe, la omitimos y puedes imprimir un mensaje
-            logger.warning(f"⚠️ Aviso: La columna '{col}' no se encontró y se omitirá del proceso de cast.")
 
-    # 4. Aplicar los casts a las columnas que existen
-    df_casteado = df.with_columns(expresiones_de_cast)
-    return df_casteado
+def map_data_types(dictionary, df, source: str=None):
+    """
+    Castea `df` segun una hoja del diccionario de datos. `dictionary` can also be an already
+    compiled plan (see `schema_compiler.get_plan`); dates go through `date_parser`, with their
+    formats cached under `source` when given, and the other casts in one `with_columns`.
+    """
+    plan = dictionary if isinstance(dictionary, dict) else compile_dictionary_sheet(dictionary)
+    return apply_cast_plan(plan, df, source=source)
 
 
 def authlog_table(df_raw, df_modeled, log_root: str, id_col: str, target_cols: list):
@@ -93,6 +84,182 @@ def authlog_table(df_raw, df_modeled, log_root: str, id_col: str, target_cols: l
     logs_df = logs_df.select(cols_in_order)
     return logs_df
 
+def normalize_tracked_columns(df, target_cols: list, dtypes: dict=None, decimal_comma: bool=False) -> pl.DataFrame:
+    """
+    Texto canonico de las columnas auditadas, el mismo para la salida tipada y el texto de la hoja.
+
+    Each column is read with its dtype in `dtypes` (the raw side's schema, by default its own):
+    text of a date column is parsed with its detected formats (`date_parser`), text of a numeric
+    column as a number (with `decimal_comma` the '.' are thousands separators). Values are then
+    written as text in one format: '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', integers as is and floats
+    rounded to ROW_HASH_FLOAT_DECIMALS.
+    """
+    dtypes = dtypes or df.schema
+    exprs = []
+    for c in target_cols:
+        dtype, expr = dtypes.get(c, pl.String), pl.col(c)
+        is_date, is_datetime = dtype == pl.Date, dtype == pl.Datetime
+        if df.schema[c] == pl.String and (is_date or is_datetime):
+            expr = parse_expression(c, detect_formats(df[c]), dtype=pl.Date if is_date else pl.Datetime)
+        elif df.schema[c] == pl.String and dtype.is_numeric():
+            text = pl.col(c).str.replace_all(r'[\s$]', '')
+            text = text.str.replace_all('.', '', literal=True).str.replace(',', '.', literal=True) if decimal_comma else text.str.replace_all(',', '', literal=True)
+            expr = pl.when(text.str.len_bytes() > 0).then(text).cast(pl.Float64, strict=False)
+
+        if is_date:
+            expr = expr.cast(pl.Date).dt.strftime('%Y-%m-%d')
+        elif is_datetime:
+            expr = expr.cast(pl.Datetime).dt.strftime('%Y-%m-%d %H:%M:%S')
+        elif dtype.is_integer():
+            expr = expr.cast(pl.Int64, strict=False).cast(pl.String)
+        elif dtype.is_numeric():
+            expr = expr.cast(pl.Float64, strict=False).round(ROW_HASH_FLOAT_DECIMALS).cast(pl.String)
+        else:
+            expr = expr.cast(pl.String).str.strip_chars()
+        exprs.append(expr.alias(c))
+    return df.with_columns(exprs)
+
+
+def compute_row_hashes(df, id_col: str, target_cols: list, dtypes: dict=None, decimal_comma: bool=False) -> pl.DataFrame:
+    """Key (as text) and a 64-bit hash of the tracked columns (see `normalize_tracked_columns`) for every row."""
+    df = normalize_tracked_columns(df, target_cols, dtypes=dtypes, decimal_comma=decimal_comma)
+    return df.select(
+        pl.col(id_col).cast(pl.String),
+        pl.struct(target_cols).hash(seed=ROW_HASH_SEED).alias('row_hash'),
+    )
+
+
+def meta_path(log_root: str) -> str:
+    return os.path.join(ROW_HASH_DIR, f"{log_root}.json")
+
+
+def write_atomic(path: str, write) -> None:
+    """Call `write(tmp_path)` and move the file into place, a crash leaves no partial file."""
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_row_hashes(hashes: pl.DataFrame, log_root: str, id_col: str, target_cols: list) -> None:
+    """
+    Store the hashes in a new Parquet file and point the JSON metadata at it. The metadata is
+    replaced last, so a crash leaves the previous pair in place; the old file is removed after.
+    """
+    os.makedirs(ROW_HASH_DIR, exist_ok=True)
+    previous = read_row_hash_meta(log_root)
+    data_file = f"{log_root}.{uuid.uuid4().hex[:8]}.parquet"
+    write_atomic(os.path.join(ROW_HASH_DIR, data_file), hashes.write_parquet)
+
+    meta = {'id_col': id_col, 'target_cols': target_cols, 'polars_version': pl.__version__, 'hash_version': ROW_HASH_VERSION,
+            'data_file': data_file, 'saved_at': datetime.now().isoformat()}
+    def write_meta(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    write_atomic(meta_path(log_root), write_meta)
+
+    if previous and previous.get('data_file') and previous['data_file'] != data_file:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(ROW_HASH_DIR, previous['data_file']))
+
+
+def read_row_hash_meta(log_root: str) -> dict:
+    if not os.path.exists(meta_path(log_root)):
+        return None
+    with open(meta_path(log_root), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_row_hashes(log_root: str, id_col: str, target_cols: list) -> pl.DataFrame:
+    """Hashes stored by the previous run, or None when missing or not comparable."""
+    meta = read_row_hash_meta(log_root)
+    if meta is None or not meta.get('data_file'):
+        return None
+    data_path = os.path.join(ROW_HASH_DIR, meta['data_file'])
+    if not os.path.exists(data_path):
+        return None
+
+    # Polars hashes are only stable within a version and for the same columns and normalization
+    if meta != {**meta, 'id_col': id_col, 'target_cols': target_cols, 'polars_version': pl.__version__, 'hash_version': ROW_HASH_VERSION}:
+        logger.warning(f"Stored row hashes for '{log_root}' were built with other columns or polars version, ignoring them.")
+        return None
+    return pl.read_parquet(data_path)
+
+
+def detect_changes(current_hashes: pl.DataFrame, previous_hashes: pl.DataFrame, id_col: str) -> pl.DataFrame:
+    """Classify keys as Nuevo, Eliminado or Modificado in a single full outer join of key + hash."""
+    return current_hashes.join(
+        previous_hashes, on=id_col, how='full', suffix='_modeled', coalesce=False
+    ).with_columns(
+        pl.when(pl.col(f'{id_col}_modeled').is_null()).then(pl.lit('Nuevo'))
+        .when(pl.col(id_col).is_null()).then(pl.lit('Eliminado'))
+        .when(pl.col('row_hash') != pl.col('row_hash_modeled')).then(pl.lit('Modificado'))
+        .alias('tipo_cambio')
+    ).filter(pl.col('tipo_cambio').is_not_null()).select(id_col, f'{id_col}_modeled', 'tipo_cambio')
+
+
+def authlog_table_hashed(df_raw, log_root: str, id_col: str, target_cols: list, df_modeled=None, save_hashes: bool=True, decimal_comma: bool=False) -> pl.DataFrame:
+    """
+    Version de `authlog_table` basada en hashes por fila.
+
+    Only key + hash are compared. Full rows are pulled just for the keys whose hash differs.
+    The modeled side comes from `df_modeled` when given, otherwise from the hashes stored
+    by the previous run (then the `_modeled` values are not available and stay null).
+    Unlike `authlog_table`, a value that becomes null also counts as a change. Values are
+    compared in one text format (`normalize_tracked_columns`), `decimal_comma` for the numbers
+    of the sheet.
+    The current hashes replace the stored ones only once the log is built, so a failure
+    leaves the changes to be detected again. With `save_hashes=False` the caller stores them
+    (`save_row_hashes`) after writing the log.
+    """
+    # The sheet text is read with the raw dtypes, so both sides hash the same values
+    dtypes = df_raw.select(target_cols).schema
+    current_hashes = compute_row_hashes(df_raw, id_col, target_cols, dtypes=dtypes)
+    if df_modeled is not None:
+        previous_hashes = compute_row_hashes(df_modeled, id_col, target_cols, dtypes=dtypes, decimal_comma=decimal_comma)
+    else:
+        previous_hashes = load_row_hashes(log_root, id_col, target_cols)
+
+    cols_in_order = ['id_log', 'fecha_modificacion', 'tipo_cambio', 'fuente_log', f'{id_col}', f'{id_col}_modeled']
+    for t in target_cols:
+        cols_in_order += [t, f"{t}_modeled"]
+
+    if previous_hashes is None:
+        logger.warning(f"No previous hashes for '{log_root}', the current rows are stored as the baseline.")
+        if save_hashes:
+            save_row_hashes(current_hashes, log_root, id_col, target_cols)
+        return pl.DataFrame(schema={c: pl.String for c in cols_in_order})
+
+    changes = detect_changes(current_hashes, previous_hashes, id_col)
+
+    # Pull the tracked values only for the changed keys
+    def changed_rows(df, key: str, suffix: str=''):
+        rows = df.select(pl.col(id_col).cast(pl.String).alias(key), *[pl.col(c).cast(pl.String).alias(f"{c}{suffix}") for c in target_cols])
+        return rows.join(changes.select(key).drop_nulls(), on=key, how='semi')
+
+    logs_df = changes.join(changed_rows(df_raw, id_col), on=id_col, how='left')
+    if df_modeled is not None:
+        logs_df = logs_df.join(changed_rows(df_modeled, f'{id_col}_modeled', '_modeled'), on=f'{id_col}_modeled', how='left')
+    else:
+        logs_df = logs_df.with_columns([pl.lit(None, dtype=pl.String).alias(f"{c}_modeled") for c in target_cols])
+
+    logs_df = logs_df.with_columns(
+        # Nueva columna 'id_log' con un UUID único para cada fila
+        pl.Series('id_log', [str(uuid.uuid4()) for _ in range(logs_df.height)], dtype=pl.String),
+        pl.lit(datetime.now(), dtype=pl.Datetime).alias('fecha_modificacion'),
+        pl.lit(log_root, dtype=pl.String).alias('fuente_log'),
+    )
+    logger.debug(f"Change detection for '{log_root}': {logs_df['tipo_cambio'].value_counts().rows()}")
+    logs_df = logs_df.select(cols_in_order)
+
+    if save_hashes:
+        save_row_hashes(current_hashes, log_root, id_col, target_cols)
+    return logs_df
+
 # ----------------- Proceso de Actualización -----------------
 # 1. Identificar los `id_registro` de los registros que no han cambiado
 #    Unimos ambos DataFrames con un join interno (inner) y filtramos por los que NO han cambiado.
@@ -0,0 +1,234 @@
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from loguru import logger
+from dotenv import load_dotenv
+from src.gdrive_handler import list_all_shared_drives
+
+# Load environment variables
+load_dotenv()
+
+
+FILE_FIELDS = "id, name, mimeType, parents, createdTime, modifiedTime, md5Checksum, size, trashed"
+
+
+class DriveMetadataIndex:
+    """
+    Indice local (DuckDB) con el arbol de carpetas y archivos de una Unidad Compartida.
+
+    The index is bootstrapped once with a paginated listing of the whole drive and then
+    refreshed from the Drive changes feed using the page token stored next to it, so a
+    warm run only pays for one `changes().list` call. Paths are resolved from an
+    in-memory map, e.g. `lookup('Planeacion', '3 Datos/crudos/creditos')`.
+    """
+
+    index_path = os.getenv('DRIVE_INDEX_PATH', 'db/drive_index.duckdb')
+    max_staleness = int(os.getenv('DRIVE_INDEX_MAX_STALENESS', 60))
+
+    def __init__(self, index_path: str=None, max_staleness: int=None):
+        self.index_path = index_path or self.index_path
+        self.max_staleness = self.max_staleness if max_staleness is None else max_staleness
+        self.conn = None
+        self.lock = threading.RLock()
+        self.last_sync = {}
+        # In-memory views of the stored records
+        self.files = {}
+        self.children = {}
+        self.paths = {}
+        self.drives = {}
+        # Called as listener(drive_name, changed, bootstrap) after every sync that read Drive
+        self.listeners = []
+
+    def connect(self):
+        if self.conn is None:
+            import duckdb
+            if self.index_path != ':memory:':
+                os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+            self.conn = duckdb.connect(self.index_path)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS drive_state (
+                    drive_id VARCHAR PRIMARY KEY,
+                    drive_name VARCHAR,
+                    page_token VARCHAR,
+                    refreshed_at TIMESTAMP
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS drive_files (
+                    id VARCHAR PRIMARY KEY,
+                    drive_id VARCHAR,
+                    record VARCHAR
+                )
+            """)
+            self.load()
+        return self.conn
+
+    def load(self) -> None:
+        """Rebuild the in-memory maps (id, children, paths) from the stored records."""
+        self.drives = {
+            name: {'id': drive_id, 'page_token': token}
+            for drive_id, name, token in self.conn.execute(
+                "SELECT drive_id, drive_name, page_token FROM drive_state"
+            ).fetchall()
+        }
+        self.files = {
+            file_id: json.loads(record)
+            for file_id, record in self.conn.execute("SELECT id, record FROM drive_files").fetchall()
+        }
+        self.children = {}
+        for record in self.files.values():
+            for parent in record.get('parents', []):
+                self.children.setdefault(parent, []).append(record['id'])
+
+        self.paths = {}
+        for name, drive in self.drives.items():
+            pending = [(drive['id'], '')]
+            while pending:
+                parent_id, parent_path = pending.pop()
+                for child_id in self.children.get(parent_id, []):
+                    child = self.files[child_id]
+                    child_path = f"{parent_path}/{child['name']}" if parent_path else child['name']
+                    # Keep the first match when a folder holds two items with the same name
+                    self.paths.setdefault((name, child_path), child_id)
+                    pending.append((child_id, child_path))
+
+    def sync(self, service, drive_name: str, max_staleness: float=None) -> list:
+        """
+        Pone al dia el indice de la unidad `drive_name`. Returns the file records that
+        changed since the previous sync (every record on the first one). `max_staleness`
+        overrides the seconds a previous sync is trusted for (0 always reads the feed).
+        """
+        max_staleness = self.max_staleness if max_staleness is None else max_staleness
+        with self.lock:
+            self.connect()
+            last_sync = self.last_sync.get(drive_name)
+            if last_sync and (datetime.now(timezone.utc) - last_sync).total_seconds() < max_staleness:
+                logger.debug(f"Drive index for '{drive_name}' synced {last_sync.isoformat()}, skipping refresh.")
+                return []
+
+            bootstrap = drive_name not in self.drives
+            if bootstrap:
+                changed = self.bootstrap(service=service, drive_name=drive_name)
+            else:
+                changed = self.refresh(service=service, drive_name=drive_name)
+            self.last_sync[drive_name] = datetime.now(timezone.utc)
+
+            # Whoever syncs consumes the feed, so the changes are handed to every listener
+            for listener in self.listeners:
+                listener(drive_name, changed, bootstrap)
+            return changed
+
+    def bootstrap(self, service, drive_name: str) -> list:
+        drive_id = next((d['id'] for d in list_all_shared_drives(service=service) if d['name'] == drive_name), None)
+        if drive_id is None:
+            logger.error(f"Shared Drive '{drive_name}' not found, the metadata index can't be built.")
+            return []
+
+        # Take the token before listing so changes made during the walk are replayed later
+        page_token = service.changes().getStartPageToken(
+            driveId=drive_id,
+            supportsAllDrives=True
+        ).execute().get('startPageToken')
+
+        records = []
+        list_token = None
+        while True:
+            results = service.files().list(
+                corpora='drive',
+                driveId=drive_id,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                q="trashed = false",
+                pageSize=1000,
+                fields=f"nextPageToken, files({FILE_FIELDS})",
+                pageToken=list_token
+            ).execute()
+            records.extend(results.get('files', []))
+            list_token = results.get('nextPageToken', None)
+            if not list_token:
+                break
+
+        self.conn.execute("DELETE FROM drive_files WHERE drive_id = ?", [drive_id])
+        self.store(drive_id=drive_id, drive_name=drive_name, page_token=page_token, upserts=records, removals=[])
+        logger.debug(f"Drive index for '{drive_name}' built with {len(records)} records.")
+        return records
+
+    def refresh(self, service, drive_name: str) -> list:
+        drive_id = self.drives[drive_name]['id']
+        page_token = self.drives[drive_name]['page_token']
+        upserts, removals = [], []
+
+        try:
+            while True:
+                results = service.changes().list(
+                    pageToken=page_token,
+                    driveId=drive_id,
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True,
+                    pageSize=1000,
+                    fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))"
+                ).execute()
+
+                for change in results.get('changes', []):
+                    # Changes on the drive itself carry no fileId
+                    if not change.get('fileId'):
+                        continue
+                    record = change.get('file')
+                    if change.get('removed') or record is None or record.get('trashed'):
+                        removals.append(change['fileId'])
+                    else:
+                        upserts.append(record)
+
+                if 'newStartPageToken' in results:
+                    page_token = results['newStartPageToken']
+                    break
+                page_token = results.get('nextPageToken')
+
+        except Exception as e:
+            logger.warning(f"Drive changes feed for '{drive_name}' could not be read, rebuilding index. Error: {e}")
+            return self.bootstrap(service=service, drive_name=drive_name)
+
+        # Removed records keep their last known name and parents, their paths can't be resolved afterwards
+        removed = [
+            {'id': file_id, 'removed': True, **{k: self.files[file_id][k] for k in ('name', 'parents') if k in self.files.get(file_id, {})}}
+            for file_id in removals
+        ]
+        self.store(drive_id=drive_id, drive_name=drive_name, page_token=page_token, upserts=upserts, removals=removals)
+        logger.debug(f"Drive index for '{drive_name}' refreshed: {len(upserts)} updated, {len(removals)} removed.")
+        return upserts + removed
+
+    def store(self, drive_id: str, drive_name: str, page_token: str, upserts: list, removals: list) -> None:
+        if upserts:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO drive_files VALUES (?, ?, ?)",
+                [[r['id'], drive_id, json.dumps(r)] for r in upserts]
+            )
+        if removals:
+            self.conn.executemany("DELETE FROM drive_files WHERE id = ?", [[file_id] for file_id in removals])
+        self.conn.execute(
+            "INSERT OR REPLACE INTO drive_state VALUES (?, ?, ?, ?)",
+            [drive_id, drive_name, page_token, datetime.now(timezone.utc)]
+        )
+        self.load()
+
+    def lookup(self, drive_name: str, path: str) -> dict:
+        """Return the record stored at `path` (relative to the drive root) or None."""
+        file_id = self.paths.get((drive_name, path.strip('/')))
+        return self.files.get(file_id) if file_id else None
+
+    def list_children(self, folder_id: str) -> list:
+        return [self.files[file_id] for file_id in self.children.get(folder_id, [])]
+
+    def get_path(self, file_id: str) -> str:
+        """Path of a record relative to its drive root (reverse of `lookup`)."""
+        parts = []
+        record = self.files.get(file_id)
+        while record is not None:
+            parts.append(record['name'])
+            record = self.files.get((record.get('parents') or [None])[0])
+        return "/".join(reversed(parts))
+
+
+# Initialize a shared index for the pipeline
+drive_index = DriveMetadataIndex()
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import cProfile
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+import polars as pl
+from loguru import logger
+from dotenv import load_dotenv
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: peak RSS is not reported there
+    resource = None
+
+# Load environment variables
+load_dotenv()
+
+
+METRICS_DIR = os.getenv('METRICS_DIR', 'data/metrics')
+# Stage to run under cProfile (e.g. 'transform'), and whether to dump the Polars plans
+PROFILE_STAGE = os.getenv('PROFILE_STAGE', '')
+DUMP_QUERY_PLAN = os.getenv('DUMP_QUERY_PLAN', '0') == '1'
+
+# API calls of the stage running in the current thread (copied into helper threads explicitly),
+# counted by `src.google_services.CountingHttpRequest`
+api_call_counter = contextvars.ContextVar('api_call_counter', default=None)
+api_call_lock = threading.Lock()
+
+
+def peak_rss_bytes() -> int:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def frame_size(df) -> dict:
+    """Rows and in-memory bytes of a DataFrame (nothing for other objects)."""
+    if isinstance(df, pl.DataFrame):
+        return {'rows': df.height, 'bytes': df.estimated_size()}
+    return {'rows': None, 'bytes': None}
+
+
+class RunMetrics:
+    """
+    Metricas por etapa (get_metadata, extract, transform, load) y target de una corrida.
+
+    Every stage records wall and CPU time (thread and process), the growth of the process
+    peak RSS, rows/bytes in and out and the Google API calls it made. The run can be
+    exported as a JSON report and as a Prometheus textfile (node_exporter collector).
+    """
+
+    def __init__(self, run_id: str=None, metrics_dir: str=METRICS_DIR, profile_stage: str=PROFILE_STAGE, dump_query_plan: bool=DUMP_QUERY_PLAN):
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.metrics_dir = metrics_dir
+        self.profile_stage = profile_stage
+        self.dump_query_plan = dump_query_plan
+        self.started_at = datetime.now()
+        self.stages = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, target: str, layer: str=None, **values):
+        """Measure the block as one stage; extra values (rows_out, bytes_in, ...) can be set on the yielded dict."""
+        record = {'stage': name, 'target': target, 'layer': layer, 'rows_in': None, 'rows_out': None, 'bytes_in': None, 'bytes_out': None, **values}
+        api_calls = Counter()
+        token = api_call_counter.set(api_calls)
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+
+        rss_before = peak_rss_bytes()
+        wall, thread_cpu, process_cpu = time.perf_counter(), time.thread_time(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+            record['status'] = 'success'
+        except Exception:
+            record['status'] = 'failed'
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            record.update({
+                'wall_seconds': round(time.perf_counter() - wall, 4),
+                'cpu_seconds': round(time.thread_time() - thread_cpu, 4),
+                # Includes the polars thread pool and any other stage running at the same time
+                'process_cpu_seconds': round(time.process_time() - process_cpu, 4),
+                'peak_rss_delta_bytes': None if rss_before is None else peak_rss_bytes() - rss_before,
+                'api_calls': dict(api_calls),
+            })
+            api_call_counter.reset(token)
+            if profiler:
+                record['profile'] = self.dump_profile(profiler, name=name, target=target, layer=layer)
+            with self.lock:
+                self.stages.append(record)
+            logger.debug(f"Stage {name} of '{target}' ({layer}): {record['wall_seconds']}s wall, {record['cpu_seconds']}s cpu, {sum(api_calls.values())} API call(s)")
+
+    def artifact_path(self, name: str) -> str:
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        return os.path.join(self.metrics_dir, f"{self.run_id}_{name}")
+
+    def dump_profile(self, profiler: cProfile.Profile, name: str, target: str, layer: str=None) -> str:
+        """pstats file, readable with `python -m pstats`, snakeviz or converted for speedscope."""
+        path = self.artifact_path(f"{target}_{layer or 'all'}_{name}.pstats")
+        profiler.dump_stats(path)
+        logger.info(f"Profile of stage {name} for '{target}' written to {path}")
+        return path
+
+    def dump_plan(self, plan: str, target: str, layer: str=None) -> str:
+        path = self.artifact_path(f"{target}_{layer or 'all'}_plan.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(plan)
+        logger.info(f"Query plan for '{target}' written to {path}")
+        return path
+
+    def report(self) -> dict:
+        with self.lock:
+            stages = list(self.stages)
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'stages': stages,
+        }
+
+    def write_json(self, path: str=None) -> str:
+        path = path or self.artifact_path('report.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=1)
+        return path
+
+    def prometheus_text(self) -> str:
+        metrics = {
+            'wall_seconds': 'Wall time of the stage in seconds',
+            'cpu_seconds': 'CPU time of the thread running the stage in seconds',
+            'process_cpu_seconds': 'Process CPU time while the stage ran in seconds',
+            'peak_rss_delta_bytes': 'Growth of the process peak RSS during the stage',
+            'rows_in': 'Rows received by the stage',
+            'rows_out': 'Rows produced by the stage',
+            'bytes_in': 'Bytes received by the stage',
+            'bytes_out': 'Bytes produced by the stage',
+        }
+        # A stage may run several times for the same labels (one `backfill_file` per export,
+        # `get_metadata` per layer): the collector rejects repeated series, so the records are
+        # summed per label set (the peak RSS growth is the largest one)
+        totals, api_calls = {}, {}
+        for s in self.report()['stages']:
+            labels = f'target="{s["target"]}",layer="{s["layer"] or ""}",stage="{s["stage"]}"'
+            total = totals.setdefault(labels, {'count': 0})
+            total['count'] += 1
+            for key in metrics:
+                if s.get(key) is not None:
+                    total[key] = max(total.get(key, s[key]), s[key]) if key == 'peak_rss_delta_bytes' else round(total.get(key, 0) + s[key], 4)
+            for method, count in s['api_calls'].items():
+                api_calls[f'{labels},method="{method}"'] = api_calls.get(f'{labels},method="{method}"', 0) + count
+
+        lines = ["# HELP fbs_etl_stage_count Times the stage ran", "# TYPE fbs_etl_stage_count gauge"]
+        lines += [f"fbs_etl_stage_count{{{labels}}} {total['count']}" for labels, total in totals.items()]
+        for key, help_text in metrics.items():
+            lines += [f"# HELP fbs_etl_stage_{key} {help_text}", f"# TYPE fbs_etl_stage_{key} gauge"]
+            lines += [f"fbs_etl_stage_{key}{{{labels}}} {total[key]}" for labels, total in totals.items() if key in total]
+
+        lines += ["# HELP fbs_etl_stage_api_calls Google API requests made by the stage", "# TYPE fbs_etl_stage_api_calls gauge"]
+        lines += [f"fbs_etl_stage_api_calls{{{labels}}} {count}" for labels, count in api_calls.items()]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str=None) -> str:
+        path = path or os.path.join(self.metrics_dir, 'fbs_etl.prom')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # The textfile collector may read at any time: write aside and rename
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        return path
+
+    def export(self) -> dict:
+        paths = {'json': self.write_json(), 'prometheus': self.write_prometheus()}
+        logger.info(f"Run metrics written to {paths}")
+        return paths
@@ -0,0 +1,230 @@
+import os
+import json
+import threading
+import polars as pl
+from loguru import logger
+from dotenv import load_dotenv
+from src.dictionary_cache import dictionary_cache
+from src.date_parser import date_parser
+
+# Load environment variables
+load_dotenv()
+
+
+# Tipo (data dictionary) -> Polars dtype name
+DICTIONARY_TYPES = {
+    "Integer": "Int64",
+    "String": "String",
+    "Timestamp": "Datetime",
+    "Float": "Float64",
+    "Bool": "String",
+}
+DEFAULT_DATE_FORMAT = "%d/%m/%Y"
+DICTIONARY_PATH = os.getenv('DICTIONARY_PATH', 'data_dictionary/Diccionario_FBS.xlsx')
+# Per-source read details the dictionary doesn't hold (see `csv_read_options`)
+SOURCE_READ_HINTS = {
+    'creditos': {'decimal_comma': True, 'text_columns': ['TasaInterés']},
+    'radicados': {'date_formats': {'Fecha Radicacion': "%d/%m/%Y %H:%M"}},
+}
+# Bump when the layout of a compiled plan changes, so older cached plans are not reused
+PLAN_VERSION = 2
+# Share of the values of a numeric column that may fail to cast before a typed read is rejected
+CAST_MAX_FAILURE_RATE = float(os.getenv('CAST_MAX_FAILURE_RATE', 0.01))
+# Suffix of the cast columns while they sit next to the raw text (failure counts)
+CAST_SUFFIX = "__cast"
+
+
+def compile_dictionary_sheet(dictionary: pl.DataFrame) -> dict:
+    """
+    Convierte una hoja del diccionario en un plan de casteo:
+    {column: {'dtype', 'date_format', 'pk', 'nullable', 'calculated'}}.
+    An optional 'Formato' column in the sheet overrides the default date format.
+    """
+    has_format = "Formato" in dictionary.columns
+    columns = {}
+    for row in dictionary.iter_rows(named=True):
+        tipo = row["Tipo"]
+        if tipo not in DICTIONARY_TYPES:
+            logger.warning(f"Unknown type '{tipo}' for column '{row['Nombre_columna']}', it will be left as is.")
+            continue
+        is_pk = row.get("Jerarquia") == 'PK'
+        columns[row["Nombre_columna"]] = {
+            'dtype': DICTIONARY_TYPES[tipo],
+            'date_format': ((has_format and row["Formato"]) or DEFAULT_DATE_FORMAT) if tipo == "Timestamp" else None,
+            'pk': is_pk,
+            'nullable': not is_pk,
+            'calculated': bool(row.get("Calculado")),
+        }
+    return columns
+
+
+def cast_expressions(columns: dict, schema: pl.Schema) -> list:
+    """Cast expressions of a plan for the columns present in `schema`, decided from dtypes only."""
+    expressions = []
+    for col, spec in columns.items():
+        if col not in schema:
+            logger.warning(f"⚠️ Aviso: La columna '{col}' no se encontró y se omitirá del proceso de cast.")
+            continue
+        dtype = getattr(pl, spec['dtype'])
+        if spec['date_format'] and schema[col] == pl.String:
+            expressions.append(pl.col(col).str.strptime(dtype, format=spec['date_format']))
+        else:
+            expressions.append(pl.col(col).cast(dtype))
+    return expressions
+
+
+def csv_read_options(columns: dict, decimal_comma: bool=False, text_columns: list=(), date_formats: dict=None) -> dict:
+    """
+    Opciones de lectura de un CSV crudo a partir de su plan: the dtype of every numeric column,
+    `decimal_comma`, and the date format of every Timestamp column. The numbers go to the
+    reader (strict, see `gdrive_handler.build_csv_options`); a file it rejects is read as text
+    and cast after (`cast_numeric_columns`), so the values that fail are counted instead of
+    silently read as nulls. Dates are parsed after the read (`date_parser`).
+    Columns listed in `text_columns` are kept as text, e.g. values carrying a unit suffix.
+    """
+    numeric_types, formats = {}, {}
+    for col, spec in columns.items():
+        if spec.get('calculated'):
+            continue
+        if spec['date_format']:
+            formats[col] = spec['date_format']
+        elif col not in text_columns and spec['dtype'] != 'String':
+            numeric_types[col] = spec['dtype']
+    formats.update(date_formats or {})
+    return {'numeric_types': numeric_types, 'decimal_comma': decimal_comma, 'date_formats': formats}
+
+
+def numeric_text(col: str) -> pl.Expr:
+    """Text of a numeric column with blank values as nulls."""
+    text = pl.col(col).str.strip_chars()
+    return pl.when(text.str.len_bytes() > 0).then(text)
+
+
+def numeric_expression(col: str, dtype: pl.DataType, decimal_comma: bool=False) -> pl.Expr:
+    text = numeric_text(col)
+    if decimal_comma and dtype.is_float():
+        text = text.str.replace(',', '.', literal=True)
+    return text.cast(dtype, strict=False)
+
+
+def cast_failure_counts(text, parsed, columns: list) -> pl.LazyFrame:
+    """
+    One-row LazyFrame with the non-blank values of each column of the text frame
+    ('<col>:total') and how many of them the parsed frame left null ('<col>:failed').
+    Both frames come from the same read, row for row.
+    """
+    both = pl.concat([
+        text.lazy().select(columns),
+        parsed.lazy().select([pl.col(col).alias(f"{col}{CAST_SUFFIX}") for col in columns]),
+    ], how='horizontal')
+    return both.select(
+        [numeric_text(col).is_not_null().sum().alias(f"{col}:total") for col in columns]
+        + [(numeric_text(col).is_not_null() & pl.col(f"{col}{CAST_SUFFIX}").is_null()).sum().alias(f"{col}:failed") for col in columns]
+    )
+
+
+def check_cast_failures(counts: dict, columns: dict, source: str=None, max_failure_rate: float=CAST_MAX_FAILURE_RATE, examples: dict=None) -> None:
+    """
+    Log the columns ({column: dtype}) with values that failed to cast (see `cast_failure_counts`).
+    A column with more than `max_failure_rate` of them raises a ValueError (never with None).
+    """
+    rejected = []
+    for col, dtype in columns.items():
+        total, n_failed = counts[f"{col}:total"], counts[f"{col}:failed"]
+        if not n_failed:
+            continue
+        example = f", e.g. {examples[col]}" if examples and col in examples else ""
+        logger.warning(f"{n_failed} of {total} value(s) of '{col}' ({source}) could not be read as {dtype}{example}")
+        if max_failure_rate is not None and n_failed > max_failure_rate * total:
+            rejected.append(col)
+    if rejected:
+        raise ValueError(f"Too many malformed values in {rejected} ({source}), more than {max_failure_rate:.1%} of the column.")
+
+
+def cast_numeric_columns(df, numeric_types: dict, decimal_comma: bool=False, source: str=None, max_failure_rate: float=CAST_MAX_FAILURE_RATE):
+    """
+    Cast the text columns of `numeric_types` ({column: dtype name}) of a DataFrame or LazyFrame.
+    On a DataFrame the values that fail to cast are counted and logged; a column with more
+    than `max_failure_rate` of them raises a ValueError. LazyFrames are cast without counts
+    (count them with `cast_failure_counts` when collecting).
+    """
+    schema = df.collect_schema()
+    columns = {col: getattr(pl, name) for col, name in numeric_types.items() if schema.get(col) == pl.String}
+    if not columns:
+        return df
+    cast = df.with_columns([numeric_expression(col, dtype, decimal_comma).alias(col) for col, dtype in columns.items()])
+    if isinstance(df, pl.LazyFrame):
+        return cast
+
+    counts = cast_failure_counts(df, cast, list(columns)).collect().row(0, named=True)
+    examples = {
+        col: df.filter(numeric_text(col).is_not_null() & pl.lit(cast[col]).is_null())[col].head(3).to_list()
+        for col in columns if counts[f"{col}:failed"]
+    }
+    check_cast_failures(counts, columns, source=source, max_failure_rate=max_failure_rate, examples=examples)
+    return cast
+
+
+def apply_cast_plan(columns: dict, df, source: str=None):
+    """
+    Apply the casts of the plan (DataFrame or LazyFrame): text dates through `date_parser`
+    (formats detected per `source` and column), everything else in a single `with_columns`.
+    """
+    schema = df.collect_schema()
+    dates = {col: spec['date_format'] for col, spec in columns.items() if spec['date_format'] and schema.get(col) == pl.String}
+    df = date_parser.parse(df, dates, source=source, dtypes={col: getattr(pl, columns[col]['dtype']) for col in dates})
+    return df.with_columns(cast_expressions({col: spec for col, spec in columns.items() if col not in dates}, schema))
+
+
+class SchemaCompiler:
+    """
+    Planes de casteo compilados desde el diccionario de datos (`Diccionario_FBS.xlsx`).
+
+    Plans are keyed by the sha256 of the workbook and stored as JSON under `cache_dir`;
+    the sheets themselves come from `dictionary_cache`.
+    """
+
+    cache_dir = os.getenv('SCHEMA_CACHE_DIR', 'cache/schema')
+
+    def __init__(self, cache_dir: str=None):
+        self.cache_dir = cache_dir or self.cache_dir
+        self.plans = {}
+        self.lock = threading.Lock()
+
+    def plan_path(self, workbook_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"cast_plan_v{PLAN_VERSION}_{workbook_hash[:16]}.json")
+
+    def compile(self, dictionary_path: str) -> dict:
+        """Cast plans of every sheet of the workbook: {sheet: {column: spec}}."""
+        workbook_hash = dictionary_cache.workbook_hash(dictionary_path)
+        with self.lock:
+            if workbook_hash in self.plans:
+                return self.plans[workbook_hash]
+
+            plan_path = self.plan_path(workbook_hash)
+            if os.path.exists(plan_path):
+                with open(plan_path, 'r', encoding='utf-8') as f:
+                    plans = json.load(f)['sheets']
+                logger.debug(f"Cast plan for '{dictionary_path}' loaded from {plan_path}")
+            else:
+                sheets = dictionary_cache.load(dictionary_path)
+                plans = {name: compile_dictionary_sheet(sheet) for name, sheet in sheets.items()}
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{plan_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'source': dictionary_path, 'source_hash': workbook_hash, 'sheets': plans}, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, plan_path)
+                logger.debug(f"Cast plan for '{dictionary_path}' compiled into {plan_path}")
+
+            self.plans[workbook_hash] = plans
+            return plans
+
+    def get_plan(self, dictionary_path: str, target: str) -> dict:
+        return self.compile(dictionary_path)[target]
+
+    def apply(self, df, dictionary_path: str, target: str):
+        return apply_cast_plan(self.get_plan(dictionary_path, target), df, source=target)
+
+
+# Initialize a shared compiler for the pipeline
+schema_compiler = SchemaCompiler()
@@ -0,0 +1,76 @@
+import json
+import polars as pl
+
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def encode_cells(dataframe: pl.DataFrame, null_value: str='null') -> pl.DataFrame:
+    """
+    Convierte cada celda en su literal JSON, columna por columna (no Python objects per row).
+
+    Dates become "YYYY-MM-DD" strings, datetimes "YYYY-MM-DD HH:MM:SS", NaN/inf and nulls
+    become `null_value` ('null', or '""' to clear the cell when it is sent to Sheets).
+    """
+    # Text columns without quotes, backslashes or control characters need no escaping
+    # (Categorical/Enum columns are checked on their distinct values only)
+    plain_text = [
+        col for col, dtype in dataframe.schema.items()
+        if (dtype == pl.String and not dataframe[col].str.contains(r'[\x00-\x1f"\\]').any())
+        or (isinstance(dtype, (pl.Categorical, pl.Enum)) and not dataframe[col].unique().cast(pl.String).str.contains(r'[\x00-\x1f"\\]').any())
+    ]
+
+    exprs = []
+    for col, dtype in dataframe.schema.items():
+        expr = pl.col(col)
+        if isinstance(dtype, (pl.Categorical, pl.Enum)):
+            expr = expr.cast(pl.String)
+        if dtype.is_integer():
+            literal = expr.cast(pl.String).fill_null('null')
+        elif dtype.is_float():
+            literal = pl.when(expr.is_finite()).then(expr.cast(pl.String)).otherwise(pl.lit('null'))
+        elif col in plain_text:
+            literal = pl.concat_str(pl.lit('"'), expr, pl.lit('"')).fill_null('null')
+        else:
+            if isinstance(dtype, pl.Datetime):
+                expr = expr.dt.strftime(DATETIME_FORMAT)
+            # Encode {"v": value} and keep only the value part
+            literal = pl.struct(expr.alias('v')).struct.json_encode().str.slice(5).str.strip_suffix("}")
+
+        if null_value != 'null':
+            literal = pl.when(literal == 'null').then(pl.lit(null_value)).otherwise(literal)
+        exprs.append(literal.alias(col))
+    return dataframe.select(exprs)
+
+
+def encode_rows(dataframe: pl.DataFrame, null_value: str='null') -> pl.Series:
+    """JSON array text of every row, e.g. '["18849",20648000.0,null,"2023-01-11"]'."""
+    if dataframe.width == 0:
+        return pl.Series('row', ["[]"] * dataframe.height, dtype=pl.String)
+    cells = encode_cells(dataframe, null_value=null_value)
+    return cells.select(
+        pl.concat_str(pl.lit('['), pl.concat_str(pl.all(), separator=','), pl.lit(']')).alias('row')
+    ).to_series()
+
+
+def encode_values_body(dataframe: pl.DataFrame=None, include_header: bool=True, rows: pl.Series=None, columns: list=None, null_value: str='null') -> bytes:
+    """
+    Cuerpo JSON {"values": [...]} listo para enviar a la API de Sheets.
+    Pre-encoded `rows` (from `encode_rows`) can be given to avoid encoding twice.
+    """
+    if rows is None:
+        rows = encode_rows(dataframe, null_value=null_value)
+    if include_header:
+        header = json.dumps(columns if columns is not None else dataframe.columns, ensure_ascii=False)
+        rows = pl.concat([pl.Series([header], dtype=pl.String), rows])
+    # Join and convert to bytes inside polars, without building intermediate Python strings
+    body = pl.select(pl.concat_str(pl.lit('{"values":['), pl.lit(rows).str.join(','), pl.lit(']}')).cast(pl.Binary))
+    return body.item()
+
+
+def execute_with_body(request, body: bytes, http=None) -> dict:
+    """Execute a googleapiclient request replacing its JSON body with pre-encoded bytes."""
+    request.body = body
+    request.headers['content-length'] = str(len(body))
+    request.headers['content-type'] = 'application/json'
+    return request.execute(http=http)
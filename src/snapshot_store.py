@@ -0,0 +1,117 @@
+import os
+import uuid
+from datetime import date, datetime
+import polars as pl
+from loguru import logger
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+# Partition columns of the store, from the directory names
+HIVE_SCHEMA = {'target': pl.String, 'layer': pl.String, 'load_date': pl.Date}
+
+
+class SnapshotStore:
+    """
+    Historico local de las salidas de cada corrida (capas raw y modeled) en Parquet.
+
+    Files are laid out Hive-style as
+    `<root>/target=<target>/layer=<layer>/load_date=<YYYY-MM-DD>/part-<time>-<id>.parquet`,
+    zstd-compressed with row-group statistics. Readers prune partitions from the directory
+    names and push filters down to the row groups of the files that are left.
+    """
+
+    root = os.getenv('SNAPSHOT_DIR', 'data/snapshots')
+    row_group_size = 100_000
+
+    def __init__(self, root: str=None):
+        self.root = root or self.root
+
+    def partition_path(self, target: str, layer: str, load_date: date) -> str:
+        return os.path.join(self.root, f"target={target}", f"layer={layer}", f"load_date={load_date.isoformat()}")
+
+    def write(self, df: pl.DataFrame, target: str, layer: str, load_date: date=None) -> str:
+        """Store one run's output and return the written file path."""
+        load_date = load_date or date.today()
+        partition = self.partition_path(target, layer, load_date)
+        os.makedirs(partition, exist_ok=True)
+
+        # Several runs on the same day sort by time inside the partition
+        file_path = os.path.join(partition, f"part-{datetime.now().strftime('%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet")
+        # A failed write must not leave a partial file for the scans
+        tmp_path = f"{file_path}.tmp"
+        df.write_parquet(tmp_path, compression='zstd', statistics=True, row_group_size=self.row_group_size)
+        os.replace(tmp_path, file_path)
+        logger.debug(f"Snapshot of {target}/{layer} {df.shape} written to {file_path}")
+        return file_path
+
+    def list_partitions(self, target: str, layer: str, start_date: date=None, end_date: date=None) -> list:
+        """Load dates stored for a target/layer within [start_date, end_date], oldest first."""
+        layer_path = os.path.join(self.root, f"target={target}", f"layer={layer}")
+        if not os.path.isdir(layer_path):
+            return []
+
+        load_dates = []
+        for name in os.listdir(layer_path):
+            if not name.startswith('load_date='):
+                continue
+            load_date = date.fromisoformat(name.split('=', 1)[1])
+            if (start_date is None or load_date >= start_date) and (end_date is None or load_date <= end_date):
+                load_dates.append(load_date)
+        return sorted(load_dates)
+
+    def list_files(self, target: str, layer: str, load_date: date) -> list:
+        partition = self.partition_path(target, layer, load_date)
+        return sorted(os.path.join(partition, f) for f in os.listdir(partition) if f.endswith('.parquet'))
+
+    def scan(self, target: str, layer: str, start_date: date=None, end_date: date=None, filters: pl.Expr=None, latest_per_day: bool=True) -> pl.LazyFrame:
+        """
+        LazyFrame over the snapshots of a target/layer between two load dates: a Hive scan of the
+        store, with the partition values (target, layer, load_date) as columns read from the
+        directory names. The filters on them are pushed down and prune the files before any is
+        opened; `filters` go down to the row groups of the files that are left. With
+        `latest_per_day` only the last file of each day is scanned.
+        """
+        load_dates = self.list_partitions(target, layer, start_date, end_date)
+        files = [f for d in load_dates for f in (self.list_files(target, layer, d)[-1:] if latest_per_day else self.list_files(target, layer, d))]
+        if not files:
+            logger.warning(f"No snapshots found for {target}/{layer} between {start_date} and {end_date}.")
+            return pl.LazyFrame()
+
+        # Columns may change between exports: the scan takes the union of the file schemas, and
+        # files missing a column get nulls (the widest numeric type is kept)
+        schema = pl.concat([pl.DataFrame(schema=pl.read_parquet_schema(f)) for f in files], how='diagonal_relaxed').schema
+        lf = pl.scan_parquet(
+            os.path.join(self.root, '**', '*.parquet') if not latest_per_day else files,
+            hive_partitioning=True,
+            hive_schema=HIVE_SCHEMA,
+            schema=schema,
+            missing_columns='insert',
+            extra_columns='ignore',
+            cast_options=pl.ScanCastOptions(integer_cast='upcast', float_cast='upcast'),
+        )
+        partitions = (pl.col('target') == target) & (pl.col('layer') == layer)
+        if start_date is not None:
+            partitions &= pl.col('load_date') >= start_date
+        if end_date is not None:
+            partitions &= pl.col('load_date') <= end_date
+        lf = lf.filter(partitions)
+        return lf.filter(filters) if filters is not None else lf
+
+    def as_of(self, target: str, as_of_date: date, layer: str='modeled', filters: pl.Expr=None) -> pl.DataFrame:
+        """State of a target as it was loaded on (or last before) `as_of_date`."""
+        load_dates = self.list_partitions(target, layer, end_date=as_of_date)
+        if not load_dates:
+            logger.warning(f"No snapshot of {target}/{layer} on or before {as_of_date}.")
+            return pl.DataFrame()
+
+        lf = pl.scan_parquet(self.list_files(target, layer, load_dates[-1])[-1])
+        if filters is not None:
+            lf = lf.filter(filters)
+        return lf.collect()
+
+
+# Initialize a shared snapshot store for the pipeline
+snapshot_store = SnapshotStore()
@@ -1,8 +1,9 @@
+import os
+import time
 import polars as pl
 from datetime import date
 from loguru import logger
-import duckdb
-from collections import Counter
+from src.date_parser import date_parser
 
 
 class FBSTransformer:
@@ -10,6 +11,10 @@ class FBSTransformer:
     input_folder = "C:/Users/cgarcia/Documents/datos/crudos"
     output_folder = "C:/Users/cgarcia/Documents/datos/modelados"
 
+    # Every transformation accepts a DataFrame (eager passes) or a LazyFrame (one optimised plan)
+    lazy = os.getenv('LAZY_TRANSFORM', '1') == '1'
+    compare_modes = os.getenv('COMPARE_TRANSFORM', '0') == '1'
+
     working_group_dict = {
         'TL': 'Tramite en línea',
         'DDB': 'Direccion de desarrollo bienestar', 
@@ -32,21 +37,74 @@ class FBSTransformer:
         'GAUEGI': 'Grupo de atencion al usuario', 
         'OAD': 'Oficina de asuntos disciplinarios'
     }
+    # Lookup table of working groups: names as an Enum, so each row only stores a small index
+    working_group_names = pl.Enum(list(dict.fromkeys(working_group_dict.values())))
+    working_groups = pl.DataFrame({
+        'cod_grupo_destino': list(working_group_dict.keys()),
+        'grupo_destino': pl.Series(list(working_group_dict.values()), dtype=working_group_names),
+    })
+    # Group of the "Destino" values without one (a plain name)
+    default_working_group = 'GAUEGI'
+
+    @classmethod
+    def run(self, method_name: str, df, collect: bool=True):
+        """
+        Apply a transformation in the configured mode to a DataFrame or LazyFrame. In lazy mode
+        `collect=False` returns the plan as a LazyFrame, for the caller to collect it once.
+        """
+        method_to_call = getattr(self, method_name)
+
+        if self.compare_modes:
+            self.compare(method_name=method_name, df=df.lazy().collect())
+
+        if self.lazy:
+            lf = method_to_call(df.lazy())
+            return lf.collect() if collect else lf
+        return method_to_call(df.lazy().collect() if isinstance(df, pl.LazyFrame) else df)
+
+    @classmethod
+    def explain(self, method_name: str, df: pl.DataFrame) -> str:
+        """Optimised Polars plan of a transformation, without running it."""
+        return getattr(self, method_name)(df.lazy()).explain(optimized=True)
+
+    @classmethod
+    def compare(self, method_name: str, df: pl.DataFrame) -> dict:
+        """Run a transformation eagerly and lazily, logging both timings and whether the outputs match."""
+        method_to_call = getattr(self, method_name)
+
+        start = time.perf_counter()
+        eager_df = method_to_call(df)
+        eager_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lazy_df = method_to_call(df.lazy()).collect()
+        lazy_seconds = time.perf_counter() - start
+
+        result = {
+            'method': method_name,
+            'eager_seconds': round(eager_seconds, 4),
+            'lazy_seconds': round(lazy_seconds, 4),
+            'equal_output': eager_df.equals(lazy_df),
+        }
+        logger.info(f"Transform comparison: {result}")
+        return result
 
     @classmethod
     def raw_creditos_(self, df: pl.DataFrame) -> None:    
         # Step 1: Delete columns where the word "duplicated" appears in the column name
         logger.debug("Step 0 -- Removing duplicated columns")
-        df = df.select([col for col in df.columns if "duplicated" not in col])
+        df = df.select([col for col in df.collect_schema().names() if "duplicated" not in col])
+        # Typed reads (see `csv_read_options`) deliver numbers and dates already parsed
+        schema = df.collect_schema()
 
         # Step 2: Convert interests into numeric
         logger.debug("Step 1 -- Converting interest rates to numeric format")
+        tasa = pl.col('TasaInterés')
+        if schema['TasaInterés'] == pl.String:
+            tasa = tasa.str.replace(r'\s*%', '').str.strip_chars()     # Elimina el '%' y cualquier espacio antes de él
         df = df.with_columns(
             (
-                pl.col('TasaInterés')
-                .str.replace(r'\s*%', '')           # Elimina el '%' y cualquier espacio antes de él
-                .str.strip_chars()
-                .cast(pl.Float64, strict=False)     # Convierte el string a float
+                tasa.cast(pl.Float64, strict=False) # Convierte el string a float
                 /(100*100000)                       # Divide por 100 para obtener el decimal
             ).alias('TasaInterés')                  # Renombra la columna resultante al nombre original
         )
@@ -54,14 +112,8 @@ class FBSTransformer:
         # Step 3: Convert dates to correct date format for operations in polars
         logger.debug("Step 2 -- Converting date columns to datetime format for polars")
         date_columns = ['FechaIngreso', 'FechaSolicitud', 'Fecha Acta Aprobación', 'FechaGiro', 'FechaInicio', 'FechaLegalización', 'VencimientoCuota']
-        df = df.with_columns(
-            pl.col(date_columns)
-            .str.strip_chars()                      # 1. Remove spaces
-            .str.split(" ").list.get(0)             # 2. Kill any time part (keep only "DD/MM/YYYY")
-            .str.replace_all("-", "/")              # 3. Turn dashes into slashes
-            .str.replace_all(r"\.", "/")            # 4. Turn dots into slashes
-            .str.to_date("%d/%m/%Y", strict=False)  # 5. Try the standard conversion
-        )
+        # Formats ('/', '-' or '.' separators, with or without time) detected once per column
+        df = date_parser.parse(df, {col: "%d/%m/%Y" for col in date_columns}, source='creditos')
 
         # Step 4: Create 'tiempos' columns
         logger.debug("Step 3 -- Creating time difference columns")
@@ -95,62 +147,37 @@ class FBSTransformer:
         logger.debug("Step 6 -- Standardizing monetary value formats")
         cols = ["Monto", "Monto Aprobado", "Saldo"] #, "Monto Solicitado"
         df = df.with_columns(
-            pl.col(cols).str.replace_all(",", ".").cast(pl.Float64)
+            [pl.col(col).str.replace_all(",", ".").cast(pl.Float64) for col in cols if schema[col] == pl.String]
         )
 
-        logger.debug("Step 7 -- Changing date format to avoid issues when exporting to other file types.")
-        date_columns += ['fecha_actual']
-        # df = df.with_columns(
-        #     pl.col(date_columns)
-        #     .dt.strftime("%d/%m/%Y")
-        # )
-
-        df = df.with_columns(
-            # --- HANDLE DATES ---
-            # Convert Date/Datetime objects to ISO strings so JSON doesn't crash
-            pl.col(pl.Date).dt.strftime("%Y-%m-%d"),
-            pl.col(pl.Datetime).dt.strftime("%Y-%m-%d %H:%M:%S"),
-            
-            # --- HANDLE NULLS ---
-            # Google API prefers None (which becomes empty cell) or explicit empty string "".
-            # Polars .rows() handles Null -> None automatically, so we are usually good here.
-            # But if you have NaNs (Not a Number) in float columns, fill them:
-            pl.col(pl.Float64).fill_nan(None) 
-        )
-        
         return df
 
     @classmethod
     def raw_radicados_(self, df: pl.DataFrame) -> None:
         
-        output_df = df.with_columns(
-            pl.col('Fecha Radicacion').str.strptime(pl.Datetime, format="%d/%m/%Y %H:%M", strict=False).alias('Fecha Radicacion')
-        )
-        
-        # Separate values in column "Destino". IN the split, the first value is the destination and the second value is the type of destination
+        output_df = date_parser.parse(df, {'Fecha Radicacion': "%d/%m/%Y %H:%M"}, source='radicados')
+
+        # Split "Destino" once into cargo, working group code and official. Without a '-' (a plain
+        # name) there is no group code and the row goes to the default working group
         output_df = output_df.with_columns(
-            pl.when(pl.col('Destino').str.contains("-"))
-              .then(pl.col('Destino')
-                .str.split_exact("-", 2)
-                .struct.rename_fields(["cargo_destino", "cod_grupo_destino", "funcionario_destino"])
-                .alias('array_destino')
-            )
-            .otherwise(
-            # Si NO contiene guion (es un nombre completo)
-            pl.struct([
-                pl.lit(None, dtype=pl.String).alias("cargo_destino"),
-                pl.lit("GAUEGI", dtype=pl.String).alias("cod_grupo_destino"),
-                pl.lit(None, dtype=pl.String).alias("funcionario_destino"),
-            ])
-            )
+            pl.col('Destino')
+            .str.split_exact("-", 2)
+            .struct.rename_fields(["cargo_destino", "cod_grupo_destino", "funcionario_destino"])
+            .alias('array_destino')
         ).unnest('array_destino')
 
-        # Map a dictionary to the column "cod_grupo_destino" to create a new column "grupo_destino".
+        cod_grupo = pl.col('cod_grupo_destino').fill_null(self.default_working_group)
         output_df = output_df.with_columns(
-                pl.col("cod_grupo_destino")
-                .replace_strict(self.working_group_dict, default=None)
-                .alias("grupo_destino")
-            )
+            pl.when(pl.col('cod_grupo_destino').is_not_null()).then(pl.col('cargo_destino')).alias('cargo_destino'),
+            cod_grupo.cast(pl.Categorical).alias('cod_grupo_destino'),
+            # Codes outside the lookup table are kept; their group name is null
+            cod_grupo.replace_strict(
+                self.working_groups['cod_grupo_destino'],
+                self.working_groups['grupo_destino'],
+                default=None,
+                return_dtype=self.working_group_names
+            ).alias('grupo_destino'),
+        )
         return output_df
 
     @staticmethod
@@ -1,4 +1,5 @@
 import random
+import hashlib
 from datetime import datetime
 
 
@@ -31,3 +32,24 @@ def column_row_shape_match(headers: list, data: list):
 
 def adjust_date_format(date_string, format_string):
     return datetime.strptime(date_string, format_string)
+
+
+def column_index_to_letter(index: int) -> str:
+    """ Converts a 0-based column index into its A1 notation letter (0 -> 'A', 27 -> 'AB')
+    """
+    letters = ""
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def file_hash(path: str, chunk_size: int=1024 * 1024) -> str:
+    """ sha256 of a file's content, read in chunks (used to key caches built from local files)
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from loguru import logger
+from dotenv import load_dotenv
+from src.metadata_index import drive_index
+from src.metrics import METRICS_DIR, RunMetrics
+
+# Load environment variables
+load_dotenv()
+
+
+# Seconds between two reads of the Drive changes feed
+WATCH_INTERVAL = float(os.getenv('WATCH_INTERVAL', 60))
+# A target runs once no file of it changed for this many seconds...
+WATCH_DEBOUNCE = float(os.getenv('WATCH_DEBOUNCE', 120))
+# ...or once its first pending change is this old, even if uploads keep coming
+WATCH_MAX_WAIT = float(os.getenv('WATCH_MAX_WAIT', 900))
+# A failed target stays queued and is retried after this many seconds, doubled on every failure up to the max
+WATCH_RETRY_BACKOFF = float(os.getenv('WATCH_RETRY_BACKOFF', 60))
+WATCH_RETRY_MAX = float(os.getenv('WATCH_RETRY_MAX', 3600))
+
+# Folder layout under the drive root, as used by `read_metadata`
+DATA_ROOT = '3 Datos'
+LAYER_FOLDERS = {'crudos': 'raw', 'modelados': 'modeled'}
+
+
+def target_for_path(path: str) -> tuple:
+    """(target, layer) of a drive path: '3 Datos/crudos/creditos/x.csv' -> ('creditos', 'raw'), else (None, None)."""
+    parts = path.split('/')
+    if len(parts) < 3 or parts[0] != DATA_ROOT or parts[1] not in LAYER_FOLDERS:
+        return None, None
+    layer = LAYER_FOLDERS[parts[1]]
+    # Raw files sit in a folder per target, modeled targets are the sheets themselves
+    if layer == 'raw' and len(parts) < 4:
+        return None, None
+    return parts[2], layer
+
+
+class DriveWatcher:
+    """
+    Daemon que corre el ETL solo para los targets con cambios en Drive.
+
+    Each poll reads the Drive changes feed through the metadata index and maps the changed
+    files to targets and layers from their paths. The watcher listens to the index, so the
+    changes read by the pipeline's own syncs (`get_metadata`) are queued as well. Only
+    changes in `watch_layers` (raw by default: the modeled sheets are written by the
+    pipeline itself) queue their target.
+    A queued target runs once it had no new change for `debounce` seconds, or after
+    `max_wait` seconds since its first change, so a burst of uploads gives a single run.
+    Targets that fail stay queued and are retried with exponential backoff (`retry_backoff`
+    doubled on every failure, up to `retry_max`); they leave the queue once a run succeeds.
+    The queue depth and the last run are written as JSON and Prometheus text on every poll.
+    """
+
+    interval = WATCH_INTERVAL
+    debounce = WATCH_DEBOUNCE
+    max_wait = WATCH_MAX_WAIT
+    retry_backoff = WATCH_RETRY_BACKOFF
+    retry_max = WATCH_RETRY_MAX
+
+    def __init__(self, runner, service, drive_name: str='Planeacion', targets: list=None, watch_layers: list=('raw',),
+                 metadata_index=drive_index, interval: float=None, debounce: float=None, max_wait: float=None, metrics_dir: str=METRICS_DIR,
+                 retry_backoff: float=None, retry_max: float=None):
+        self.runner = runner
+        self.service = service
+        self.drive_name = drive_name
+        self.targets = set(targets) if targets else None
+        self.watch_layers = set(watch_layers)
+        self.metadata_index = metadata_index
+        self.interval = self.interval if interval is None else interval
+        self.debounce = self.debounce if debounce is None else debounce
+        self.max_wait = self.max_wait if max_wait is None else max_wait
+        self.retry_backoff = self.retry_backoff if retry_backoff is None else retry_backoff
+        self.retry_max = self.retry_max if retry_max is None else retry_max
+        self.metrics_dir = metrics_dir
+        self.stop_event = threading.Event()
+        # {target: {'first': monotonic, 'last': monotonic, 'changes': n, 'layers': set, 'failures': n, 'retry_at': monotonic}}
+        self.pending = {}
+        self.running = []
+        self.last_poll = None
+        self.last_run = None
+        self.polls = 0
+        self.runs = 0
+        self.changes = []
+        self.changes_lock = threading.Lock()
+        self.metadata_index.listeners.append(self.on_sync)
+
+    def on_sync(self, drive_name: str, changed: list, bootstrap: bool) -> None:
+        if drive_name != self.drive_name:
+            return
+        if bootstrap:
+            # The first listing is the whole drive, not a change
+            logger.info(f"Drive index for '{drive_name}' built with {len(changed)} records, watching for changes.")
+            return
+        with self.changes_lock:
+            self.changes.extend(changed)
+
+    def record_path(self, record: dict) -> str:
+        if not record.get('removed'):
+            return self.metadata_index.get_path(record['id'])
+        parent = (record.get('parents') or [None])[0]
+        return f"{self.metadata_index.get_path(parent)}/{record['name']}" if parent and record.get('name') else ''
+
+    def poll(self) -> list:
+        """Read the changes feed and queue the affected targets. Returns the (target, layer) pairs seen."""
+        self.metadata_index.sync(service=self.service, drive_name=self.drive_name, max_staleness=0)
+        self.last_poll = datetime.now()
+        self.polls += 1
+        with self.changes_lock:
+            changed, self.changes = self.changes, []
+
+        seen = []
+        now = time.monotonic()
+        for record in changed:
+            path = self.record_path(record)
+            target, layer = target_for_path(path)
+            if target is None or layer not in self.watch_layers or (self.targets and target not in self.targets):
+                continue
+            seen.append((target, layer))
+            entry = self.pending.setdefault(target, {'first': now, 'last': now, 'changes': 0, 'layers': set(), 'failures': 0, 'retry_at': None})
+            entry['last'] = now
+            entry['changes'] += 1
+            entry['layers'].add(layer)
+
+        if seen:
+            logger.info(f"{len(seen)} change(s) in Drive for {sorted({t for t, _ in seen})}, queue depth {len(self.pending)}.")
+        return seen
+
+    def due_targets(self, now: float=None) -> list:
+        now = time.monotonic() if now is None else now
+        return sorted(
+            t for t, entry in self.pending.items()
+            if (entry['retry_at'] is None or now >= entry['retry_at'])
+            and (now - entry['last'] >= self.debounce or now - entry['first'] >= self.max_wait)
+        )
+
+    def run_targets(self, targets: list) -> list:
+        """Run the pipelines of `targets` together, with fresh run metrics. Failed targets stay queued (see `requeue`)."""
+        self.running = targets
+        started_at = datetime.now()
+        start = time.perf_counter()
+        logger.info(f"Running the ETL for {targets} after changes in Drive.")
+
+        # A long-lived daemon keeps no stages from previous runs
+        self.runner.metrics = RunMetrics()
+        try:
+            results = self.runner.run(targets=targets)
+        except Exception as e:
+            logger.error(f"ETL run for {targets} failed. Error: {e}")
+            results = [{'target': t, 'status': 'failed', 'error': str(e)} for t in targets]
+        finally:
+            self.running = []
+
+        for r in results:
+            if r['status'] == 'success':
+                self.pending.pop(r['target'], None)
+            else:
+                self.requeue(r['target'])
+
+        self.runs += 1
+        self.last_run = {
+            'targets': targets,
+            'status': 'success' if all(r['status'] == 'success' for r in results) else 'failed',
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'seconds': round(time.perf_counter() - start, 3),
+            'results': results,
+        }
+        return results
+
+    def requeue(self, target: str) -> None:
+        """Keep a failed target queued, retried once its backoff has passed."""
+        entry = self.pending.get(target)
+        if entry is None:
+            return
+        entry['failures'] += 1
+        delay = min(self.retry_backoff * 2 ** (entry['failures'] - 1), self.retry_max)
+        entry['retry_at'] = time.monotonic() + delay
+        logger.warning(f"Target '{target}' failed {entry['failures']} time(s) in a row, retrying in {delay}s.")
+
+    def step(self) -> list:
+        """One poll, then the run of the targets whose changes have settled."""
+        try:
+            self.poll()
+        except Exception as e:
+            logger.error(f"Drive changes for '{self.drive_name}' could not be read. Error: {e}")
+        due = self.due_targets()
+        results = self.run_targets(due) if due else []
+        self.write_status()
+        return results
+
+    def run_forever(self) -> None:
+        logger.info(f"Watching '{self.drive_name}' every {self.interval}s (debounce {self.debounce}s, max wait {self.max_wait}s).")
+        while not self.stop_event.is_set():
+            self.step()
+            self.stop_event.wait(self.interval)
+        logger.info("Watcher stopped.")
+
+    def stop(self, *args) -> None:
+        self.stop_event.set()
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            'drive_name': self.drive_name,
+            'queue_depth': len(self.pending),
+            'pending': {
+                t: {
+                    'changes': e['changes'], 'layers': sorted(e['layers']), 'waiting_seconds': round(now - e['first'], 1), 'quiet_seconds': round(now - e['last'], 1),
+                    'failures': e['failures'], 'retry_in_seconds': round(max(e['retry_at'] - now, 0), 1) if e['retry_at'] else None,
+                }
+                for t, e in self.pending.items()
+            },
+            'running': self.running,
+            'polls': self.polls,
+            'runs': self.runs,
+            'last_poll': self.last_poll.isoformat(timespec='seconds') if self.last_poll else None,
+            'last_run': self.last_run,
+        }
+
+    def prometheus_text(self, status: dict) -> str:
+        last_run = status['last_run'] or {}
+        lines = [
+            "# HELP fbs_etl_watcher_queue_depth Targets with changes waiting to run", "# TYPE fbs_etl_watcher_queue_depth gauge",
+            f"fbs_etl_watcher_queue_depth {status['queue_depth']}",
+            "# HELP fbs_etl_watcher_runs_total Runs started by the watcher", "# TYPE fbs_etl_watcher_runs_total counter",
+            f"fbs_etl_watcher_runs_total {status['runs']}",
+            "# HELP fbs_etl_watcher_last_run_success Whether the last run succeeded", "# TYPE fbs_etl_watcher_last_run_success gauge",
+            f"fbs_etl_watcher_last_run_success {int(last_run.get('status') == 'success') if last_run else 'NaN'}",
+            "# HELP fbs_etl_watcher_last_run_seconds Wall time of the last run", "# TYPE fbs_etl_watcher_last_run_seconds gauge",
+            f"fbs_etl_watcher_last_run_seconds {last_run.get('seconds', 'NaN')}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_status(self) -> dict:
+        """Write `watcher_status.json` and `fbs_etl_watcher.prom` in the metrics directory (atomically)."""
+        status = self.status()
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        outputs = {
+            'watcher_status.json': json.dumps(status, ensure_ascii=False, indent=1, default=str),
+            'fbs_etl_watcher.prom': self.prometheus_text(status),
+        }
+        for name, content in outputs.items():
+            path = os.path.join(self.metrics_dir, name)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return status
@@ -0,0 +1,23 @@
+from datetime import datetime
+import polars as pl
+from src.backfill import RawBackfill, SOURCE_FILE_COL, SOURCE_DATE_COL
+
+
+def test_merge_resolves_ties_by_file_and_row(tmp_path):
+    created = datetime(2024, 1, 1)
+    exports = {
+        'a.csv': pl.DataFrame({'id': [1, 2, 3], 'v': ['a1', 'a2', 'a3']}),
+        # Same creation time as a.csv, listed after it; key 2 appears twice
+        'b.csv': pl.DataFrame({'id': [2, 3, 2], 'v': ['b2', 'b3', 'b2-last']}),
+    }
+    paths = []
+    for name, df in exports.items():
+        path = tmp_path / f"{name}.parquet"
+        df.with_columns(pl.lit(name).alias(SOURCE_FILE_COL), pl.lit(created).alias(SOURCE_DATE_COL)).write_parquet(path)
+        paths.append(str(path))
+
+    backfill = RawBackfill(spill_dir=str(tmp_path))
+    results = [backfill.merge(paths, primary_key='id').collect(engine='streaming') for _ in range(5)]
+    assert all(r.equals(results[0]) for r in results)
+    assert results[0].sort('id').select('id', 'v').rows() == [(1, 'a1'), (2, 'b2-last'), (3, 'b3')]
+    assert results[0].columns == ['id', 'v', SOURCE_FILE_COL, SOURCE_DATE_COL]
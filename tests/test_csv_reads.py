@@ -0,0 +1,30 @@
+import io
+import polars as pl
+import pytest
+from src.gdrive_handler import build_csv_options, read_typed_csv
+
+READ_OPTIONS = {'numeric_types': {'Plazo': 'Int64', 'Saldo': 'Float64'}, 'decimal_comma': True, 'date_formats': {}}
+
+
+def read(text: str) -> pl.DataFrame:
+    csv_options, parse_options = build_csv_options('radicados', read_options=READ_OPTIONS)
+    return read_typed_csv(io.BytesIO(text.encode('latin1')), csv_options, parse_options, file_name='radicados')
+
+
+def test_numbers_are_parsed_by_the_reader():
+    csv_options, _ = build_csv_options('radicados', read_options=READ_OPTIONS)
+    assert csv_options['schema_overrides'] == {'Plazo': pl.Int64, 'Saldo': pl.Float64}
+    df = read("Plazo;Saldo;Nombre\n12;1500,5;Ana\n;;Luis\n")
+    assert df.schema == {'Plazo': pl.Int64, 'Saldo': pl.Float64, 'Nombre': pl.String}
+    assert df.rows() == [(12, 1500.5, 'Ana'), (None, None, 'Luis')]
+
+
+def test_malformed_numbers_are_read_as_text_and_counted():
+    rows = "".join(f"{i};{i},5\n" for i in range(200))
+    # One padded value the reader rejects and the text cast accepts, one that can't be read
+    df = read("Plazo;Saldo\n 7 ;1,0\n" + rows + "x;2,0\n")
+    assert df['Plazo'].head(1).to_list() == [7]
+    assert df['Plazo'].null_count() == 1
+
+    with pytest.raises(ValueError, match='Too many malformed values'):
+        read("Plazo;Saldo\nx;1,0\ny;2,0\n3;3,0\n")
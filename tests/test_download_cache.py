@@ -0,0 +1,23 @@
+import polars as pl
+from src.download_cache import DownloadCache
+
+FILE = {'id': 'creditos-export', 'name': '20240101_creditos.csv', 'md5Checksum': 'abc'}
+
+
+def test_hit_reads_the_cached_frame(tmp_path):
+    cache = DownloadCache(cache_dir=str(tmp_path))
+    df = pl.DataFrame({'a': [1, 2]})
+    cache.put(FILE, df)
+    assert cache.get(FILE).equals(df)
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = DownloadCache(cache_dir=str(tmp_path))
+    cache.put(FILE, pl.DataFrame({'a': [1, 2]}))
+    with open(cache.entry_path(cache.cache_key(FILE)), 'wb') as f:
+        f.write(b'not parquet')
+
+    assert cache.get(FILE) is None
+    assert cache.misses == 1
+    assert cache.cache_key(FILE) not in cache.manifest
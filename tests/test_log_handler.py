@@ -0,0 +1,37 @@
+from datetime import date, datetime
+import polars as pl
+from src import log_handler
+
+
+def test_sheet_text_matches_typed_values(monkeypatch, tmp_path):
+    monkeypatch.setattr(log_handler, 'ROW_HASH_DIR', str(tmp_path))
+    raw = pl.DataFrame({
+        'id': [1, 2, 3],
+        'fecha': [date(2024, 1, 31), date(2024, 2, 1), None],
+        'corte': [datetime(2024, 1, 31, 10, 30), datetime(2024, 2, 1), datetime(2024, 2, 2)],
+        'saldo': [1234.5, 0.1 + 0.2, 10.0],
+    })
+    # What the sheet gives back: text in its own formats
+    modeled = pl.DataFrame({
+        'id': ['1', '2', '3'],
+        'fecha': ['31/01/2024', '01/02/2024', ''],
+        'corte': ['31/01/2024 10:30:00', '01/02/2024 00:00:00', '02/02/2024 00:00:00'],
+        'saldo': ['1234,50', '0,3', '10'],
+    })
+    logs = log_handler.authlog_table_hashed(raw, 'test', 'id', ['fecha', 'corte', 'saldo'], df_modeled=modeled, decimal_comma=True)
+    assert logs.height == 0
+
+    changed = modeled.with_columns(pl.when(pl.col('id') == '2').then(pl.lit('0,4')).otherwise('saldo').alias('saldo'))
+    logs = log_handler.authlog_table_hashed(raw, 'test', 'id', ['fecha', 'corte', 'saldo'], df_modeled=changed, decimal_comma=True)
+    assert logs.select('id', 'tipo_cambio').rows() == [('2', 'Modificado')]
+
+
+def test_stored_hashes_are_replaced_as_a_pair(monkeypatch, tmp_path):
+    monkeypatch.setattr(log_handler, 'ROW_HASH_DIR', str(tmp_path))
+    df = pl.DataFrame({'id': [1, 2], 'v': ['a', 'b']})
+    log_handler.authlog_table_hashed(df, 'pair', 'id', ['v'])
+    log_handler.authlog_table_hashed(df.with_columns(pl.lit('c').alias('v')), 'pair', 'id', ['v'])
+
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert len(files) == 2 and not any(f.endswith('.tmp') for f in files)
+    assert log_handler.load_row_hashes('pair', 'id', ['v']).height == 2
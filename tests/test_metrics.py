@@ -0,0 +1,18 @@
+from collections import Counter
+from src.metrics import RunMetrics
+
+
+def test_repeated_stage_is_one_series(tmp_path):
+    metrics = RunMetrics(metrics_dir=str(tmp_path))
+    for rows in (10, 20, 30):
+        with metrics.stage('backfill_file', target='creditos', layer='raw') as stage:
+            stage['rows_out'] = rows
+    with metrics.stage('backfill_merge', target='creditos', layer='raw') as stage:
+        stage['rows_out'] = 30
+
+    samples = [line for line in metrics.prometheus_text().splitlines() if not line.startswith('#')]
+    series = Counter(line.rsplit(' ', 1)[0] for line in samples)
+    assert max(series.values()) == 1
+    labels = 'target="creditos",layer="raw",stage="backfill_file"'
+    assert f"fbs_etl_stage_rows_out{{{labels}}} 60" in samples
+    assert f"fbs_etl_stage_count{{{labels}}} 3" in samples
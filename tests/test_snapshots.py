@@ -0,0 +1,33 @@
+from datetime import date
+import polars as pl
+import etl
+from src.snapshot_store import SnapshotStore
+
+
+def load(monkeypatch, tmp_path, api_response):
+    store = SnapshotStore(root=str(tmp_path))
+    monkeypatch.setattr(etl, 'snapshot_store', store)
+    monkeypatch.setattr(etl, 'write_dataframe_to_sheet', lambda **kwargs: api_response)
+
+    pipeline = etl.ETLDataPipeline(extractor=None)
+    pipeline.get_sheets_transport = lambda: None
+    pipeline.extractor = type('Extractor', (), {'sheets_service': None, 'sheets_credentials': None})()
+    pipeline.keep_snapshots = True
+    pipeline.target_name = 'creditos'
+    pipeline.output['raw'] = pl.DataFrame({'id': [1, 2], 'source_file': ['a.csv', 'a.csv']})
+    pipeline.load_(df=pipeline.output['raw'].drop('source_file'), spreadsheet_id='sheet')
+    return store
+
+
+def test_load_keeps_raw_and_modeled_snapshots(monkeypatch, tmp_path):
+    store = load(monkeypatch, tmp_path, {'updatedCells': 4})
+    raw = store.scan('creditos', 'raw').collect()
+    modeled = store.as_of('creditos', date.today())
+    assert raw['source_file'].to_list() == ['a.csv', 'a.csv']
+    assert modeled.columns == ['id'] and modeled.height == 2
+
+
+def test_failed_load_keeps_no_snapshot(monkeypatch, tmp_path):
+    store = load(monkeypatch, tmp_path, None)
+    assert store.list_partitions('creditos', 'raw') == []
+    assert store.list_partitions('creditos', 'modeled') == []
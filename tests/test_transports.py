@@ -0,0 +1,44 @@
+import polars as pl
+import etl
+from src import extraction_layer
+from src.extraction_layer import FBSExtractor
+
+
+class FakeTransport:
+    def __init__(self, credentials=None, **options):
+        self.credentials = credentials
+
+    def close(self):
+        pass
+
+
+def test_sheets_writes_get_the_sheets_credentials(monkeypatch):
+    drive_creds, sheets_creds = object(), object()
+    monkeypatch.setattr('src.async_transport.SyncGoogleTransport', FakeTransport)
+    monkeypatch.setattr(extraction_layer, 'get_gdrive_credentials_for_institutional_account', lambda: drive_creds)
+    monkeypatch.setattr(extraction_layer, 'get_gsheets_credentials_for_institutional_account', lambda: sheets_creds)
+    monkeypatch.setattr(extraction_layer, 'get_sheets_service', lambda creds, http: 'sheets')
+
+    received = {}
+    def write(**kwargs):
+        received.update(kwargs)
+        return {'updatedCells': 1}
+    monkeypatch.setattr(etl, 'write_dataframe_to_sheet', write)
+
+    extractor = FBSExtractor()
+    extractor.api_mode = 'live'
+    pipeline = etl.ETLDataPipeline(extractor=extractor)
+    pipeline.use_async_transport = True
+    pipeline.keep_snapshots = False
+    pipeline.load_(df=pl.DataFrame({'a': [1]}), spreadsheet_id='sheet')
+
+    assert received['transport'].credentials is sheets_creds
+    assert received['credentials'] is sheets_creds
+    # The Drive transport keeps the read-only token
+    assert extractor.transport.credentials is drive_creds
+
+
+def test_no_sheets_transport_without_own_credentials():
+    extractor = FBSExtractor()
+    extractor.sheets_service = 'stub'
+    assert extractor.sheets_transport is None